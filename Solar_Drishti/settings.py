@@ -65,12 +65,15 @@ MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
+    'forecasting.middleware.MetricsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    # Last: it calls the view itself (see its docstring)
+    'forecasting.middleware.ProfilingMiddleware',
 ]
 
 ROOT_URLCONF = 'Solar_Drishti.urls'
@@ -107,6 +110,18 @@ DATABASES = {
     )
 }
 
+# Cache
+# LocMem is per process; point CACHE_BACKEND at a shared cache (e.g.
+# django.core.cache.backends.db.DatabaseCache + `manage.py createcachetable`)
+# to share forecasts between gunicorn workers.
+
+CACHES = {
+    'default': {
+        'BACKEND': config("CACHE_BACKEND", default="django.core.cache.backends.locmem.LocMemCache"),
+        'LOCATION': config("CACHE_LOCATION", default="solar-drishti"),
+    }
+}
+
 
 
 # Password validation
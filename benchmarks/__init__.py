@@ -0,0 +1,14 @@
+"""
+Offline benchmarks. Run from the project root, e.g.
+
+    python -m benchmarks.bench_weather_parse
+
+Nothing here calls a real upstream API; placeholder values are filled in for
+settings that are only needed to import the app. Benchmarks that need a
+database use `benchmarks.bench_settings` (a local SQLite file by default).
+"""
+import os
+
+for _name in ("OPENWEATHER_API_KEY", "SECRET_KEY", "BREVO_API_KEY", "EMAIL_HOST_USER"):
+    os.environ.setdefault(_name, "benchmark")
+os.environ.setdefault("DATABASE_URL", "sqlite:///benchmark.sqlite3")
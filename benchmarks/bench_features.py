@@ -0,0 +1,62 @@
+"""
+Per-row feature-building cost: add_features + df[INPUT_COLS] (the old
+train / predict path) vs FeaturePipeline.transform into a float32 matrix,
+at a single forecast (96 rows), a fleet batch and a training-sized frame.
+
+    python -m benchmarks.bench_features [--sizes 96 10000 1000000] [--repeat 20]
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from forecasting.ml.py_files.config import INPUT_COLS
+from forecasting.ml.py_files.features import FeaturePipeline, add_features, feature_pipeline
+
+
+def raw_frame(rows: int) -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    return pd.DataFrame({
+        "timestamp": pd.date_range("2024-01-01", periods=rows, freq="h"),
+        "ghi": rng.uniform(0, 1000, rows),
+        "dni": rng.uniform(0, 900, rows),
+        "dhi": rng.uniform(0, 300, rows),
+        "air_temp": rng.normal(25, 8, rows),
+        "wind_speed": rng.gamma(2, 1.5, rows),
+        "solar_zenith": rng.uniform(0, 180, rows),
+        "cloud_cover": rng.uniform(0, 100, rows),
+    })
+
+
+def median_seconds(fn, repeat: int) -> float:
+    fn()  # warm-up
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t0)
+    return float(np.median(samples))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[96, 10_000, 1_000_000])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    float64 = FeaturePipeline(dtype=np.float64)
+    print(f"{'rows':>10}{'add_features':>16}{'pipeline f32':>16}{'pipeline f64':>16}{'speedup':>10}   (ns / row)")
+    for rows in args.sizes:
+        df = raw_frame(rows)
+        repeat = max(3, args.repeat if rows <= 100_000 else args.repeat // 4)
+        legacy = median_seconds(lambda: add_features(df.copy())[INPUT_COLS].to_numpy(), repeat)
+        out = np.empty((rows, len(INPUT_COLS)), dtype=np.float32)
+        lean = median_seconds(lambda: feature_pipeline.transform(df, out=out), repeat)
+        wide = median_seconds(lambda: float64.transform(df), repeat)
+        print(f"{rows:>10}{legacy / rows * 1e9:>16.1f}{lean / rows * 1e9:>16.1f}{wide / rows * 1e9:>16.1f}"
+              f"{legacy / lean:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Solar zenith: per-site pvlib Location.get_solarposition (the old path in
+solar.py) vs the vectorized geometry cache fill, for both methods, plus the
+per-request cost once the cache is warm.
+
+Accuracy is the max / mean absolute zenith difference in degrees against
+get_solarposition over every site and hour; the model only sees daytime
+hours, so the daytime (zenith < 90) error is shown separately.
+
+    python -m benchmarks.bench_geometry [--sites 500] [--days 5]
+"""
+import argparse
+import time
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sites", type=int, default=500)
+    parser.add_argument("--days", type=int, default=5)
+    args = parser.parse_args()
+
+    import pvlib
+
+    from forecasting.ml import geometry
+    from forecasting.ml.forecast_cache import MemoryBackend
+
+    rng = np.random.default_rng(0)
+    zones = [("America/Chicago", -97.0), ("America/New_York", -76.0), ("Asia/Kolkata", 78.0), ("Europe/Berlin", 10.0)]
+    sites = []
+    for i in range(args.sites):
+        tz, lon0 = zones[i % len(zones)]
+        sites.append((round(rng.uniform(20, 50), 3), round(lon0 + rng.uniform(-4, 4), 3), tz))
+    days = [date.today() + timedelta(days=d) for d in range(args.days)]
+    timestamps = pd.date_range(days[0], periods=24 * args.days, freq="h")
+
+    # 1. Legacy: one Location + get_solarposition per site
+    t0 = time.perf_counter()
+    reference = np.stack([
+        pvlib.location.Location(latitude=lat, longitude=lon, tz=tz)
+        .get_solarposition(timestamps.tz_localize(tz, nonexistent="shift_forward", ambiguous=np.ones(len(timestamps), dtype=bool)))["zenith"].values
+        for lat, lon, tz in sites
+    ])
+    legacy = time.perf_counter() - t0
+
+    print(f"{args.sites} sites x {args.days} days ({reference.size} site-hours)")
+    print(f"{'path':<30}{'seconds':>10}{'speedup':>10}{'max err':>10}{'mean err':>10}{'day max':>10}")
+    print(f"{'legacy get_solarposition':<30}{legacy:>10.3f}{1:>10.1f}{0:>10.4f}{0:>10.4f}{0:>10.4f}")
+
+    daytime = reference < 90
+    for method in geometry.METHODS:
+        cache = geometry.GeometryCache(MemoryBackend(max_entries=args.sites * args.days))
+        t0 = time.perf_counter()
+        cache.precompute(sites, days, method)
+        fill = time.perf_counter() - t0
+
+        zenith = np.stack([cache.zenith_for(timestamps, lat, lon, tz, method) for lat, lon, tz in sites])
+        err = np.abs(zenith - reference)
+        print(f"{'precompute ' + method:<30}{fill:>10.3f}{legacy / fill:>10.1f}"
+              f"{err.max():>10.4f}{err.mean():>10.4f}{err[daytime].max():>10.4f}")
+
+        # Warm path: what compute_solar_features pays per request
+        t0 = time.perf_counter()
+        for lat, lon, tz in sites:
+            cache.zenith_for(timestamps, lat, lon, tz, method)
+        warm_us = (time.perf_counter() - t0) / len(sites) * 1e6
+        print(f"{'  cached lookup / site':<30}{warm_us / 1e6:>10.6f}{legacy / len(sites) * 1e6 / warm_us:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Per-call latency and throughput of the inference backends on the shipped
+model at 1, 96 (one forecast) and 100k rows (a fleet batch):
+
+- sklearn/df: model.predict(df[INPUT_COLS]), the old path
+- sklearn/np: the wrapper on the FeaturePipeline matrix
+- booster/N: raw Booster.predict with num_threads=N (0 = every core)
+- numpy: the vectorized tree evaluator (inference.TreeEnsemble)
+
+Also checks every backend agrees with the old path.
+
+    python -m benchmarks.bench_inference [--sizes 1 96 100000] [--repeat 200]
+"""
+import argparse
+import os
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.bench_features import raw_frame
+
+
+def timed(fn, repeat: int):
+    fn()  # warm-up
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t0)
+    return np.median(samples), np.percentile(samples, 95)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 96, 100_000])
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    import joblib
+
+    from forecasting.ml.inference import BoosterPredictor, TreeEnsemble
+    from forecasting.ml.py_files.config import INPUT_COLS, MODEL_PATH
+    from forecasting.ml.py_files.features import FeaturePipeline
+
+    warnings.simplefilter("ignore")  # sklearn feature-name warnings on the ndarray paths
+    model = joblib.load(MODEL_PATH)
+    pipeline = FeaturePipeline.for_model(model)
+    numpy_trees = TreeEnsemble(model.booster_)
+    backends = {
+        "sklearn/df": lambda X, df: model.predict(df),
+        "sklearn/np": lambda X, df: model.predict(X),
+        "booster/1": lambda X, df, p=BoosterPredictor(model, num_threads=1): p.predict(X),
+        "booster/0": lambda X, df, p=BoosterPredictor(model, num_threads=0): p.predict(X),
+        "numpy": lambda X, df: numpy_trees.predict(X),
+    }
+    print(f"{model.booster_.num_trees()} trees, max depth {numpy_trees.depth}, "
+          f"{pipeline.dtype} features, {os.cpu_count()} cores")
+
+    print(f"\n{'rows':>8}  {'backend':<12}{'p50 us':>12}{'p95 us':>12}{'rows/s':>14}{'vs old':>8}{'max diff':>11}")
+    for rows in args.sizes:
+        raw = raw_frame(rows)
+        X = pipeline.transform(raw)
+        df = pd.DataFrame(X, columns=INPUT_COLS)
+        expected = model.predict(df)
+        repeat = max(5, args.repeat if rows <= 1000 else args.repeat // 20)
+        baseline = None
+        for name, fn in backends.items():
+            p50, p95 = timed(lambda: fn(X, df), repeat)
+            baseline = baseline or p50
+            diff = np.abs(fn(X, df) - expected).max()
+            print(f"{rows:>8}  {name:<12}{p50 * 1e6:>12.1f}{p95 * 1e6:>12.1f}{rows / p50:>14,.0f}"
+                  f"{baseline / p50:>7.1f}x{diff:>11.1e}")
+
+
+if __name__ == "__main__":
+    main()
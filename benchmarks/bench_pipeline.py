@@ -0,0 +1,295 @@
+"""
+The predict_next_48h pipeline end to end on recorded upstream responses
+(benchmarks/fixtures, see benchmarks.replay), for 1, 100 and 10k locations.
+
+Each location runs the same stages as _predict_next_48h, one after the other
+so every stage is timed on its own:
+
+- weather    get_hourly_forecast (replayed OpenWeather call + parse)
+- radiation  fetch_solar_forecast (replayed Open-Meteo call + frame)
+- solar      build_feature_frame (compute_solar_features, zenith, merge)
+- features   FeaturePipeline.transform (the INPUT_COLS matrix)
+- predict    the INFERENCE_BACKEND predictor
+- aggregate  aggregate_daily
+
+Reported per stage: p50 / p95 / p99 / mean latency and the bytes allocated
+(tracemalloc peak above the stage's start, on a separate sample of
+locations so tracing does not distort the timings). Throughput is
+locations/s for the serial run, for the async path (_apredict_next_48h,
+locations in flight together) and for the fleet batch (forecast_sites).
+
+Locations are random sites in the fixtures' time zone, each in its own
+forecast-cache cell, and the forecast cache is off, so every location
+replays both responses and computes its own zenith.
+
+Results go to JSON (default benchmarks/results/pipeline-<commit>.json);
+--compare prints the change against an earlier file.
+
+    python -m benchmarks.bench_pipeline [--sizes 1 100 10000] [--alloc-sample 100]
+                                        [--json PATH] [--compare OLD.json] [--skip async batch]
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+
+# Every location replays its own responses (set before forecasting.ml is imported)
+os.environ.setdefault("FORECAST_CACHE_BACKEND", "none")
+
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+STAGES = ("weather", "radiation", "solar", "features", "predict", "aggregate")
+PERCENTILES = (50, 95, 99)
+
+
+def locations(n: int, timezone_str: str, seed: int):
+    """n distinct sites over India (the fixtures' zone), at least one 0.05 deg cache cell apart."""
+    rng = np.random.default_rng(seed)
+    cells = set()
+    sites = []
+    while len(sites) < n:
+        lat, lon = round(rng.uniform(8.0, 34.0), 4), round(rng.uniform(68.0, 97.0), 4)
+        cell = (int(lat // 0.05), int(lon // 0.05))
+        if cell not in cells:
+            cells.add(cell)
+            sites.append((lat, lon, timezone_str))
+    return sites
+
+
+class Pipeline:
+    """_predict_next_48h split into its stages."""
+
+    def __init__(self):
+        from forecasting.ml.inference import predictor_for
+        from forecasting.ml.predict import aggregate_daily, build_feature_frame
+        from forecasting.ml.py_files.features import FeaturePipeline
+        from forecasting.ml.registry import get_model
+        from forecasting.ml.solar import fetch_solar_forecast
+        from forecasting.ml.weather import get_hourly_forecast
+
+        model = get_model()
+        self.predictor = predictor_for(model)
+        self.features = FeaturePipeline.for_model(model)
+        self.get_hourly_forecast = get_hourly_forecast
+        self.fetch_solar_forecast = fetch_solar_forecast
+        self.build_feature_frame = build_feature_frame
+        self.aggregate_daily = aggregate_daily
+
+    def run(self, lat, lon, timezone_str, lap):
+        """Run one location; `lap(stage)` is called as each stage finishes."""
+        weather_df = self.get_hourly_forecast(lat, lon, 96, timezone_str=timezone_str)
+        lap("weather")
+        forecast_df = self.fetch_solar_forecast(lat, lon, timezone_str=timezone_str)
+        lap("radiation")
+        df = self.build_feature_frame(weather_df, forecast_df, lat, lon, timezone_str=timezone_str)
+        lap("solar")
+        X = self.features.transform(df)
+        lap("features")
+        df["predicted_specific_energy"] = self.predictor.predict(X)
+        lap("predict")
+        daily_df = self.aggregate_daily(df)
+        lap("aggregate")
+        return df, daily_df
+
+
+def time_stages(pipeline, sites):
+    """(seconds per site and stage, total wall seconds, hourly rows)."""
+    seconds = np.zeros((len(sites), len(STAGES)))
+    rows = 0
+    start = time.perf_counter()
+    for i, (lat, lon, timezone_str) in enumerate(sites):
+        last = time.perf_counter()
+
+        def lap(stage, i=i):
+            nonlocal last
+            now = time.perf_counter()
+            seconds[i, STAGES.index(stage)] = now - last
+            last = now
+
+        df, _ = pipeline.run(lat, lon, timezone_str, lap)
+        rows += len(df)
+    return seconds, time.perf_counter() - start, rows
+
+
+def allocations(pipeline, sites):
+    """Mean bytes allocated per stage: tracemalloc peak above the stage's starting point."""
+    peak = np.zeros((len(sites), len(STAGES)))
+    tracemalloc.start()
+    try:
+        for i, (lat, lon, timezone_str) in enumerate(sites):
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+
+            def lap(stage, i=i):
+                nonlocal base
+                current, top = tracemalloc.get_traced_memory()
+                peak[i, STAGES.index(stage)] = top - base
+                tracemalloc.reset_peak()
+                base = current
+
+            pipeline.run(lat, lon, timezone_str, lap)
+    finally:
+        tracemalloc.stop()
+    return peak.mean(axis=0)
+
+
+def run_async(sites, concurrency: int):
+    from forecasting.ml import upstream
+    from forecasting.ml.async_predict import _apredict_next_48h
+
+    async def main():
+        limit = asyncio.Semaphore(concurrency)
+
+        async def one(lat, lon, timezone_str):
+            async with limit:
+                df, _ = await _apredict_next_48h(lat, lon, timezone_str)
+                return len(df)
+
+        try:
+            return sum(await asyncio.gather(*(one(*site) for site in sites)))
+        finally:
+            await upstream.client.aclose()
+
+    start = time.perf_counter()
+    rows = asyncio.run(main())
+    return time.perf_counter() - start, rows
+
+
+def run_batch(sites):
+    from forecasting.ml.batch import forecast_sites
+
+    timings = {}
+    start = time.perf_counter()
+    forecast_sites(dict(enumerate(sites)), timings=timings)
+    return time.perf_counter() - start, timings
+
+
+def check_equivalence(pipeline, site):
+    """The staged run must give exactly what _predict_next_48h returns."""
+    import pandas as pd
+
+    from forecasting.ml.predict import _predict_next_48h
+
+    _, expected = _predict_next_48h(*site)
+    _, daily_df = pipeline.run(*site, lap=lambda stage: None)
+    pd.testing.assert_frame_equal(daily_df, expected)
+
+
+def metadata():
+    import lightgbm
+    import pandas as pd
+
+    from forecasting.ml import forecast_cache, geometry, inference, weather
+
+    try:
+        commit = subprocess.run(["git", "describe", "--always", "--dirty"], capture_output=True, text=True,
+                                cwd=Path(__file__).resolve().parent, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = "unknown"
+    return {
+        "commit": commit,
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "lightgbm": lightgbm.__version__,
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "settings": {
+            "INFERENCE_BACKEND": inference.INFERENCE_BACKEND,
+            "INFERENCE_NUM_THREADS": inference.INFERENCE_NUM_THREADS,
+            "WEATHER_RESAMPLE": weather.WEATHER_RESAMPLE,
+            "SOLAR_GEOMETRY_METHOD": geometry.SOLAR_GEOMETRY_METHOD,
+            "FORECAST_CACHE_BACKEND": forecast_cache.FORECAST_CACHE_BACKEND,
+        },
+    }
+
+
+def compare(old: dict, new: dict):
+    print(f"\nvs {old['meta']['commit']} ({old['meta']['created']}): p50 ms, old -> new")
+    for size, result in new["results"].items():
+        before = old["results"].get(size)
+        if before is None:
+            continue
+        print(f"  {size} locations")
+        for stage in (*STAGES, "total"):
+            a, b = before["stages"][stage]["p50_ms"], result["stages"][stage]["p50_ms"]
+            print(f"    {stage:<10}{a:>10.3f} -> {b:>10.3f}  {(b - a) / a * 100 if a else 0.0:>+7.1f}%")
+        for mode in ("serial", "async", "batch"):
+            if mode in before.get("throughput", {}) and mode in result["throughput"]:
+                a, b = before["throughput"][mode], result["throughput"][mode]
+                print(f"    {mode + ' loc/s':<10}{a:>10.1f} -> {b:>10.1f}  {(b - a) / a * 100 if a else 0.0:>+7.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 100, 10_000])
+    parser.add_argument("--alloc-sample", type=int, default=100, help="locations traced for allocations per size")
+    parser.add_argument("--concurrency", type=int, default=64, help="async locations in flight")
+    parser.add_argument("--skip", nargs="*", default=[], choices=["async", "batch"])
+    parser.add_argument("--json", type=Path, help="output file (default benchmarks/results/pipeline-<commit>.json)")
+    parser.add_argument("--compare", type=Path, help="earlier results file to diff against")
+    args = parser.parse_args()
+
+    from benchmarks import replay
+
+    recording = replay.install()
+    timezone_str = replay.fixture_timezone()
+    pipeline = Pipeline()
+    # Warm-up + correctness on a location outside every measured set
+    check_equivalence(pipeline, locations(1, timezone_str, seed=999)[0])
+
+    meta = metadata()
+    report = {"meta": meta, "results": {}}
+    print(f"commit {meta['commit']}, {meta['cpu_count']} cores, backend {meta['settings']['INFERENCE_BACKEND']}")
+    for size in args.sizes:
+        sites = locations(size, timezone_str, seed=size)
+        seconds, wall, rows = time_stages(pipeline, sites)
+        alloc = allocations(pipeline, locations(min(size, args.alloc_sample), timezone_str, seed=size + 1))
+
+        per_site = np.column_stack([seconds, seconds.sum(axis=1)])
+        stages = {}
+        for j, stage in enumerate((*STAGES, "total")):
+            ms = per_site[:, j] * 1e3
+            stages[stage] = {
+                **{f"p{p}_ms": round(float(np.percentile(ms, p)), 4) for p in PERCENTILES},
+                "mean_ms": round(float(ms.mean()), 4),
+                "alloc_kib": round(float(alloc[j] if j < len(STAGES) else alloc.sum()) / 1024, 1),
+            }
+        throughput = {"serial": round(size / wall, 2)}
+        result = {"locations": size, "rows": rows, "wall_seconds": round(wall, 3),
+                  "rows_per_sec": round(rows / wall, 1), "stages": stages, "throughput": throughput}
+        if "async" not in args.skip:
+            async_wall, _ = run_async(locations(size, timezone_str, seed=size + 2), args.concurrency)
+            throughput["async"] = round(size / async_wall, 2)
+        if "batch" not in args.skip:
+            batch_wall, timings = run_batch(locations(size, timezone_str, seed=size + 3))
+            throughput["batch"] = round(size / batch_wall, 2)
+            result["batch_timings"] = {k: round(v, 4) for k, v in timings.items()}
+        report["results"][str(size)] = result
+
+        print(f"\n{size} locations, {rows} rows in {wall:.2f}s")
+        print(f"  {'stage':<10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'mean ms':>10}{'alloc KiB':>11}")
+        for stage, s in stages.items():
+            print(f"  {stage:<10}{s['p50_ms']:>10.3f}{s['p95_ms']:>10.3f}{s['p99_ms']:>10.3f}{s['mean_ms']:>10.3f}"
+                  f"{s['alloc_kib']:>11.1f}")
+        print("  locations/s: " + ", ".join(f"{mode} {value:,.1f}" for mode, value in throughput.items()))
+
+    report["meta"]["replayed_requests"] = dict(recording.hits)
+    out = args.json or RESULTS_DIR / f"pipeline-{meta['commit']}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(report, indent=2))
+    print(f"\nwrote {out}")
+    if args.compare:
+        compare(json.loads(args.compare.read_text()), report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+"""
+Prediction query plans and latencies before / after the composite
+(system, target_date) and partial pending indexes (migration 0012).
+
+Seeds a local database (see benchmarks/bench_settings.py) with `--rows`
+predictions spread over `--users` users with two systems each (the
+default is ~7 years of daily entries per system), then runs
+the hot queries at migration 0011 and again at 0012, printing EXPLAIN
+output and median / p95 latency for each.
+
+    python -m benchmarks.bench_prediction_queries [--rows 1000000] [--users 200] [--repeat 200]
+
+The seeded database is reused between runs; pass --reseed to rebuild it.
+"""
+import argparse
+import os
+import random
+import time
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+
+import numpy as np
+
+os.environ["DJANGO_SETTINGS_MODULE"] = "benchmarks.bench_settings"
+
+BEFORE, AFTER = "0011_solarsystem_timezone", "0012_prediction_indexes"
+
+
+def seed(rows: int, users: int):
+    from django.contrib.auth import get_user_model
+    from django.db import connection, transaction
+
+    from forecasting.models import Prediction, SolarSystem
+
+    User = get_user_model()
+    User.objects.filter(username__startswith="bench-").delete()
+    User.objects.bulk_create([User(username=f"bench-{i}", email=f"bench-{i}@example.com") for i in range(users)], batch_size=5000)
+    user_ids = list(User.objects.filter(username__startswith="bench-").values_list("id", flat=True))
+    SolarSystem.objects.bulk_create([
+        SolarSystem(user_id=uid, name=f"roof-{n}", system_size=5.0, latitude=29.76, longitude=-95.36,
+                    location_name="Bench", timezone="America/Chicago")
+        for uid in user_ids for n in range(2)
+    ], batch_size=5000)
+    system_ids = list(SolarSystem.objects.filter(user_id__in=user_ids).values_list("id", flat=True))
+
+    # Every system gets a contiguous run of days; the newest few are still pending, plus ~3% gaps
+    per_system = max(1, rows // len(system_ids))
+    start = date(2026, 1, 1) - timedelta(days=per_system)
+    rng = random.Random(0)
+    table = Prediction._meta.db_table
+    sql = (f"INSERT INTO {table} (system_id, created_at, target_date, day_target, pred_value, actual_value) "
+           f"VALUES (%s, %s, %s, %s, %s, %s)")
+    batch = []
+    with transaction.atomic(), connection.cursor() as cursor:
+        for system_id in system_ids:
+            for d in range(per_system):
+                target = start + timedelta(days=d)
+                created = datetime(target.year, target.month, target.day, 9, tzinfo=dt_timezone.utc) - timedelta(days=1)
+                pred = rng.uniform(5, 30)
+                pending = d >= per_system - 2 or rng.random() < 0.03
+                batch.append((system_id, created, target, "tomorrow", pred, None if pending else pred * rng.uniform(0.7, 1.3)))
+                if len(batch) >= 20000:
+                    cursor.executemany(sql, batch)
+                    batch.clear()
+        if batch:
+            cursor.executemany(sql, batch)
+
+
+def hot_queries(user_id: int, system_id: int, cursor_date: date):
+    """The queries behind history_view, profile_view and update_actual_power."""
+    from django.db.models import Count, F, Q, Sum
+    from django.db.models.functions import Abs
+
+    from forecasting.models import Prediction, SolarSystem
+
+    user_rows = Prediction.objects.filter(system__user_id=user_id)
+    verified = Q(predictions__actual_value__isnull=False)
+    return {
+        "history first page": user_rows.select_related("system").order_by("-target_date", "-id")[:50],
+        "history keyset page": user_rows.select_related("system")
+            .filter(Q(target_date__lt=cursor_date) | Q(target_date=cursor_date, id__lt=10**12))
+            .order_by("-target_date", "-id")[:50],
+        "history accuracy": SolarSystem.objects.filter(user_id=user_id).annotate(
+            log_count=Count("predictions"),
+            total_actual=Sum("predictions__actual_value", filter=verified),
+            total_error=Sum(Abs(F("predictions__pred_value") - F("predictions__actual_value")), filter=verified),
+        ),
+        "profile count": user_rows,
+        "latest pending": Prediction.objects.filter(system_id=system_id, actual_value__isnull=True).order_by("-created_at")[:1],
+        "system day lookup": Prediction.objects.filter(system_id=system_id, target_date=cursor_date),
+    }
+
+
+def run(name: str, samples, repeat: int):
+    """Median / p95 ms per query over `samples`, plus the plan of the first one."""
+    timings = {}
+    plans = {}
+    for sample in samples:  # warm the page cache so "before" is not penalised by cold reads
+        for qs in hot_queries(*sample).values():
+            list(qs)
+    for i in range(repeat):
+        queries = hot_queries(*samples[i % len(samples)])
+        for label, qs in queries.items():
+            t0 = time.perf_counter()
+            if label == "profile count":
+                qs.count()
+            else:
+                list(qs)
+            timings.setdefault(label, []).append(time.perf_counter() - t0)
+            if label not in plans:
+                plans[label] = qs.explain()
+    print(f"\n=== {name} ===")
+    for label, plan in plans.items():
+        print(f"\n-- {label}\n{plan}")
+    return {label: (np.median(t) * 1e3, np.percentile(t, 95) * 1e3) for label, t in timings.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--reseed", action="store_true")
+    args = parser.parse_args()
+
+    import django
+    django.setup()
+    from django.core.management import call_command
+    from django.db import connection
+
+    from forecasting.models import Prediction, SolarSystem
+
+    call_command("migrate", verbosity=0)
+    call_command("migrate", "forecasting", BEFORE, verbosity=0)
+
+    existing = Prediction.objects.count()
+    if args.reseed or existing < args.rows * 0.9:
+        t0 = time.perf_counter()
+        Prediction.objects.all().delete()
+        seed(args.rows, args.users)
+        print(f"Seeded {Prediction.objects.count():,} predictions in {time.perf_counter() - t0:.1f}s")
+    else:
+        print(f"Reusing {existing:,} seeded predictions ({connection.settings_dict['NAME']})")
+
+    rng = random.Random(1)
+    systems = list(SolarSystem.objects.filter(user__username__startswith="bench-").values_list("user_id", "id"))
+    last_day = Prediction.objects.order_by("-target_date").values_list("target_date", flat=True).first()
+    samples = [(uid, sid, last_day - timedelta(days=rng.randint(50, 200))) for uid, sid in rng.sample(systems, min(200, len(systems)))]
+
+    with connection.cursor() as cursor:
+        cursor.execute("ANALYZE")
+    before = run(f"before ({BEFORE})", samples, args.repeat)
+
+    call_command("migrate", "forecasting", AFTER, verbosity=0)
+    with connection.cursor() as cursor:
+        cursor.execute("ANALYZE")
+    after = run(f"after ({AFTER})", samples, args.repeat)
+
+    print(f"\n{'query':<22}{'before p50':>12}{'p95':>9}{'after p50':>12}{'p95':>9}{'speedup':>9}   (ms, {connection.vendor})")
+    for label in before:
+        b50, b95 = before[label]
+        a50, a95 = after[label]
+        print(f"{label:<22}{b50:>12.3f}{b95:>9.3f}{a50:>12.3f}{a95:>9.3f}{b50 / a50:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,20 @@
+"""
+Django settings for database benchmarks: the app's settings with the default
+database swapped for BENCH_DATABASE_URL (default: a SQLite file in the
+system temp directory). Point it at a scratch PostgreSQL database to see
+production-like plans:
+
+    BENCH_DATABASE_URL=postgres://localhost/solar_bench python -m benchmarks.bench_prediction_queries
+"""
+import os
+import tempfile
+
+import dj_database_url
+
+from Solar_Drishti.settings import *  # noqa: F401,F403
+
+DATABASES = {
+    "default": dj_database_url.parse(
+        os.environ.get("BENCH_DATABASE_URL", f"sqlite:///{os.path.join(tempfile.gettempdir(), 'solar_drishti_bench.sqlite3')}")
+    )
+}
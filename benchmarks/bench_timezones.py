@@ -0,0 +1,94 @@
+"""
+Memory and per-request time saved by centralizing timezone resolution.
+
+Memory: RSS growth of importing the finder and building one TimezoneFinder
+(what ml/timezones.py does) vs two (the old per-module instances), each
+measured in a fresh interpreter.
+Time: the old per-request work (two timezone_at calls + a new pvlib Location)
+vs the memoized lookups, and vs reading the zone stored on SolarSystem.
+
+    python -m benchmarks.bench_timezones [--repeat 5000]
+"""
+import argparse
+import json
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+_RSS_SNIPPET = """
+import json
+def rss_mb():
+    with open('/proc/self/statm') as fh:
+        return int(fh.read().split()[1]) * 4096 / 2**20
+before = rss_mb()
+from timezonefinder import TimezoneFinder
+finders = [TimezoneFinder() for _ in range({n})]
+finders[0].timezone_at(lng=-95.36, lat=29.76)
+print(json.dumps(rss_mb() - before))
+"""
+
+
+def finder_rss_mb(n: int) -> float:
+    out = subprocess.run([sys.executable, "-c", _RSS_SNIPPET.format(n=n)], capture_output=True, text=True, check=True)
+    return json.loads(out.stdout)
+
+
+def per_call_us(fn, coords, repeat: int) -> float:
+    samples = []
+    for i in range(repeat):
+        lat, lon = coords[i % len(coords)]
+        t0 = time.perf_counter()
+        fn(lat, lon)
+        samples.append(time.perf_counter() - t0)
+    return float(np.median(samples) * 1e6)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5000)
+    parser.add_argument("--systems", type=int, default=200, help="Distinct system coordinates cycled through.")
+    args = parser.parse_args()
+
+    import pvlib
+    from timezonefinder import TimezoneFinder
+
+    from forecasting.ml import timezones
+
+    rng = np.random.default_rng(0)
+    coords = list(zip(rng.uniform(25, 48, args.systems), rng.uniform(-124, -67, args.systems)))
+
+    one, two = finder_rss_mb(1), finder_rss_mb(2)
+    print(f"RSS: one finder {one:.1f} MB, two finders {two:.1f} MB -> saved {two - one:.1f} MB per worker")
+
+    legacy_finders = (TimezoneFinder(), TimezoneFinder())
+
+    def legacy(lat, lon):
+        # weather.py and solar.py each resolved the zone, solar.py built a Location
+        legacy_finders[0].timezone_at(lng=lon, lat=lat)
+        tz = legacy_finders[1].timezone_at(lng=lon, lat=lat) or "UTC"
+        pvlib.location.Location(latitude=lat, longitude=lon, tz=tz)
+
+    def memoized(lat, lon):
+        tz = timezones.timezone_at(lat, lon)
+        timezones.get_location(lat, lon, tz)
+
+    stored = {c: timezones.timezone_at(*c) for c in coords}
+
+    def persisted(lat, lon):
+        timezones.get_location(lat, lon, stored[(lat, lon)])
+
+    for lat, lon in coords:
+        memoized(lat, lon)
+
+    base = per_call_us(legacy, coords, args.repeat)
+    print(f"{'path':<34}{'median us/request':>18}")
+    print(f"{'legacy (2 lookups + Location)':<34}{base:>18.1f}")
+    for name, fn in [("memoized lookup + Location", memoized), ("stored zone + memoized Location", persisted)]:
+        us = per_call_us(fn, coords, args.repeat)
+        print(f"{name:<34}{us:>18.1f}   saves {base - us:.1f} us/request")
+
+
+if __name__ == "__main__":
+    main()
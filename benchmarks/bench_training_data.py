@@ -0,0 +1,127 @@
+"""
+load_and_split_data: the CSV path (read_csv + add_features + three isin()
+splits) vs the typed memmap cache from data_cache.py, by wall time and peak
+RSS. Each path runs in a fresh interpreter so RSS is not shared.
+
+Uses media/pv_weather_hourly.csv when present, otherwise a synthetic CSV
+with the same columns (`--rows` hourly rows over `--plants` plants).
+Also checks both paths give the same split sizes and feature sums.
+
+    python -m benchmarks.bench_training_data [--rows 1000000] [--plants 20] [--csv PATH]
+"""
+import argparse
+import json
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+PY_FILES = Path(__file__).resolve().parent.parent / "forecasting" / "ml" / "py_files"
+
+# Runs from py_files' point of view (flat imports), like run_train.py
+_CHILD = """
+import json, resource, sys, time
+sys.path.insert(0, {py_files!r})
+start = time.perf_counter()
+from config import INPUT_COLS, TARGET_COL
+from load_data import load_and_split_data
+splits = load_and_split_data(path={csv!r}, cache_dir={cache!r}, use_cache={use_cache!r})
+seconds = time.perf_counter() - start
+# Peak so far, taken before the checksums below allocate their own copies. Linux carries
+# ru_maxrss over from the parent across fork/exec; VmHWM is this address space only.
+try:
+    with open("/proc/self/status") as f:
+        max_rss_mb = next(int(line.split()[1]) for line in f if line.startswith("VmHWM:")) / 2**10
+except OSError:
+    max_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (2**20 if sys.platform == "darwin" else 2**10)
+print(json.dumps({{
+    "seconds": seconds,
+    "max_rss_mb": max_rss_mb,
+    "rows": [len(df) for df in splits],
+    "feature_sums": [float(df[INPUT_COLS].to_numpy(dtype="float64").sum()) for df in splits],
+    "target_sums": [float(df[TARGET_COL].sum()) for df in splits],
+}}))
+"""
+
+
+def synthetic_csv(path: Path, rows: int, plants: int):
+    rng = np.random.default_rng(0)
+    hours = rows // plants
+    stamps = pd.date_range("2019-01-01", periods=hours, freq="h", tz="UTC")
+    frames = []
+    for plant in range(plants):
+        hour = stamps.hour.to_numpy()
+        ghi = np.clip(900 * np.sin(np.pi * (hour - 6) / 12), 0, None) * rng.uniform(0.3, 1.0, hours)
+        capacity = rng.uniform(5, 50)
+        frames.append(pd.DataFrame({
+            "timestamp": stamps.strftime("%Y-%m-%d %H:%M:%S+00:00"),
+            "plant_id": plant,
+            "energy_mwh": ghi / 1000 * capacity * rng.uniform(0.7, 0.9, hours),
+            "capacity_mw": capacity,
+            "ghi": ghi,
+            "dni": ghi * rng.uniform(0.5, 0.9, hours),
+            "dhi": ghi * rng.uniform(0.1, 0.3, hours),
+            "air_temp": rng.normal(25, 6, hours),
+            "wind_speed": rng.gamma(2, 1.5, hours),
+            "solar_zenith": rng.uniform(0, 180, hours),
+        }))
+    pd.concat(frames).to_csv(path, index=False)
+
+
+def run_child(csv: Path, cache: Path, use_cache: bool) -> dict:
+    code = _CHILD.format(py_files=str(PY_FILES), csv=str(csv), cache=str(cache), use_cache=use_cache)
+    proc = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, cwd=PY_FILES)
+    if proc.returncode != 0:
+        raise SystemExit(proc.stderr[-2000:])
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--plants", type=int, default=20)
+    parser.add_argument("--csv", type=Path, help="CSV to use instead of the default / synthetic one.")
+    args = parser.parse_args()
+
+    sys.path.insert(0, str(PY_FILES))
+    import data_cache
+    from config import DATA_PATH
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        csv = args.csv or (DATA_PATH if DATA_PATH.exists() else None)
+        if csv is None:
+            csv = tmp / "pv_weather_hourly.csv"
+            t0 = time.perf_counter()
+            synthetic_csv(csv, args.rows, args.plants)
+            print(f"Generated synthetic {csv.name} in {time.perf_counter() - t0:.1f}s")
+        cache = tmp / "cache"
+        print(f"{csv} ({csv.stat().st_size / 2**20:.0f} MB)")
+
+        t0 = time.perf_counter()
+        rows = data_cache.build_cache(csv, cache)
+        build = time.perf_counter() - t0
+        cache_mb = sum(f.stat().st_size for f in cache.iterdir()) / 2**20
+
+        before = run_child(csv, cache, use_cache=False)
+        after = run_child(csv, cache, use_cache=True)
+
+    print(f"{rows:,} rows; one-off cache build {build:.2f}s, {cache_mb:.0f} MB on disk\n")
+    print(f"{'path':<10}{'seconds':>10}{'peak RSS MB':>14}")
+    for name, result in (("csv", before), ("cache", after)):
+        print(f"{name:<10}{result['seconds']:>10.2f}{result['max_rss_mb']:>14.0f}")
+    print(f"speedup {before['seconds'] / after['seconds']:.1f}x, RSS {before['max_rss_mb'] / after['max_rss_mb']:.1f}x lower")
+
+    same_rows = before["rows"] == after["rows"]
+    # float32 features: sums agree to float32 precision, targets exactly
+    same_features = np.allclose(before["feature_sums"], after["feature_sums"], rtol=1e-5)
+    same_target = np.allclose(before["target_sums"], after["target_sums"], rtol=1e-9)
+    print(f"split rows {after['rows']} identical={same_rows}; features match={same_features}; target match={same_target}")
+
+
+if __name__ == "__main__":
+    main()
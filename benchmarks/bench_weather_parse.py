@@ -0,0 +1,80 @@
+"""
+Per-call parse time of the full 40-entry OpenWeather payload: the original
+per-entry loop vs the vectorized parser in each resample mode.
+
+    python -m benchmarks.bench_weather_parse [--repeat 2000]
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+import pytz
+
+from forecasting.ml.weather import RESAMPLE_MODES, parse_forecast_payload
+
+
+def synthetic_payload(n: int = 40, start: int = 1_780_000_000) -> dict:
+    start -= start % 10800
+    rng = np.random.default_rng(0)
+    return {"list": [
+        {
+            "dt": start + i * 10800,
+            "main": {"temp": round(float(15 + 8 * np.sin(i / 8 * 2 * np.pi) + rng.normal()), 2)},
+            "wind": {"speed": round(float(abs(rng.normal(4, 1.5))), 2)},
+            "clouds": {"all": int(rng.integers(0, 100))},
+        }
+        for i in range(n)
+    ]}
+
+
+def legacy_parse(data: dict, timezone_str: str, hours: int) -> pd.DataFrame:
+    """The pre-vectorization loop from get_hourly_forecast, kept as the reference."""
+    local_tz = pytz.timezone(timezone_str)
+    records = []
+    for entry in data["list"]:
+        dt_naive = pd.to_datetime(entry["dt"], unit="s", utc=True).astimezone(local_tz).tz_localize(None)
+        for h in range(3):
+            records.append({
+                "timestamp": dt_naive + pd.Timedelta(hours=h),
+                "air_temp": entry["main"]["temp"],
+                "wind_speed": entry["wind"]["speed"],
+                "cloud_cover": entry["clouds"]["all"],
+            })
+    df = pd.DataFrame(records)
+    df["timestamp"] = df["timestamp"].dt.floor("h")
+    return df.sort_values("timestamp").drop_duplicates("timestamp").head(hours).reset_index(drop=True)
+
+
+def per_call_us(fn, repeat: int) -> float:
+    fn()  # warm-up
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t0)
+    return float(np.median(samples) * 1e6)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=2000)
+    parser.add_argument("--timezone", default="America/Chicago")
+    parser.add_argument("--hours", type=int, default=96)
+    args = parser.parse_args()
+
+    payload = synthetic_payload()
+    legacy = legacy_parse(payload, args.timezone, args.hours)
+    vectorized = parse_forecast_payload(payload, args.timezone, hours=args.hours, resample="ffill")
+    pd.testing.assert_frame_equal(legacy, vectorized, check_dtype=False)
+
+    base = per_call_us(lambda: legacy_parse(payload, args.timezone, args.hours), args.repeat)
+    print(f"{'parser':<20}{'median us/call':>16}{'speed-up':>10}")
+    print(f"{'legacy loop':<20}{base:>16.1f}{1.0:>9.1f}x")
+    for mode in RESAMPLE_MODES:
+        us = per_call_us(lambda: parse_forecast_payload(payload, args.timezone, hours=args.hours, resample=mode), args.repeat)
+        print(f"{'vectorized/' + mode:<20}{us:>16.1f}{base / us:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
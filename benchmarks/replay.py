@@ -0,0 +1,167 @@
+"""
+Offline replay of recorded upstream responses.
+
+`install()` mounts a requests adapter and an httpx transport on the shared
+upstream client for the OpenWeather and Open-Meteo hosts. Every request to
+those hosts gets the recorded body from `benchmarks/fixtures/`, whatever its
+coordinates, so the real get_json / aget_json path (retries, stats, JSON
+decoding) runs without a network. Any other path on those hosts fails
+instead of going online.
+
+The fixtures are one site (Jaipur, Asia/Kolkata) in each provider's response
+schema. Refresh them from the live APIs (needs OPENWEATHER_API_KEY) with
+
+    python -m benchmarks.replay record [--lat 26.9124 --lon 75.7873 --timezone Asia/Kolkata]
+"""
+import argparse
+import json
+from collections import Counter
+from pathlib import Path
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import BaseAdapter
+
+FIXTURES_DIR = Path(__file__).resolve().parent / "fixtures"
+
+# endpoint -> fixture file
+FIXTURES = {
+    "openweather_forecast": "openweather_forecast.json",
+    "open_meteo_forecast": "open_meteo_forecast.json",
+    "openweather_geocode": "openweather_geocode.json",
+}
+
+
+def _endpoint_urls():
+    from forecasting.ml.solar import OPEN_METEO_FORECAST_URL
+    from forecasting.ml.upstream import OPENWEATHER_GEOCODE_URL
+    from forecasting.ml.weather import OPENWEATHER_FORECAST_URL
+
+    return {
+        "openweather_forecast": OPENWEATHER_FORECAST_URL,
+        "open_meteo_forecast": OPEN_METEO_FORECAST_URL,
+        "openweather_geocode": OPENWEATHER_GEOCODE_URL,
+    }
+
+
+def load_fixture(endpoint: str) -> dict:
+    return json.loads((FIXTURES_DIR / FIXTURES[endpoint]).read_bytes())
+
+
+def fixture_timezone() -> str:
+    """Open-Meteo answers in the requested zone; replayed sites must use the recorded one."""
+    return load_fixture("open_meteo_forecast")["timezone"]
+
+
+class Recording:
+    """Recorded bodies keyed by scheme://host/path, plus a hit counter per endpoint."""
+
+    def __init__(self, fixtures_dir: Path = FIXTURES_DIR):
+        self.bodies = {}
+        self.endpoints = {}
+        for endpoint, url in _endpoint_urls().items():
+            key = _path_key(url)
+            self.bodies[key] = (fixtures_dir / FIXTURES[endpoint]).read_bytes()
+            self.endpoints[key] = endpoint
+        self.hits = Counter()
+
+    def body_for(self, url: str):
+        key = _path_key(url)
+        body = self.bodies.get(key)
+        if body is not None:
+            self.hits[self.endpoints[key]] += 1
+        return body
+
+
+class ReplayAdapter(BaseAdapter):
+    """requests transport adapter answering from a Recording."""
+
+    def __init__(self, recording: Recording):
+        super().__init__()
+        self.recording = recording
+
+    def send(self, request, **kwargs):
+        body = self.recording.body_for(request.url)
+        if body is None:
+            raise requests.ConnectionError(f"No recorded response for {request.url}", request=request)
+        response = requests.Response()
+        response.status_code = 200
+        response.headers["Content-Type"] = "application/json; charset=utf-8"
+        response._content = body
+        response.encoding = "utf-8"
+        response.url = request.url
+        response.request = request
+        return response
+
+    def close(self):
+        pass
+
+
+def replay_transport(recording: Recording):
+    """httpx transport answering from a Recording (for the async path)."""
+    import httpx
+
+    class ReplayTransport(httpx.AsyncBaseTransport):
+        async def handle_async_request(self, request):
+            body = recording.body_for(str(request.url))
+            if body is None:
+                raise httpx.ConnectError(f"No recorded response for {request.url}", request=request)
+            return httpx.Response(200, headers={"Content-Type": "application/json; charset=utf-8"},
+                                  content=body, request=request)
+
+    return ReplayTransport()
+
+
+def install(client=None) -> Recording:
+    """Serve every fixture host of `client` (the shared upstream client by default) from the recording."""
+    from forecasting.ml import upstream
+
+    client = client or upstream.client
+    recording = Recording()
+    adapter = ReplayAdapter(recording)
+    transport = replay_transport(recording)
+    for url in _endpoint_urls().values():
+        host = "{0.scheme}://{0.netloc}".format(urlsplit(url))
+        client.mount(host, adapter)
+        client.mount_async(host, transport)
+    return recording
+
+
+def _path_key(url: str) -> str:
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}{parts.path}"
+
+
+def record(lat: float, lon: float, timezone_str: str):
+    """Fetch every fixture endpoint live for one site and overwrite the fixtures."""
+    from forecasting.ml import upstream
+    from forecasting.ml.solar import OPEN_METEO_FORECAST_URL, _radiation_params
+    from forecasting.ml.weather import OPENWEATHER_API_KEY, OPENWEATHER_FORECAST_URL, _forecast_params
+
+    payloads = {
+        "openweather_forecast": upstream.get_json("openweather_forecast", OPENWEATHER_FORECAST_URL,
+                                                  params=_forecast_params(lat, lon)),
+        "open_meteo_forecast": upstream.get_json("open_meteo_forecast", OPEN_METEO_FORECAST_URL,
+                                                 params=_radiation_params(lat, lon, timezone_str)),
+        "openweather_geocode": upstream.get_json("openweather_geocode", upstream.OPENWEATHER_GEOCODE_URL,
+                                                 params={"lat": lat, "lon": lon, "limit": 1, "appid": OPENWEATHER_API_KEY}),
+    }
+    FIXTURES_DIR.mkdir(parents=True, exist_ok=True)
+    for endpoint, payload in payloads.items():
+        path = FIXTURES_DIR / FIXTURES[endpoint]
+        path.write_text(json.dumps(payload, indent=1))
+        print(f"{endpoint}: {path} ({path.stat().st_size:,} bytes)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["record"])
+    parser.add_argument("--lat", type=float, default=26.9124)
+    parser.add_argument("--lon", type=float, default=75.7873)
+    parser.add_argument("--timezone", default="Asia/Kolkata")
+    args = parser.parse_args()
+    record(args.lat, args.lon, args.timezone)
+
+
+if __name__ == "__main__":
+    main()
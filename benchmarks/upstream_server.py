@@ -0,0 +1,491 @@
+"""
+Local stand-in for the upstream weather APIs, for load tests that must not
+spend API quota:
+
+- OpenWeather  /data/2.5/forecast, /geo/1.0/reverse
+- Open-Meteo   /v1/forecast
+
+Point the app at it with
+
+    OPENWEATHER_BASE_URL=http://127.0.0.1:8900 OPEN_METEO_BASE_URL=http://127.0.0.1:8900
+
+Payloads for any lat/lon come from one of three sources:
+
+- recorded (default): the fixtures in --payload-dir (benchmarks/fixtures),
+  the recording nearest to the requested site, moved to the current forecast
+  window: OpenWeather steps start at the current 3-hour slot and Open-Meteo
+  hours at today's midnight in the requested timezone.
+- synthetic: generated per site from a clear-sky model with seeded clouds,
+  temperature and wind, so every site gets a distinct, deterministic answer.
+- record: forwarded to the real APIs (the app's appid is passed through),
+  saved as <endpoint>@<lat>,<lon>.json in --payload-dir and returned. Later
+  runs in "recorded" mode replay them.
+
+Each response can be delayed (--latency-ms plus up to --jitter-ms), replaced
+by a 5xx (--error-rate) or by a 429 with Retry-After once a token bucket of
+--rate-limit requests/s (--burst deep) is empty. GET /_stats returns the
+request counts per endpoint and status.
+
+    python -m benchmarks.upstream_server [--port 8900] [--source recorded|synthetic|record]
+        [--latency-ms 150] [--jitter-ms 100] [--error-rate 0.01] [--rate-limit 50 --burst 20]
+"""
+import argparse
+import gzip
+import json
+import math
+import random
+import threading
+import time
+import zlib
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlsplit
+from zoneinfo import ZoneInfo
+
+import numpy as np
+import requests
+
+from benchmarks.replay import FIXTURES_DIR
+
+# path -> endpoint name (the names used by forecasting.ml.upstream.ENDPOINTS)
+ROUTES = {
+    "/data/2.5/forecast": "openweather_forecast",
+    "/geo/1.0/reverse": "openweather_geocode",
+    "/v1/forecast": "open_meteo_forecast",
+}
+# Where "record" mode forwards to (not the app's configurable base URLs, which may point here)
+REAL_URLS = {
+    "openweather_forecast": "https://api.openweathermap.org/data/2.5/forecast",
+    "openweather_geocode": "https://api.openweathermap.org/geo/1.0/reverse",
+    "open_meteo_forecast": "https://api.open-meteo.com/v1/forecast",
+}
+OPEN_METEO_VARIABLES = ("shortwave_radiation", "direct_normal_irradiance", "diffuse_radiation")
+SOURCES = ("recorded", "synthetic", "record")
+GZIP_MIN_BYTES = 1024
+
+
+class UpstreamError(Exception):
+    def __init__(self, status: int, body: dict, headers: dict = None):
+        super().__init__(status)
+        self.status, self.body, self.headers = status, body, headers or {}
+
+
+def _param(params: dict, name: str, cast=str, default=None):
+    try:
+        return cast(params[name][0])
+    except KeyError:
+        if default is not None:
+            return default
+        raise UpstreamError(400, {"cod": "400", "message": f"missing parameter {name}"})
+    except ValueError:
+        raise UpstreamError(400, {"cod": "400", "message": f"bad parameter {name}"})
+
+
+def _site(params: dict, lat_name: str, lon_name: str):
+    return _param(params, lat_name, float), _param(params, lon_name, float)
+
+
+def _forecast_start(now: float) -> int:
+    """Current 3-hour slot, where OpenWeather's list starts."""
+    return int(now) // 10800 * 10800
+
+
+def _local_midnight(timezone_str: str, now: float):
+    try:
+        zone = ZoneInfo(timezone_str)
+    except (KeyError, ValueError):
+        raise UpstreamError(400, {"error": True, "reason": f"Invalid timezone {timezone_str!r}"})
+    local = datetime.fromtimestamp(now, zone)
+    return local.replace(hour=0, minute=0, second=0, microsecond=0), zone
+
+
+def _open_meteo_envelope(lat, lon, timezone_str, zone, midnight, hourly):
+    offset = int(midnight.utcoffset().total_seconds())
+    return {
+        "latitude": round(lat, 4), "longitude": round(lon, 4), "generationtime_ms": 0.05,
+        "utc_offset_seconds": offset, "timezone": timezone_str,
+        "timezone_abbreviation": midnight.tzname(), "elevation": 0.0,
+        "hourly_units": {"time": "iso8601", **{name: "W/m²" for name in hourly if name != "time"}},
+        "hourly": hourly,
+    }
+
+
+def _open_meteo_request(params):
+    lat, lon = _site(params, "latitude", "longitude")
+    timezone_str = _param(params, "timezone", default="GMT")
+    days = _param(params, "forecast_days", int, default=7)
+    variables = [v for v in _param(params, "hourly", default=",".join(OPEN_METEO_VARIABLES)).split(",") if v]
+    return lat, lon, timezone_str, days, variables
+
+
+# --- Recorded payloads ---
+
+class RecordedSource:
+    """Fixtures (and recordings) in `directory`, moved to the current forecast window."""
+
+    def __init__(self, directory: Path = FIXTURES_DIR):
+        # endpoint -> [((lat, lon) or None, payload)]
+        self.payloads = {endpoint: [] for endpoint in ROUTES.values()}
+        for path in sorted(directory.glob("*.json")):
+            endpoint, _, coords = path.stem.partition("@")
+            if endpoint not in self.payloads:
+                continue
+            site = tuple(float(v) for v in coords.split(",")) if coords else None
+            self.payloads[endpoint].append((site, json.loads(path.read_bytes())))
+        missing = [endpoint for endpoint, found in self.payloads.items() if not found]
+        if missing:
+            raise FileNotFoundError(f"No recorded payloads for {', '.join(missing)} in {directory}")
+
+    def _nearest(self, endpoint, lat, lon):
+        candidates = self.payloads[endpoint]
+        located = [(site, payload) for site, payload in candidates if site is not None]
+        if not located:
+            return candidates[0][1]
+        return min(located, key=lambda c: (c[0][0] - lat) ** 2 + (c[0][1] - lon) ** 2)[1]
+
+    def openweather_forecast(self, params, now):
+        lat, lon = _site(params, "lat", "lon")
+        recorded = self._nearest("openweather_forecast", lat, lon)
+        steps = recorded["list"]
+        count = min(_param(params, "cnt", int, default=len(steps)), len(steps))
+        shift = _forecast_start(now) - steps[0]["dt"]
+        entries = []
+        for entry in steps[:count]:
+            dt = entry["dt"] + shift
+            entries.append({**entry, "dt": dt,
+                            "dt_txt": datetime.fromtimestamp(dt, timezone.utc).strftime("%Y-%m-%d %H:%M:%S")})
+        city = dict(recorded.get("city", {}), coord={"lat": lat, "lon": lon})
+        return {**recorded, "cnt": count, "list": entries, "city": city}
+
+    def open_meteo_forecast(self, params, now):
+        lat, lon, timezone_str, days, variables = _open_meteo_request(params)
+        recorded = self._nearest("open_meteo_forecast", lat, lon)["hourly"]
+        midnight, zone = _local_midnight(timezone_str, now)
+        hours = days * 24
+        hourly = {"time": _local_hours(midnight, zone, hours)}
+        for name in variables:
+            if name in recorded:
+                values = recorded[name]
+                # Recordings start at local midnight too, so the hour of day lines up
+                hourly[name] = [values[i % len(values)] for i in range(hours)]
+        return _open_meteo_envelope(lat, lon, timezone_str, zone, midnight, hourly)
+
+    def openweather_geocode(self, params, now):
+        lat, lon = _site(params, "lat", "lon")
+        places = self._nearest("openweather_geocode", lat, lon)
+        return [{**place, "lat": lat, "lon": lon} for place in places[:_param(params, "limit", int, default=5)]]
+
+
+def _local_hours(midnight, zone, hours):
+    # Wall-clock hours from local midnight, stepped in UTC so DST days have 23 / 25 hours
+    start = midnight.astimezone(timezone.utc)
+    return [(start + timedelta(hours=h)).astimezone(zone).strftime("%Y-%m-%dT%H:%M") for h in range(hours)]
+
+
+# --- Synthetic payloads ---
+
+def _cos_zenith(lat, lon, epoch):
+    """Cosine of the solar zenith angle (NOAA approximations, ~0.5 deg)."""
+    t = np.asarray(epoch, dtype=np.float64)
+    day = t / 86400.0
+    gamma = 2 * np.pi / 365.0 * (np.mod(day, 365.2422) - 0.5)
+    eqtime = 229.18 * (0.000075 + 0.001868 * np.cos(gamma) - 0.032077 * np.sin(gamma)
+                       - 0.014615 * np.cos(2 * gamma) - 0.040849 * np.sin(2 * gamma))
+    decl = (0.006918 - 0.399912 * np.cos(gamma) + 0.070257 * np.sin(gamma) - 0.006758 * np.cos(2 * gamma)
+            + 0.000907 * np.sin(2 * gamma) - 0.002697 * np.cos(3 * gamma) + 0.00148 * np.sin(3 * gamma))
+    minutes = np.mod(t, 86400.0) / 60.0 + eqtime + 4 * lon
+    hour_angle = np.radians(minutes / 4 - 180)
+    phi = np.radians(lat)
+    return np.sin(phi) * np.sin(decl) + np.cos(phi) * np.cos(decl) * np.cos(hour_angle)
+
+
+class SyntheticSource:
+    """Deterministic weather per 0.01 deg cell and UTC day: clear sky dimmed by seeded clouds."""
+
+    def _rng(self, lat, lon, start):
+        seed = zlib.crc32(f"{round(lat, 2)}:{round(lon, 2)}:{int(start) // 86400}".encode())
+        return np.random.default_rng(seed)
+
+    def _clouds(self, lat, lon, start, hours):
+        # Smooth 0..1 cloud fraction per hour from `start` (UTC midnight of its day)
+        rng = self._rng(lat, lon, start)
+        noise = rng.uniform(0, 1, hours + 12)
+        return np.clip(np.convolve(noise, np.ones(12) / 12, "same")[:hours] * 1.8 - 0.5, 0, 1)
+
+    def _hourly_weather(self, lat, lon, epoch, day0):
+        hours = ((epoch - day0) // 3600).astype(int)
+        clouds = self._clouds(lat, lon, day0, int(hours.max()) + 1)[hours]
+        solar_hour = np.mod(np.mod(epoch, 86400) / 3600 + lon / 15, 24)
+        base = 30 - 0.45 * max(abs(lat) - 12, 0)
+        temp = base + 6 * np.sin((solar_hour - 9) / 24 * 2 * np.pi) - 3 * clouds
+        rng = self._rng(lon, lat, day0)
+        wind = np.abs(rng.normal(3.5, 1.4, len(epoch)))
+        return clouds, temp, wind
+
+    def openweather_forecast(self, params, now):
+        lat, lon = _site(params, "lat", "lon")
+        count = min(_param(params, "cnt", int, default=40), 40)
+        epoch = _forecast_start(now) + 10800 * np.arange(count)
+        day0 = epoch[0] // 86400 * 86400
+        clouds, temp, wind = self._hourly_weather(lat, lon, epoch, day0)
+        entries = []
+        for dt, c, t, w in zip(epoch.tolist(), clouds, temp, wind):
+            pod = "d" if _cos_zenith(lat, lon, dt) > 0 else "n"
+            entries.append({
+                "dt": dt,
+                "main": {"temp": round(float(t), 2), "feels_like": round(float(t) - 0.8, 2),
+                         "temp_min": round(float(t) - 0.5, 2), "temp_max": round(float(t) + 0.5, 2),
+                         "pressure": 1008, "sea_level": 1008, "grnd_level": 990, "humidity": int(70 - 25 * (1 - c)),
+                         "temp_kf": 0},
+                "weather": [{"id": 800 if c < 0.1 else 802, "main": "Clear" if c < 0.1 else "Clouds",
+                             "description": "clear sky" if c < 0.1 else "scattered clouds",
+                             "icon": ("01" if c < 0.1 else "03") + pod}],
+                "clouds": {"all": int(round(float(c) * 100))},
+                "wind": {"speed": round(float(w), 2), "deg": 270, "gust": round(float(w) * 1.4, 2)},
+                "visibility": 10000, "pop": 0, "sys": {"pod": pod},
+                "dt_txt": datetime.fromtimestamp(dt, timezone.utc).strftime("%Y-%m-%d %H:%M:%S"),
+            })
+        city = {"id": 0, "name": f"Synthetic {lat:.2f},{lon:.2f}", "coord": {"lat": lat, "lon": lon},
+                "country": "XX", "population": 0, "timezone": 0, "sunrise": 0, "sunset": 0}
+        return {"cod": "200", "message": 0, "cnt": count, "list": entries, "city": city}
+
+    def open_meteo_forecast(self, params, now):
+        lat, lon, timezone_str, days, variables = _open_meteo_request(params)
+        midnight, zone = _local_midnight(timezone_str, now)
+        hours = days * 24
+        # Hour-ending averages: evaluate the sun at the middle of the previous hour
+        epoch = midnight.timestamp() + 3600 * np.arange(hours)
+        cos_z = np.clip(_cos_zenith(lat, lon, epoch - 1800), 0, None)
+        day0 = int(epoch[0]) // 86400 * 86400
+        hour_index = ((epoch - day0) // 3600).astype(int)
+        clouds = self._clouds(lat, lon, day0, int(hour_index.max()) + 1)[hour_index]
+        with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+            ghi_clear = np.where(cos_z > 0, 1098 * cos_z * np.exp(-0.057 / cos_z), 0.0)
+            dni_clear = np.where(cos_z > 0.01, 1000 * 0.72 ** (1 / cos_z), 0.0)
+        ghi = ghi_clear * (1 - 0.75 * clouds ** 3.4)
+        dni = dni_clear * (1 - clouds) ** 1.5
+        values = {
+            "shortwave_radiation": ghi,
+            "direct_normal_irradiance": dni,
+            "diffuse_radiation": np.maximum(ghi - dni * cos_z, 0),
+        }
+        hourly = {"time": _local_hours(midnight, zone, hours)}
+        for name in variables:
+            if name in values:
+                hourly[name] = np.round(values[name], 1).tolist()
+        return _open_meteo_envelope(lat, lon, timezone_str, zone, midnight, hourly)
+
+    def openweather_geocode(self, params, now):
+        lat, lon = _site(params, "lat", "lon")
+        return [{"name": f"Synthetic {lat:.2f},{lon:.2f}", "lat": lat, "lon": lon, "country": "XX"}]
+
+
+# --- Record mode ---
+
+class RecordingSource:
+    """Forward to the real APIs and keep each answer for later "recorded" runs."""
+
+    def __init__(self, directory: Path = FIXTURES_DIR, timeout: float = 30):
+        self.directory = directory
+        self.timeout = timeout
+        self.session = requests.Session()
+        self._lock = threading.Lock()
+
+    def _forward(self, endpoint, params, lat_name, lon_name):
+        lat, lon = _site(params, lat_name, lon_name)
+        resp = self.session.get(REAL_URLS[endpoint], params={k: v[0] for k, v in params.items()}, timeout=self.timeout)
+        if resp.status_code >= 400:
+            raise UpstreamError(resp.status_code, resp.json() if resp.content else {})
+        payload = resp.json()
+        path = self.directory / f"{endpoint}@{lat:.2f},{lon:.2f}.json"
+        with self._lock:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            path.write_text(json.dumps(payload, indent=1))
+        return payload
+
+    def openweather_forecast(self, params, now):
+        return self._forward("openweather_forecast", params, "lat", "lon")
+
+    def open_meteo_forecast(self, params, now):
+        return self._forward("open_meteo_forecast", params, "latitude", "longitude")
+
+    def openweather_geocode(self, params, now):
+        return self._forward("openweather_geocode", params, "lat", "lon")
+
+
+# --- Faults ---
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: int):
+        self.rate, self.capacity = rate, max(burst, 1)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def take(self):
+        """None if a request may proceed, else seconds until the next token."""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return None
+            return (1 - self.tokens) / self.rate
+
+
+class Faults:
+    def __init__(self, latency_ms=0.0, jitter_ms=0.0, error_rate=0.0, rate_limit=0.0, burst=10, seed=None):
+        self.latency = latency_ms / 1000
+        self.jitter = jitter_ms / 1000
+        self.error_rate = error_rate
+        self.bucket = TokenBucket(rate_limit, burst) if rate_limit > 0 else None
+        self.random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def delay(self) -> float:
+        with self._lock:
+            return self.latency + (self.random.uniform(0, self.jitter) if self.jitter else 0.0)
+
+    def check(self):
+        """Raise the injected error for this request, if any."""
+        if self.bucket is not None:
+            wait = self.bucket.take()
+            if wait is not None:
+                raise UpstreamError(429, {"cod": 429, "message": "Your account is temporary blocked due to exceeding of requests limitation"},
+                                    {"Retry-After": str(max(1, math.ceil(wait)))})
+        with self._lock:
+            failed = self.error_rate and self.random.random() < self.error_rate
+            status = self.random.choice((500, 502, 503)) if failed else None
+        if status:
+            raise UpstreamError(status, {"cod": str(status), "message": "Injected upstream error"})
+
+
+# --- Server ---
+
+class UpstreamHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real APIs
+    server_version = "StandInUpstream/1.0"
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        if url.path == "/_stats":
+            return self._send(200, self.server.stats())
+        endpoint = ROUTES.get(url.path)
+        if endpoint is None:
+            return self._send(404, {"cod": "404", "message": "Internal error"}, endpoint="unknown")
+
+        time.sleep(self.server.faults.delay())
+        try:
+            self.server.faults.check()
+            params = parse_qs(url.query)
+            payload = getattr(self.server.source, endpoint)(params, time.time())
+        except UpstreamError as e:
+            return self._send(e.status, e.body, e.headers, endpoint=endpoint)
+        except Exception as e:
+            self.log_error(f"{endpoint} failed: {e!r}")
+            return self._send(500, {"cod": "500", "message": str(e)}, endpoint=endpoint)
+        self._send(200, payload, endpoint=endpoint)
+
+    def _send(self, status, payload, headers=None, endpoint=None):
+        body = json.dumps(payload, separators=(",", ":")).encode()
+        gzipped = len(body) >= GZIP_MIN_BYTES and "gzip" in self.headers.get("Accept-Encoding", "")
+        if gzipped:
+            body = gzip.compress(body, compresslevel=5)
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        if gzipped:
+            self.send_header("Content-Encoding", "gzip")
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+        if endpoint is not None:
+            self.server.count(endpoint, status)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+class UpstreamServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+    def __init__(self, address, source, faults: Faults = None, verbose: bool = False):
+        super().__init__(address, UpstreamHandler)
+        self.source = source
+        self.faults = faults or Faults()
+        self.verbose = verbose
+        self._counts = Counter()
+        self._lock = threading.Lock()
+        self.started = time.time()
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def count(self, endpoint, status):
+        with self._lock:
+            self._counts[(endpoint, status)] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            counts = dict(self._counts)
+        report = {}
+        for (endpoint, status), n in sorted(counts.items()):
+            report.setdefault(endpoint, {})[str(status)] = n
+        return {"uptime_seconds": round(time.time() - self.started, 1), "requests": report}
+
+
+def make_source(name: str, payload_dir: Path = FIXTURES_DIR):
+    if name not in SOURCES:
+        raise ValueError(f"Unknown source {name!r}; expected one of {SOURCES}")
+    if name == "synthetic":
+        return SyntheticSource()
+    if name == "record":
+        return RecordingSource(payload_dir)
+    return RecordedSource(payload_dir)
+
+
+def serve_in_thread(source="recorded", host="127.0.0.1", port=0, payload_dir: Path = FIXTURES_DIR, **faults):
+    """Start a server on a background thread (port 0 = any free port); call .shutdown() when done."""
+    server = UpstreamServer((host, port), make_source(source, payload_dir), Faults(**faults))
+    threading.Thread(target=server.serve_forever, name="upstream-server", daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--source", choices=SOURCES, default="recorded")
+    parser.add_argument("--payload-dir", type=Path, default=FIXTURES_DIR)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="fixed delay per response")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="extra uniform delay, 0..jitter")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests answered with a 5xx")
+    parser.add_argument("--rate-limit", type=float, default=0.0, help="requests/s before 429s (0 = unlimited)")
+    parser.add_argument("--burst", type=int, default=10, help="token bucket depth for --rate-limit")
+    parser.add_argument("--seed", type=int, help="seed for jitter and error injection")
+    parser.add_argument("--verbose", action="store_true", help="log every request")
+    args = parser.parse_args()
+
+    faults = Faults(args.latency_ms, args.jitter_ms, args.error_rate, args.rate_limit, args.burst, args.seed)
+    server = UpstreamServer((args.host, args.port), make_source(args.source, args.payload_dir), faults, args.verbose)
+    print(f"Serving {args.source} payloads on {server.base_url}")
+    print(f"  OPENWEATHER_BASE_URL={server.base_url} OPEN_METEO_BASE_URL={server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(json.dumps(server.stats(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
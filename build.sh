@@ -2,3 +2,7 @@
 pip install -r requirements.txt
 python manage.py collectstatic --noinput
 python manage.py migrate
+python manage.py createcachetable
+
+# Start command (ASGI; see README):
+#   gunicorn Solar_Drishti.asgi:application -k uvicorn.workers.UvicornWorker --workers 4 --bind 0.0.0.0:$PORT
@@ -0,0 +1,174 @@
+# forecasting/actuals_import.py
+"""
+Bulk import of actual daily yields from inverter CSV exports.
+
+The CSV is read line by line (uploads and files are never loaded whole),
+matched to Prediction rows by system and target_date, and written with
+`bulk_update` in batches. Everything runs in one transaction, so a failed
+import leaves no partial writes. Rollups are updated per batch and
+`actuals_in_cycle` once per system at the end.
+
+Expected columns (header names are case-insensitive, first match wins):
+    system   system id or name        (optional when a system is given)
+    date     target date, YYYY-MM-DD  (also: target_date, day)
+    actual   daily yield in kWh       (also: actual_value, yield, energy_kwh, kwh)
+"""
+import codecs
+import csv
+import math
+import time
+from collections import Counter
+from datetime import date
+
+from decouple import config
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from . import rollups
+from .models import Prediction, SolarSystem
+
+# Parsed rows per bulk_update / rollup round-trip
+IMPORT_BATCH_SIZE = config("IMPORT_BATCH_SIZE", default=2000, cast=int)
+# Rows per UPDATE ... CASE statement that bulk_update emits
+UPDATE_BATCH_SIZE = 500
+# Per-row problems echoed back to the caller (the counts are always complete)
+IMPORT_MAX_ERRORS = 50
+
+COLUMNS = {
+    "system": ("system", "system_id", "system_name"),
+    "date": ("date", "target_date", "day"),
+    "actual": ("actual", "actual_value", "actual_val", "yield", "energy_kwh", "kwh"),
+}
+
+
+class ActualsImportError(ValueError):
+    """The file itself cannot be imported (missing columns, unknown system)."""
+
+
+def _column_indexes(header, need_system):
+    names = [h.strip().lower() for h in header]
+    found = {}
+    for key, aliases in COLUMNS.items():
+        for alias in aliases:
+            if alias in names:
+                found[key] = names.index(alias)
+                break
+    missing = [k for k in ("date", "actual") + (("system",) if need_system else ()) if k not in found]
+    if missing:
+        raise ActualsImportError(f"CSV header is missing column(s): {', '.join(missing)}")
+    return found
+
+
+def iter_lines(source, encoding="utf-8-sig"):
+    """Decoded lines from a file / UploadedFile / HttpRequest, read incrementally."""
+    return codecs.iterdecode(source, encoding)
+
+
+def import_actuals(user, lines, system=None, batch_size=IMPORT_BATCH_SIZE):
+    """
+    Apply the actual yields in CSV `lines` to `user`'s predictions. `system`
+    pins every row to one SolarSystem (the system column is then optional).
+    Future dates are skipped like in manual_update_actual. Returns a summary
+    dict with counts, the first errors and rows/sec. Counts are per CSV row
+    (rows = matched + unmatched + invalid + future); `updated` counts
+    prediction writes.
+    """
+    t0 = time.perf_counter()
+    systems = {s.id: s for s in SolarSystem.objects.filter(user=user)}
+    if system is not None and system.id not in systems:
+        raise ActualsImportError("System not found.")
+    by_name = {s.name.lower(): s.id for s in systems.values()}
+    today = timezone.now().date()
+
+    reader = csv.reader(lines)
+    header = next(reader, None)
+    if header is None:
+        raise ActualsImportError("CSV file is empty.")
+    cols = _column_indexes(header, need_system=system is None)
+
+    stats = Counter(rows=0, matched=0, updated=0, unmatched=0, invalid=0, future=0)
+    errors = []
+    newly_verified = Counter()
+
+    def reject(line_no, reason):
+        stats["invalid"] += 1
+        if len(errors) < IMPORT_MAX_ERRORS:
+            errors.append(f"line {line_no}: {reason}")
+
+    def flush(batch, row_counts):
+        # batch: {(system_id, target_date): actual}, the last CSV row for a key wins;
+        # row_counts: CSV rows per key. One query per batch; pairs the IN filters
+        # over-select are skipped below.
+        predictions = rollups.lock_predictions(Prediction.objects.filter(
+            system_id__in={system_id for system_id, _ in batch},
+            target_date__in={day for _, day in batch},
+        ))
+        matched_keys = set()
+        changed, deltas = [], []
+        for p in predictions:
+            actual = batch.get((p.system_id, p.target_date))
+            if actual is None:
+                continue
+            matched_keys.add((p.system_id, p.target_date))
+            if p.actual_value == actual:
+                continue
+            if p.actual_value is None:
+                newly_verified[p.system_id] += 1
+            deltas.append((p, p.actual_value, actual))
+            p.actual_value = actual
+            changed.append(p)
+        Prediction.objects.bulk_update(changed, ["actual_value"], batch_size=UPDATE_BATCH_SIZE)
+        rollups.apply_changes(deltas)
+        matched_rows = sum(row_counts[key] for key in matched_keys)
+        stats["matched"] += matched_rows
+        stats["unmatched"] += sum(row_counts.values()) - matched_rows
+        stats["updated"] += len(changed)
+
+    with transaction.atomic():
+        batch, row_counts = {}, Counter()
+        for line_no, row in enumerate(reader, start=2):
+            if not any(cell.strip() for cell in row):
+                continue
+            stats["rows"] += 1
+            try:
+                day = date.fromisoformat(row[cols["date"]].strip())
+                actual = float(row[cols["actual"]])
+            except (IndexError, ValueError):
+                reject(line_no, "bad date or actual value")
+                continue
+            if not math.isfinite(actual) or actual < 0:
+                reject(line_no, "actual value must be a non-negative number")
+                continue
+            if day > today:
+                stats["future"] += 1
+                continue
+
+            if system is not None:
+                system_id = system.id
+            else:
+                ref = row[cols["system"]].strip() if cols["system"] < len(row) else ""
+                system_id = int(ref) if ref.isdigit() and int(ref) in systems else by_name.get(ref.lower())
+                if system_id is None:
+                    reject(line_no, f"unknown system {ref!r}")
+                    continue
+
+            batch[(system_id, day)] = actual
+            row_counts[(system_id, day)] += 1
+            if len(batch) >= batch_size:
+                flush(batch, row_counts)
+                batch, row_counts = {}, Counter()
+        if batch:
+            flush(batch, row_counts)
+
+        # Same rule as manual_update_actual: each newly verified prediction counts once
+        for system_id, count in newly_verified.items():
+            SolarSystem.objects.filter(id=system_id).update(actuals_in_cycle=F("actuals_in_cycle") + count)
+
+    seconds = time.perf_counter() - t0
+    return {
+        **stats,
+        "errors": errors,
+        "seconds": round(seconds, 3),
+        "rows_per_sec": round(stats["rows"] / seconds, 1) if seconds > 0 else None,
+    }
@@ -1,5 +1,17 @@
 from django.apps import AppConfig
+from decouple import config
 
 
 class ForecastingConfig(AppConfig):
     name = 'forecasting'
+
+    def ready(self):
+        # The ML stack is imported lazily (see forecasting/ml/__init__.py).
+        # Opt-in for workers that serve predictions: ML_PRELOAD imports it at
+        # startup, MODEL_PRELOAD also loads + warms the model. With
+        # `gunicorn --preload` this runs once in the master and workers share
+        # it copy-on-write.
+        model_preload = config("MODEL_PRELOAD", default=False, cast=bool)
+        if model_preload or config("ML_PRELOAD", default=False, cast=bool):
+            from . import ml
+            ml.preload(model=model_preload)
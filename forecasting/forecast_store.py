@@ -0,0 +1,83 @@
+# forecasting/forecast_store.py
+"""Read/write helpers for the SystemForecast table and its freshness rules."""
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from decouple import config
+from django.utils import timezone
+
+from .ml.forecast_cache import PROVIDER_UPDATE_SECONDS, run_slot
+from .models import SystemForecast
+
+# A stored forecast is served only while it is younger than this...
+FORECAST_STORE_MAX_AGE_HOURS = config("FORECAST_STORE_MAX_AGE_HOURS", default=12.0, cast=float)
+# ...and built from an upstream run at most this many runs behind the current one.
+FORECAST_STORE_MAX_RUNS_BEHIND = config("FORECAST_STORE_MAX_RUNS_BEHIND", default=4, cast=int)
+
+
+def current_upstream_run():
+    return datetime.fromtimestamp(run_slot("openweather"), tz=dt_timezone.utc)
+
+
+def is_fresh(forecast: SystemForecast, now=None) -> bool:
+    now = now or timezone.now()
+    if now - forecast.computed_at > timedelta(hours=FORECAST_STORE_MAX_AGE_HOURS):
+        return False
+    if forecast.upstream_run_at is None:
+        return True
+    runs_behind = (current_upstream_run() - forecast.upstream_run_at).total_seconds() / PROVIDER_UPDATE_SECONDS["openweather"]
+    return runs_behind <= FORECAST_STORE_MAX_RUNS_BEHIND
+
+
+def get_fresh_forecast(system, target_date):
+    """One lookup on the (system, target_date) unique index; None if missing or stale."""
+    forecast = SystemForecast.objects.filter(system=system, target_date=target_date).first()
+    if forecast is not None and is_fresh(forecast):
+        return forecast
+    return None
+
+
+async def aget_fresh_forecast(system, target_date):
+    forecast = await SystemForecast.objects.filter(system=system, target_date=target_date).afirst()
+    if forecast is not None and is_fresh(forecast):
+        return forecast
+    return None
+
+
+# bulk_create kwargs of every SystemForecast writer (this module and fleet.py)
+UPSERT = dict(
+    update_conflicts=True,
+    unique_fields=["system", "target_date"],
+    update_fields=["pred_value", "ghi", "air_temp", "wind_speed", "computed_at", "upstream_run_at"],
+)
+
+
+def _daily_rows(system, daily_df, target_dates):
+    computed_at = timezone.now()
+    upstream_run_at = current_upstream_run()
+    rows = daily_df[daily_df["date"].isin(set(target_dates))]
+    return [
+        SystemForecast(
+            system=system,
+            target_date=row.date,
+            pred_value=round(float(row.daily_energy) * system.system_size, 2),
+            ghi=round(float(row.ghi), 2),
+            air_temp=round(float(row.air_temp), 1),
+            wind_speed=round(float(row.wind_speed), 1),
+            computed_at=computed_at,
+            upstream_run_at=upstream_run_at,
+        )
+        for row in rows.itertuples(index=False)
+    ]
+
+
+def store_daily_forecasts(system, daily_df, target_dates):
+    """Write-through: upsert the live result for `target_dates` so the next request is a lookup."""
+    forecasts = _daily_rows(system, daily_df, target_dates)
+    SystemForecast.objects.bulk_create(forecasts, **UPSERT)
+    return forecasts
+
+
+async def astore_daily_forecasts(system, daily_df, target_dates):
+    forecasts = _daily_rows(system, daily_df, target_dates)
+    await SystemForecast.objects.abulk_create(forecasts, **UPSERT)
+    return forecasts
@@ -0,0 +1,49 @@
+import sys
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from forecasting.actuals_import import IMPORT_BATCH_SIZE, ActualsImportError, import_actuals
+from forecasting.models import SolarSystem
+
+
+class Command(BaseCommand):
+    help = (
+        "Bulk-import actual daily yields from an inverter CSV export (columns: system, date, actual) "
+        "into a user's predictions. The file is streamed, so size is not a concern."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("csv_path", help="CSV file to import ('-' reads stdin).")
+        parser.add_argument("--user", required=True, help="Username owning the systems.")
+        parser.add_argument("--system", type=int, help="Apply every row to this system id (system column optional).")
+        parser.add_argument("--batch-size", type=int, default=IMPORT_BATCH_SIZE,
+                            help=f"Rows per bulk_update (default: {IMPORT_BATCH_SIZE}).")
+
+    def handle(self, *args, **options):
+        try:
+            user = get_user_model().objects.get(username=options["user"])
+        except get_user_model().DoesNotExist:
+            raise CommandError(f"No user {options['user']!r}.")
+        system = None
+        if options["system"] is not None:
+            system = SolarSystem.objects.filter(id=options["system"], user=user).first()
+            if system is None:
+                raise CommandError(f"System {options['system']} does not belong to {user}.")
+
+        source = sys.stdin if options["csv_path"] == "-" else open(options["csv_path"], newline="", encoding="utf-8-sig")
+        try:
+            summary = import_actuals(user, source, system=system, batch_size=options["batch_size"])
+        except ActualsImportError as e:
+            raise CommandError(str(e))
+        finally:
+            if source is not sys.stdin:
+                source.close()
+
+        for error in summary["errors"]:
+            self.stderr.write(error)
+        self.stdout.write(self.style.SUCCESS(
+            f"{summary['rows']} rows in {summary['seconds']:.2f}s ({summary['rows_per_sec']} rows/sec): "
+            f"{summary['updated']} updated, {summary['matched']} matched, {summary['unmatched']} without a prediction, "
+            f"{summary['invalid']} invalid, {summary['future']} future dates skipped"
+        ))
@@ -0,0 +1,115 @@
+import json
+import os
+import subprocess
+import sys
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Runs in a fresh interpreter under `python -X importtime`; stdout carries the
+# summary, stderr the per-module import timings.
+_CHILD = """
+import importlib, json, resource, sys, time
+start = time.perf_counter()
+import django
+django.setup()
+for name in {targets!r}:
+    importlib.import_module(name)
+if {preload!r}:
+    from forecasting import ml
+    ml.preload(model={model!r}, freeze=False)
+print(json.dumps({{
+    "seconds": time.perf_counter() - start,
+    "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (2**20 if sys.platform == "darwin" else 2**10),
+}}))
+"""
+
+
+def parse_importtime(stderr: str):
+    """`-X importtime` lines -> [(module, self_us, cumulative_us, depth)]"""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        rows.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return rows
+
+
+class Command(BaseCommand):
+    help = (
+        "Cold-start import report: imports the app the way a fresh worker does (in a subprocess with "
+        "`python -X importtime`) and prints per-package cost, the slowest imports and peak RSS."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--target", nargs="+", default=None,
+                            help="Modules to import after django.setup() (default: ROOT_URLCONF).")
+        parser.add_argument("--preload", action="store_true",
+                            help="Also run forecasting.ml.preload(), i.e. what an ML_PRELOAD worker pays.")
+        parser.add_argument("--model", action="store_true", help="With --preload, load + warm the model too.")
+        parser.add_argument("--top", type=int, default=15, help="Rows per table (default: 15).")
+        parser.add_argument("--max-seconds", type=float, help="Fail if the import takes longer (budget check).")
+        parser.add_argument("--max-rss-mb", type=float, help="Fail if peak RSS is higher (budget check).")
+        parser.add_argument("--json", action="store_true", help="Print the report as JSON.")
+
+    def handle(self, *args, **options):
+        targets = options["target"] or [settings.ROOT_URLCONF]
+        env = dict(os.environ, ML_PRELOAD="False", MODEL_PRELOAD="False")
+        code = _CHILD.format(targets=targets, preload=options["preload"], model=options["model"])
+        proc = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", code],
+            capture_output=True, text=True, env=env, cwd=settings.BASE_DIR,
+        )
+        if proc.returncode != 0:
+            raise CommandError(f"Import subprocess failed:\n{proc.stderr[-2000:]}")
+
+        summary = json.loads(proc.stdout.strip().splitlines()[-1])
+        rows = parse_importtime(proc.stderr)
+
+        # Self time summed per top-level package = what each dependency costs on its own
+        packages = defaultdict(lambda: [0, 0])
+        for name, self_us, _, _ in rows:
+            packages[name.split(".")[0]][0] += self_us
+            packages[name.split(".")[0]][1] += 1
+        by_package = sorted(packages.items(), key=lambda item: -item[1][0])
+        # Cumulative for imports triggered directly (depth 0): what pulled the big subtrees in
+        slowest = sorted((r for r in rows if r[3] == 0), key=lambda r: -r[2])
+
+        report = {
+            "targets": targets,
+            "preload": options["preload"],
+            "seconds": round(summary["seconds"], 3),
+            "max_rss_mb": round(summary["max_rss_mb"], 1),
+            "modules": len(rows),
+            "packages": [
+                {"package": name, "self_ms": round(us / 1000, 1), "modules": count}
+                for name, (us, count) in by_package[:options["top"]]
+            ],
+            "slowest_imports": [
+                {"module": name, "cumulative_ms": round(cumulative_us / 1000, 1)}
+                for name, _, cumulative_us, _ in slowest[:options["top"]]
+            ],
+        }
+
+        if options["json"]:
+            self.stdout.write(json.dumps(report, indent=2))
+        else:
+            self.stdout.write(f"Imported {', '.join(targets)}{' + ml.preload()' if options['preload'] else ''}: "
+                              f"{report['modules']} modules in {report['seconds']:.3f}s, peak RSS {report['max_rss_mb']:.1f} MB")
+            self.stdout.write(f"\n{'package':<28}{'self ms':>10}{'modules':>9}")
+            for row in report["packages"]:
+                self.stdout.write(f"{row['package']:<28}{row['self_ms']:>10.1f}{row['modules']:>9}")
+            self.stdout.write(f"\n{'top-level import':<40}{'cumulative ms':>14}")
+            for row in report["slowest_imports"]:
+                self.stdout.write(f"{row['module']:<40}{row['cumulative_ms']:>14.1f}")
+
+        over = []
+        if options["max_seconds"] is not None and report["seconds"] > options["max_seconds"]:
+            over.append(f"import time {report['seconds']:.3f}s > {options['max_seconds']}s")
+        if options["max_rss_mb"] is not None and report["max_rss_mb"] > options["max_rss_mb"]:
+            over.append(f"peak RSS {report['max_rss_mb']:.1f} MB > {options['max_rss_mb']} MB")
+        if over:
+            raise CommandError("Cold-start budget exceeded: " + "; ".join(over))
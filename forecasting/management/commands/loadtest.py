@@ -0,0 +1,396 @@
+import json
+import os
+import random
+import shlex
+import subprocess
+import threading
+import time
+from collections import Counter, defaultdict
+from datetime import timedelta
+from urllib.parse import urlsplit
+
+import numpy as np
+import requests
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from forecasting.models import Prediction, SolarSystem
+
+ENDPOINTS = ("run_prediction", "history_view", "manual_update_actual", "predict")
+DEFAULT_MIX = "run_prediction=4,history_view=3,manual_update_actual=2,predict=1"
+PASSWORD = "loadtest-password"
+
+# (lat, lon) of Indian cities; sites are scattered up to ~25 km around them
+CITIES = (
+    (26.9124, 75.7873), (28.6139, 77.2090), (19.0760, 72.8777), (12.9716, 77.5946),
+    (13.0827, 80.2707), (17.3850, 78.4867), (23.0225, 72.5714), (18.5204, 73.8567),
+    (26.2389, 73.0243), (23.2599, 77.4126), (26.8467, 80.9462), (21.1458, 79.0882),
+    (22.5726, 88.3639), (9.9312, 76.2673), (30.7333, 76.7794), (23.2420, 69.6669),
+)
+# kW: mostly rooftop, some commercial
+SIZES = ((3, 10, 0.7), (10, 50, 0.2), (50, 500, 0.1))
+
+
+def parse_mix(value: str) -> dict:
+    mix = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        if name.strip() not in ENDPOINTS:
+            raise CommandError(f"Unknown endpoint {name!r} in --mix; expected {', '.join(ENDPOINTS)}")
+        try:
+            mix[name.strip()] = float(weight or 1)
+        except ValueError:
+            raise CommandError(f"Bad weight in --mix: {part!r}")
+    if not any(mix.values()):
+        raise CommandError("--mix needs at least one positive weight.")
+    return mix
+
+
+def random_site(rng: random.Random):
+    lat, lon = rng.choice(CITIES)
+    low, high, _ = rng.choices(SIZES, weights=[w for *_, w in SIZES])[0]
+    return round(lat + rng.uniform(-0.25, 0.25), 4), round(lon + rng.uniform(-0.25, 0.25), 4), round(rng.uniform(low, high), 1)
+
+
+class Stats:
+    """
+    Latencies and outcomes per endpoint, shared by every virtual user. With a
+    `window` (perf_counter start, end) only requests completing inside it are
+    kept; the others are counted in `skipped`.
+    """
+
+    def __init__(self, window=None):
+        self.lock = threading.Lock()
+        self.window = window
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(Counter)
+        self.sources = Counter()
+        self.skipped = 0
+
+    def measuring(self) -> bool:
+        return self.window is None or self.window[0] <= time.perf_counter() <= self.window[1]
+
+    def record(self, name: str, seconds: float, error: str = None):
+        with self.lock:
+            if not self.measuring():
+                self.skipped += 1
+                return
+            self.latencies[name].append(seconds)
+            if error:
+                self.errors[name][error] += 1
+
+    def report(self, wall: float) -> dict:
+        rows = {}
+        everything = []
+        for name in sorted(self.latencies):
+            ms = np.array(self.latencies[name]) * 1e3
+            everything.append(ms)
+            rows[name] = self._row(ms, sum(self.errors[name].values()), wall)
+            rows[name]["errors"] = dict(self.errors[name])
+        if everything:
+            rows["total"] = self._row(np.concatenate(everything),
+                                      sum(sum(c.values()) for c in self.errors.values()), wall)
+        return rows
+
+    @staticmethod
+    def _row(ms, errors: int, wall: float) -> dict:
+        return {
+            "requests": len(ms),
+            "rps": round(len(ms) / wall, 2) if wall else 0.0,
+            "error_rate": round(errors / len(ms), 4),
+            "p50_ms": round(float(np.percentile(ms, 50)), 1),
+            "p95_ms": round(float(np.percentile(ms, 95)), 1),
+            "p99_ms": round(float(np.percentile(ms, 99)), 1),
+            "max_ms": round(float(ms.max()), 1),
+        }
+
+
+class VirtualUser:
+    """One signed-in browser session: its own cookies, systems and past predictions."""
+
+    def __init__(self, base_url: str, username: str, stats: Stats, rng: random.Random, timeout: float):
+        self.base_url = base_url
+        self.username = username
+        self.stats = stats
+        self.rng = rng
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.system_ids = []
+        self.prediction_ids = []
+
+    def _request(self, name, method, path, expect=(200,), **kwargs):
+        start = time.perf_counter()
+        try:
+            response = self.session.request(method, self.base_url + path, allow_redirects=False,
+                                            timeout=self.timeout, **kwargs)
+        except requests.RequestException as e:
+            self.stats.record(name, time.perf_counter() - start, type(e).__name__)
+            return None
+        error = None
+        if response.status_code not in expect:
+            error = str(response.status_code)
+        elif response.is_redirect and "/login/" in response.headers.get("Location", ""):
+            error = "logged_out"
+        self.stats.record(name, time.perf_counter() - start, error)
+        return None if error else response
+
+    def _post(self, name, path, data, expect):
+        token = self.session.cookies.get("csrftoken", "")
+        return self._request(name, "POST", path, expect=expect, data={**data, "csrfmiddlewaretoken": token},
+                             headers={"X-CSRFToken": token, "Referer": self.base_url + path})
+
+    def login(self) -> bool:
+        self._request("login_page", "GET", "/login/")
+        self._post("login", "/login/", {"username": self.username, "password": PASSWORD}, expect=(200,))
+        return "sessionid" in self.session.cookies
+
+    def add_system(self, name: str):
+        lat, lon, size = random_site(self.rng)
+        self._post("add_system", "/add-system/", {"name": name, "lat": lat, "lon": lon, "size": size}, expect=(302,))
+
+    # --- tasks ---
+    def run_prediction(self):
+        day = self.rng.choice(("tomorrow", "day_after"))
+        response = self._request("run_prediction", "GET",
+                                 f"/run-prediction/{self.rng.choice(self.system_ids)}/?day={day}")
+        if response is not None and self.stats.measuring():
+            body = response.json()
+            with self.stats.lock:
+                self.stats.sources[body.get("source") or body.get("status", "unknown")] += 1
+
+    def history_view(self):
+        self._request("history_view", "GET", "/history/")
+
+    def manual_update_actual(self):
+        entry = self.rng.choice(self.prediction_ids)
+        self._post("manual_update_actual", "/history/update/",
+                   {"prediction_id": entry, "actual_val": round(self.rng.uniform(5, 40), 2)}, expect=(302,))
+
+    def predict(self):
+        self._request("predict", "GET", "/predict/")
+
+    def run(self, mix: dict, deadline: float, think: float):
+        names, weights = list(mix), list(mix.values())
+        while time.perf_counter() < deadline:
+            getattr(self, self.rng.choices(names, weights=weights)[0])()
+            if think:
+                time.sleep(self.rng.expovariate(1 / think))
+
+
+class Command(BaseCommand):
+    help = (
+        "Headless load test: signs in a fleet of users, gives each SolarSystems at realistic Indian "
+        "sites and past predictions, then drives run_prediction / history_view / manual_update_actual / "
+        "predict at the given concurrency and mix, with the weather APIs served by "
+        "benchmarks.upstream_server. Prints RPS, p50/p95/p99 and error rates per endpoint. The load-test "
+        "users are created in (and removed from) this process's database, which must be the one the "
+        "target app uses."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--url", default="http://127.0.0.1:8000", help="App under test (default: %(default)s).")
+        parser.add_argument("--serve",
+                            help="Start the app with this command (e.g. 'uvicorn Solar_Drishti.asgi:application "
+                                 "--port 8000 --workers 4'), pointed at the upstream stand-in, and stop it after.")
+        parser.add_argument("--users", type=int, default=20, help="Concurrent virtual users (default: 20).")
+        parser.add_argument("--systems-per-user", type=int, default=2)
+        parser.add_argument("--history-days", type=int, default=30,
+                            help="Past predictions seeded per system, for history and manual updates (default: 30).")
+        parser.add_argument("--duration", type=float, default=60, help="Seconds of load (default: 60).")
+        parser.add_argument("--ramp-up", type=float, default=5, help="Seconds over which users start (default: 5).")
+        parser.add_argument("--think-ms", type=float, default=0,
+                            help="Mean pause between a user's requests (exponential; default: 0 = closed loop).")
+        parser.add_argument("--mix", default=DEFAULT_MIX, help="Weighted endpoint mix (default: %(default)s).")
+        parser.add_argument("--timeout", type=float, default=30, help="Per-request timeout in seconds.")
+        parser.add_argument("--upstream", choices=["recorded", "synthetic", "external"], default="recorded",
+                            help="Payload source of the in-process upstream stand-in; 'external' = one already "
+                                 "running (the app's OPENWEATHER_BASE_URL / OPEN_METEO_BASE_URL).")
+        parser.add_argument("--upstream-port", type=int, default=8900,
+                            help="Port of the in-process stand-in (default: 8900, what a separately started app "
+                                 "should point at).")
+        parser.add_argument("--upstream-latency-ms", type=float, default=0.0)
+        parser.add_argument("--upstream-jitter-ms", type=float, default=0.0)
+        parser.add_argument("--upstream-error-rate", type=float, default=0.0)
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--keep", action="store_true", help="Keep the load-test users and their data.")
+        parser.add_argument("--json", help="Also write the report to this file.")
+
+    def handle(self, *args, **options):
+        mix = parse_mix(options["mix"])
+        if options["users"] < 1 or options["systems_per_user"] < 1:
+            raise CommandError("--users and --systems-per-user must be at least 1.")
+        base_url = options["url"].rstrip("/")
+
+        upstream_server = None
+        app = None
+        prefix = f"loadtest-{int(time.time())}"
+        try:
+            if options["upstream"] != "external":
+                from benchmarks.upstream_server import serve_in_thread
+
+                upstream_server = serve_in_thread(
+                    options["upstream"], port=options["upstream_port"],
+                    latency_ms=options["upstream_latency_ms"], jitter_ms=options["upstream_jitter_ms"],
+                    error_rate=options["upstream_error_rate"], seed=options["seed"],
+                )
+                self.stdout.write(f"Upstream stand-in ({options['upstream']}) on {upstream_server.base_url}")
+            if options["serve"]:
+                app = self._start_app(options["serve"], base_url, upstream_server)
+
+            users = self._setup(base_url, prefix, options)
+            stats = Stats()
+            for user in users:
+                user.stats = stats
+            wall = self._run(users, stats, mix, options)
+            report = self._report(stats, wall, mix, base_url, upstream_server, options)
+        finally:
+            if app is not None:
+                app.terminate()
+                try:
+                    app.wait(timeout=10)
+                except subprocess.TimeoutExpired:
+                    app.kill()
+            if upstream_server is not None:
+                upstream_server.shutdown()
+            if not options["keep"]:
+                deleted = get_user_model().objects.filter(username__startswith=prefix).delete()[0]
+                if deleted:
+                    self.stdout.write(f"Removed load-test users ({deleted} rows)")
+
+        if options["json"]:
+            with open(options["json"], "w") as f:
+                json.dump(report, f, indent=2)
+            self.stdout.write(f"wrote {options['json']}")
+
+    def _start_app(self, command: str, base_url: str, upstream_server):
+        env = dict(os.environ)
+        if upstream_server is not None:
+            env.update(OPENWEATHER_BASE_URL=upstream_server.base_url, OPEN_METEO_BASE_URL=upstream_server.base_url)
+        app = subprocess.Popen(shlex.split(command), env=env)
+        deadline = time.monotonic() + 60
+        while time.monotonic() < deadline:
+            if app.poll() is not None:
+                raise CommandError(f"'{command}' exited with {app.returncode}")
+            try:
+                requests.get(base_url + "/login/", timeout=2)
+                self.stdout.write(f"App up at {base_url} ({command})")
+                return app
+            except requests.RequestException:
+                time.sleep(0.5)
+        app.terminate()
+        raise CommandError(f"{base_url} did not answer within 60s of starting '{command}'")
+
+    def _setup(self, base_url: str, prefix: str, options):
+        User = get_user_model()
+        rng = random.Random(options["seed"])
+        setup_stats = Stats()
+        users = []
+        for i in range(options["users"]):
+            username = f"{prefix}-{i}"
+            User.objects.create_user(username, f"{username}@example.invalid", password=PASSWORD)
+            users.append(VirtualUser(base_url, username, setup_stats, random.Random(rng.random()), options["timeout"]))
+
+        # Sign in and add systems over HTTP, like the browser does
+        def prepare(user):
+            if user.login():
+                for j in range(options["systems_per_user"]):
+                    user.add_system(f"Site {j + 1}")
+
+        start = time.perf_counter()
+        threads = [threading.Thread(target=prepare, args=(user,)) for user in users]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        wall = time.perf_counter() - start
+        for name, row in setup_stats.report(wall).items():
+            if name != "total":
+                self.stdout.write(f"  setup {name:<12}{row['requests']:>6} requests, p50 {row['p50_ms']:.1f} ms, "
+                                  f"errors {row['error_rate']:.1%}")
+
+        # Past predictions to browse and verify, pending an actual value
+        today = timezone.now().date()
+        systems = list(SolarSystem.objects.filter(user__username__startswith=prefix).select_related("user"))
+        Prediction.objects.bulk_create([
+            Prediction(system=system, target_date=today - timedelta(days=d), day_target="tomorrow",
+                       pred_value=round(system.system_size * rng.uniform(3.0, 6.0), 2))
+            for system in systems for d in range(1, options["history_days"] + 1)
+        ], batch_size=1000)
+        by_user = {user.username: user for user in users}
+        for system in systems:
+            by_user[system.user.username].system_ids.append(system.id)
+        for username, pk in Prediction.objects.filter(system__user__username__startswith=prefix) \
+                .values_list("system__user__username", "id"):
+            by_user[username].prediction_ids.append(pk)
+
+        ready = [user for user in users if user.system_ids and user.prediction_ids]
+        if not ready:
+            raise CommandError("No user could sign in and add a system; is the app running at --url?")
+        if len(ready) < len(users):
+            self.stdout.write(self.style.WARNING(f"{len(users) - len(ready)} users failed setup and sit out"))
+        self.stdout.write(f"{len(ready)} users, {len(systems)} systems, "
+                          f"{len(systems) * options['history_days']} past predictions")
+        return ready
+
+    def _run(self, users, stats: Stats, mix: dict, options) -> float:
+        """
+        Start the users over --ramp-up, then measure for --duration: requests
+        completing during ramp-up (or after the deadline) are not counted.
+        Returns the length of the measurement window.
+        """
+        start = time.perf_counter()
+        deadline = start + options["ramp_up"] + options["duration"]
+        stats.window = (start + options["ramp_up"], deadline)
+        think = options["think_ms"] / 1000
+
+        def virtual_user(i, user):
+            time.sleep(options["ramp_up"] * i / len(users))
+            user.run(mix, deadline, think)
+
+        threads = [threading.Thread(target=virtual_user, args=(i, user)) for i, user in enumerate(users)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return options["duration"]
+
+    def _report(self, stats: Stats, wall: float, mix: dict, base_url: str, upstream_server, options) -> dict:
+        rows = stats.report(wall)
+        self.stdout.write(f"\n{rows.get('total', {}).get('requests', 0)} requests in {wall:.1f}s "
+                          f"({options['users']} users, mix {options['mix']}; {stats.skipped} during ramp-up "
+                          f"or after the deadline not counted)")
+        self.stdout.write(f"  {'endpoint':<22}{'requests':>9}{'rps':>9}{'errors':>8}"
+                          f"{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'max ms':>9}")
+        for name, row in rows.items():
+            self.stdout.write(f"  {name:<22}{row['requests']:>9}{row['rps']:>9.1f}{row['error_rate']:>8.1%}"
+                              f"{row['p50_ms']:>9.1f}{row['p95_ms']:>9.1f}{row['p99_ms']:>9.1f}{row['max_ms']:>9.1f}")
+        for name, row in rows.items():
+            if row.get("errors"):
+                self.stdout.write(f"  {name} errors: " + ", ".join(f"{k} x{v}" for k, v in row["errors"].items()))
+        if stats.sources:
+            self.stdout.write("  run_prediction source: " + ", ".join(f"{k} {v}" for k, v in stats.sources.items()))
+
+        report = {
+            "url": base_url,
+            "host": urlsplit(base_url).netloc,
+            "serve": options["serve"],
+            "users": options["users"],
+            "duration_seconds": round(wall, 2),
+            "ramp_up_seconds": options["ramp_up"],
+            "requests_not_counted": stats.skipped,
+            "mix": mix,
+            "think_ms": options["think_ms"],
+            "endpoints": rows,
+            "run_prediction_sources": dict(stats.sources),
+        }
+        if upstream_server is not None:
+            report["upstream"] = upstream_server.stats()
+            self.stdout.write(f"  upstream requests: {json.dumps(report['upstream']['requests'])}")
+        total = rows.get("total")
+        if total:
+            self.stdout.write(self.style.SUCCESS(
+                f"Capacity: {total['rps']:.1f} req/s at p95 {total['p95_ms']:.0f} ms, "
+                f"{total['error_rate']:.1%} errors"
+            ))
+        return report
@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand
+
+from forecasting.fleet import precompute_fleet
+from forecasting.models import SolarSystem
+
+
+class Command(BaseCommand):
+    help = "Batch-forecast SolarSystems (grouped by location) and store the results in SystemForecast."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user", help="Only systems owned by this username.")
+        parser.add_argument("--system-ids", nargs="+", type=int, help="Only these system ids.")
+        parser.add_argument("--days", nargs="+", type=int, default=[1, 2],
+                            help="Target dates as offsets from today (default: 1 2).")
+        parser.add_argument("--fetch-workers", type=int, default=8,
+                            help="Concurrent upstream fetches (one per location group).")
+        parser.add_argument("--chunk-size", type=int, default=500,
+                            help="Locations scored per model.predict call.")
+
+    def handle(self, *args, **options):
+        systems = SolarSystem.objects.all()
+        if options["user"]:
+            systems = systems.filter(user__username=options["user"])
+        if options["system_ids"]:
+            systems = systems.filter(id__in=options["system_ids"])
+
+        stats = precompute_fleet(
+            systems,
+            days=options["days"],
+            fetch_workers=options["fetch_workers"],
+            chunk_size=options["chunk_size"],
+        )
+
+        self.stdout.write(
+            f"Systems: {stats['systems']}  sites: {stats['sites']}  failed sites: {stats['failed_sites']}  "
+            f"rows scored: {stats['rows_scored']}  forecasts written: {stats['written']}"
+        )
+        self.stdout.write(
+            f"fetch {stats['fetch']:.2f}s | features {stats['features']:.2f}s | predict {stats['predict']:.2f}s | "
+            f"aggregate {stats['aggregate']:.2f}s | write {stats['write']:.2f}s"
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Done in {stats['elapsed']:.2f}s ({stats['systems_per_sec']:.1f} systems/sec)"
+        ))
@@ -0,0 +1,41 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from forecasting.ml import geometry
+from forecasting.ml.timezones import timezone_at
+from forecasting.models import SolarSystem
+
+
+class Command(BaseCommand):
+    help = (
+        "Fill the solar geometry cache for every SolarSystem location. Only useful with a shared "
+        "backend (SOLAR_GEOMETRY_CACHE_BACKEND=file or django); the memory backend is per process."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=6,
+                            help="Local dates to fill, starting today (default: 6, the forecast horizon).")
+        parser.add_argument("--method", choices=geometry.METHODS, default=geometry.SOLAR_GEOMETRY_METHOD,
+                            help="Zenith algorithm (default: SOLAR_GEOMETRY_METHOD).")
+
+    def handle(self, *args, **options):
+        if options["days"] < 1:
+            raise CommandError("--days must be at least 1.")
+
+        rows = SolarSystem.objects.values_list("latitude", "longitude", "timezone").distinct()
+        sites = {(lat, lon, timezone_str or timezone_at(lat, lon)) for lat, lon, timezone_str in rows.iterator()}
+
+        # Yesterday too: a zone behind the server's date is still on its previous day
+        today = timezone.now().date()
+        days = [today + timedelta(days=d) for d in range(-1, options["days"])]
+
+        t0 = time.perf_counter()
+        stored = geometry.precompute_zenith(sites, days, method=options["method"])
+        elapsed = time.perf_counter() - t0
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Stored {stored} site-days ({len(sites)} locations x {len(days)} days, {options['method']}) in {elapsed:.2f}s"
+        ))
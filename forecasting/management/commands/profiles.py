@@ -0,0 +1,62 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from forecasting.middleware import PROFILE_HEADER, profile_token
+from forecasting.ml import profiling
+
+
+class Command(BaseCommand):
+    help = (
+        "List and summarize the request profiles captured by ProfilingMiddleware (PROFILE_DIR), "
+        "or print an X-Profile header that profiles one request."
+    )
+
+    def add_arguments(self, parser):
+        sub = parser.add_subparsers(dest="action")
+        listing = sub.add_parser("list", help="Stored captures, newest first (the default).")
+        listing.add_argument("--route", help="Only captures of this URL name.")
+        listing.add_argument("--limit", type=int, default=20)
+
+        show = sub.add_parser("show", help="Hottest functions and top allocations of one capture.")
+        show.add_argument("capture_id", help="Capture id, or a unique prefix of it; 'latest' for the newest.")
+        show.add_argument("--limit", type=int, default=25, help="Rows per table (default: 25).")
+        show.add_argument("--sort", choices=["cumulative", "tottime"], default="cumulative",
+                          help="cumulative = inclusive time, tottime = time in the function itself.")
+
+        token = sub.add_parser("token", help=f"Print a signed {PROFILE_HEADER} header (needs PROFILE_SECRET).")
+        token.add_argument("--mode", choices=profiling.MODES, default=profiling.PROFILE_MODE)
+
+        sub.add_parser("clear", help="Delete every stored capture.")
+
+    def handle(self, *args, **options):
+        action = options["action"] or "list"
+        if action == "token":
+            try:
+                self.stdout.write(f"{PROFILE_HEADER}: {profile_token(options['mode'])}")
+            except ValueError as e:
+                raise CommandError(str(e))
+            return
+
+        rows = profiling.captures()
+        if action == "clear":
+            removed = profiling.prune(max_captures=0, max_mb=0) if profiling.PROFILE_DIR.exists() else 0
+            self.stdout.write(self.style.SUCCESS(f"Deleted {removed} captures from {profiling.PROFILE_DIR}"))
+        elif action == "show":
+            wanted = options["capture_id"]
+            matches = rows[:1] if wanted == "latest" else [m for m in rows if m["id"].startswith(wanted)]
+            if len(matches) != 1:
+                raise CommandError(f"{len(matches)} captures match {wanted!r}.")
+            self.stdout.write(profiling.summarize(matches[0], limit=options["limit"], sort=options["sort"]))
+        else:
+            if options.get("route"):
+                rows = [m for m in rows if m["route"] == options["route"]]
+            if not rows:
+                self.stdout.write(f"No captures in {profiling.PROFILE_DIR}")
+                return
+            self.stdout.write(f"{'id':<48}{'status':>7}{'ms':>10}{'peak KiB':>11}  mode      trigger  path")
+            for meta in rows[:options.get("limit") or 20]:
+                peak = meta.get("memory", {}).get("peak_kib")
+                self.stdout.write(
+                    f"{meta['id']:<48}{meta['status'] or '-':>7}{meta['duration_ms']:>10.1f}"
+                    f"{'-' if peak is None else f'{peak:,.0f}':>11}  {meta['mode']:<10}{meta['trigger']:<9}{meta['path']}"
+                )
+            self.stdout.write(f"\n{len(rows)} captures in {profiling.PROFILE_DIR}")
@@ -0,0 +1,33 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from forecasting import rollups
+from forecasting.models import SolarSystem
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the per-system accuracy rollups (day / week / month) from the predictions. "
+        "Migration 0014 fills them on deploy and the views and the CSV import keep them current; "
+        "only needed after actual values were changed some other way (shell, raw SQL, bulk scripts)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user", help="Only rebuild this username's systems.")
+        parser.add_argument("--system", type=int, nargs="+", help="Only rebuild these system ids.")
+
+    def handle(self, *args, **options):
+        systems = None
+        if options["user"] or options["system"]:
+            systems = SolarSystem.objects.all()
+            if options["user"]:
+                systems = systems.filter(user__username=options["user"])
+            if options["system"]:
+                systems = systems.filter(id__in=options["system"])
+
+        t0 = time.perf_counter()
+        written = rollups.rebuild(systems)
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {written} rollup rows in {time.perf_counter() - t0:.2f}s"
+        ))
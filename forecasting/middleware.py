@@ -0,0 +1,162 @@
+import logging
+import random
+import time
+
+from asgiref.sync import async_to_sync, iscoroutinefunction, markcoroutinefunction, sync_to_async
+from decouple import config
+from django.core import signing
+from django.core.exceptions import MiddlewareNotUsed
+
+from .ml.profiling import MODES, PROFILE_MODE, Capture
+from .ml.telemetry import REQUEST_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# Share of requests to PROFILE_ROUTES profiled at random (0 = only signed requests)
+PROFILE_SAMPLE_RATE = config("PROFILE_SAMPLE_RATE", default=0.0, cast=float)
+PROFILE_ROUTES = config("PROFILE_ROUTES", default="run_prediction,history_view",
+                        cast=lambda v: {name.strip() for name in v.split(",") if name.strip()})
+# Key for X-Profile tokens (`manage.py profiles token`); empty = header ignored
+PROFILE_SECRET = config("PROFILE_SECRET", default="")
+PROFILE_TOKEN_MAX_AGE = config("PROFILE_TOKEN_MAX_AGE", default=900, cast=int)
+PROFILE_HEADER = "X-Profile"
+
+
+class MetricsMiddleware:
+    """Times every request into solar_request_seconds{view, status} (sync and async views)."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        start = time.perf_counter()
+        response = self.get_response(request)
+        self._observe(request, response, start)
+        return response
+
+    async def __acall__(self, request):
+        start = time.perf_counter()
+        response = await self.get_response(request)
+        self._observe(request, response, start)
+        return response
+
+    @staticmethod
+    def _observe(request, response, start):
+        match = getattr(request, "resolver_match", None)
+        view = (match.url_name or match.view_name) if match else "unmatched"
+        REQUEST_SECONDS.observe(time.perf_counter() - start, view, f"{response.status_code // 100}xx")
+
+
+def _signer():
+    return signing.TimestampSigner(key=PROFILE_SECRET, salt="forecasting.profiling")
+
+
+def profile_token(mode: str = PROFILE_MODE) -> str:
+    """X-Profile header value that profiles one request in `mode` (valid PROFILE_TOKEN_MAX_AGE seconds)."""
+    if not PROFILE_SECRET:
+        raise ValueError("PROFILE_SECRET is not set")
+    if mode not in MODES:
+        raise ValueError(f"Unknown profile mode {mode!r}; expected one of {MODES}")
+    return _signer().sign(mode)
+
+
+class ProfilingMiddleware:
+    """
+    Profiles a request (ml/profiling.py) when it carries a valid X-Profile
+    token, or at random with PROFILE_SAMPLE_RATE on PROFILE_ROUTES. Removed
+    from the stack when neither is configured.
+
+    The capture wraps the view call only, on the thread the view runs on, so
+    the middleware has to be last in MIDDLEWARE: its process_view calls the
+    view itself.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if PROFILE_SAMPLE_RATE <= 0 and not PROFILE_SECRET:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+            self.process_view = self._aprocess_view
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        return await self.get_response(request)
+
+    @staticmethod
+    def _trigger(request):
+        """(mode, trigger) when this request is to be profiled, else None."""
+        token = request.headers.get(PROFILE_HEADER)
+        if token and PROFILE_SECRET:
+            try:
+                mode = _signer().unsign(token, max_age=PROFILE_TOKEN_MAX_AGE)
+            except signing.BadSignature:
+                logger.warning("Ignoring invalid or expired %s header", PROFILE_HEADER)
+                return None
+            return (mode, "header") if mode in MODES else None
+        match = request.resolver_match
+        if match and match.url_name in PROFILE_ROUTES and random.random() < PROFILE_SAMPLE_RATE:
+            return PROFILE_MODE, "sampled"
+        return None
+
+    @staticmethod
+    def _save(capture):
+        try:
+            capture.save()
+        except Exception:
+            logger.exception("Could not save profile capture")
+
+    def _run(self, trigger, request, view_func, view_args, view_kwargs):
+        """The sync view under a capture, on the calling thread (None when another capture is running)."""
+        capture = Capture.begin(request.resolver_match.url_name, mode=trigger[0], trigger=trigger[1])
+        if capture is None:
+            return None
+        response = None
+        try:
+            if iscoroutinefunction(view_func):
+                response = async_to_sync(view_func)(request, *view_args, **view_kwargs)
+            else:
+                response = view_func(request, *view_args, **view_kwargs)
+        finally:
+            capture.finish(request, response)
+            self._save(capture)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        trigger = self._trigger(request)
+        if trigger is None:
+            return None
+        return self._run(trigger, request, view_func, view_args, view_kwargs)
+
+    async def _aprocess_view(self, request, view_func, view_args, view_kwargs):
+        trigger = self._trigger(request)
+        if trigger is None:
+            return None
+        if not iscoroutinefunction(view_func):
+            # Where Django would run the sync view: the thread-sensitive executor
+            return await sync_to_async(self._run, thread_sensitive=True)(
+                trigger, request, view_func, view_args, view_kwargs)
+        capture = Capture.begin(request.resolver_match.url_name, mode=trigger[0], trigger=trigger[1])
+        if capture is None:
+            return None
+        response = None
+        try:
+            response = await view_func(request, *view_args, **view_kwargs)
+        finally:
+            capture.finish(request, response)
+            await sync_to_async(self._save, thread_sensitive=False)(capture)
+        return response
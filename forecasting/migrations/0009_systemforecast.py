@@ -0,0 +1,29 @@
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('forecasting', '0008_solarsystem_unique_system_name_per_user'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SystemForecast',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('target_date', models.DateField()),
+                ('pred_value', models.FloatField()),
+                ('ghi', models.FloatField(default=0)),
+                ('air_temp', models.FloatField(default=0)),
+                ('wind_speed', models.FloatField(default=0)),
+                ('computed_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('system', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='forecasts', to='forecasting.solarsystem')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('system', 'target_date'), name='unique_forecast_per_system_day')],
+            },
+        ),
+    ]
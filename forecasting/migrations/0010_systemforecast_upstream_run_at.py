@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('forecasting', '0009_systemforecast'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='systemforecast',
+            name='upstream_run_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('forecasting', '0010_systemforecast_upstream_run_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='solarsystem',
+            name='timezone',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+    ]
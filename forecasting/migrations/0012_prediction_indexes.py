@@ -0,0 +1,19 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('forecasting', '0011_solarsystem_timezone'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='prediction',
+            index=models.Index(fields=['system', 'target_date'], name='prediction_system_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='prediction',
+            index=models.Index(condition=models.Q(('actual_value__isnull', True)), fields=['system', 'created_at'], name='prediction_pending_idx'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('forecasting', '0012_prediction_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AccuracyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(choices=[('day', 'Day'), ('week', 'Week'), ('month', 'Month')], max_length=5)),
+                ('period_start', models.DateField()),
+                ('actual_sum', models.FloatField(default=0)),
+                ('abs_error_sum', models.FloatField(default=0)),
+                ('verified_count', models.IntegerField(default=0)),
+                ('system', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rollups', to='forecasting.solarsystem')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('system', 'period', 'period_start'), name='unique_rollup_per_system_period')],
+            },
+        ),
+    ]
@@ -0,0 +1,21 @@
+from django.db import migrations
+
+
+def build_rollups(apps, schema_editor):
+    from forecasting import rollups
+
+    rollups.rebuild(
+        prediction_model=apps.get_model("forecasting", "Prediction"),
+        rollup_model=apps.get_model("forecasting", "AccuracyRollup"),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("forecasting", "0013_accuracyrollup"),
+    ]
+
+    operations = [
+        migrations.RunPython(build_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,73 @@
+# ml/__init__.py
+"""
+Lazy facade over the ML stack.
+
+Importing ``forecasting.ml`` is cheap: pandas, pvlib, lightgbm and friends
+are only imported when one of the names below is first used (PEP 562
+module ``__getattr__``). Views call ``ml.predict_next_48h(...)`` so pages
+that never predict (login, signup, about) never pay for the import.
+
+Workers that serve predictions can pay it up front with ``ML_PRELOAD``
+(see ``forecasting/apps.py``) or by calling ``preload()``.
+"""
+import gc
+import importlib
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+# public name -> (submodule, attribute)
+_LAZY = {
+    "predict_next_48h": ("predict", "predict_next_48h"),
+    "apredict_next_48h": ("async_predict", "apredict_next_48h"),
+    "fetch_upstream": ("predict", "fetch_upstream"),
+    "forecast_sites": ("batch", "forecast_sites"),
+    "get_model": ("registry", "get_model"),
+    "model_registry": ("registry", "registry"),
+    "zenith_for": ("geometry", "zenith_for"),
+}
+
+# Imported by preload(): everything the prediction path touches
+_PRELOAD_MODULES = (f"{__name__}.predict", f"{__name__}.async_predict", f"{__name__}.batch", f"{__name__}.geometry", "pvlib.spa", "lightgbm")
+
+__all__ = sorted(_LAZY) + ["preload"]
+
+
+def __getattr__(name):
+    try:
+        module_name, attr = _LAZY[name]
+    except KeyError:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}") from None
+    value = getattr(importlib.import_module(f".{module_name}", __name__), attr)
+    globals()[name] = value  # later lookups skip __getattr__
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY))
+
+
+def preload(model: bool = False, freeze: bool = True) -> float:
+    """
+    Import the whole ML stack now (and build the TimezoneFinder). With
+    ``model=True`` the model is also loaded and warmed up. Run it in the
+    gunicorn master (``--preload``) so workers inherit it copy-on-write;
+    ``gc.freeze()`` keeps the collector from touching those pages.
+    Returns the seconds spent.
+    """
+    start = time.perf_counter()
+    for module_name in _PRELOAD_MODULES:
+        importlib.import_module(module_name)
+
+    from .timezones import get_finder
+    get_finder()
+    if model:
+        from .registry import registry
+        registry.preload(freeze=False)
+    if freeze:
+        gc.freeze()
+
+    elapsed = time.perf_counter() - start
+    logger.info("ML stack preloaded in %.3fs (model=%s)", elapsed, model)
+    return elapsed
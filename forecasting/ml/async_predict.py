@@ -0,0 +1,121 @@
+# ml/async_predict.py
+"""
+Async variant of predict_next_48h for ASGI views.
+
+Both providers are awaited concurrently over httpx, so a request waiting on
+the network holds no thread and one worker can keep hundreds in flight. The
+CPU-bound steps (parsing, features, zenith, model.predict) run on a small
+bounded thread pool so they never block the event loop and never fan out
+beyond ML_EXECUTOR_WORKERS at once.
+"""
+import asyncio
+import functools
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+from decouple import config
+
+from . import profiling
+from .forecast_cache import forecast_cache
+from .predict import UPSTREAM_DEADLINE_SECONDS, aggregate_daily, build_feature_frame, forecast_flight, forecast_key, score
+from .solar import afetch_radiation_payload, radiation_frame
+from .telemetry import stage
+from .timezones import timezone_at
+from .weather import afetch_forecast_payload, parse_forecast_payload
+
+logger = logging.getLogger(__name__)
+
+# Threads for the CPU-bound part; extra requests queue here instead of oversubscribing the CPU
+ML_EXECUTOR_WORKERS = config("ML_EXECUTOR_WORKERS", default=4, cast=int)
+
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    # Created lazily and per PID, like predict's fetch pool
+    global _executor, _executor_pid
+    with _executor_lock:
+        if _executor is None or _executor_pid != os.getpid():
+            _executor = ThreadPoolExecutor(max_workers=ML_EXECUTOR_WORKERS, thread_name_prefix="ml-cpu")
+            _executor_pid = os.getpid()
+        return _executor
+
+
+async def run_cpu(fn, *args):
+    """Run `fn(*args)` on the bounded ML executor."""
+    capture = profiling.current()
+    if capture is not None:
+        # run_in_executor does not carry the request's context into the worker thread
+        fn = functools.partial(capture.call, fn)
+    return await asyncio.get_running_loop().run_in_executor(_get_executor(), fn, *args)
+
+
+async def _timed(name: str, awaitable):
+    with stage(name):
+        return await awaitable
+
+
+async def _radiation_or_none(lat: float, lon: float, timezone_str: str, deadline: float):
+    # Same contract as fetch_solar_forecast: a failing provider means "no data", not an exception
+    try:
+        return await forecast_cache.aget_or_fetch(
+            "open_meteo", lat, lon,
+            lambda cell_lat, cell_lon: afetch_radiation_payload(cell_lat, cell_lon, timezone_str, deadline),
+            extra=timezone_str,
+        )
+    except Exception as e:
+        logger.error(f"Error fetching solar forecast: {e}")
+        return None
+
+
+async def afetch_upstream(lat: float, lon: float, timezone_str: str, deadline: float = None):
+    """
+    Await OpenWeather and Open-Meteo together and return the raw
+    (weather_payload, radiation_payload) pair; radiation is None when that
+    provider failed. Raises TimeoutError after `deadline` seconds, cancelling
+    whatever is still in flight.
+    """
+    deadline = UPSTREAM_DEADLINE_SECONDS if deadline is None else deadline
+    weather = forecast_cache.aget_or_fetch(
+        "openweather", lat, lon,
+        lambda cell_lat, cell_lon: afetch_forecast_payload(cell_lat, cell_lon, deadline),
+    )
+    try:
+        async with asyncio.timeout(deadline):
+            return await _timed("fetch_upstream", asyncio.gather(
+                _timed("fetch_openweather", weather),
+                _timed("fetch_open_meteo", _radiation_or_none(lat, lon, timezone_str, deadline)),
+            ))
+    except TimeoutError:
+        raise TimeoutError(f"Upstream fetch exceeded {deadline:.1f}s deadline") from None
+
+
+def score_payloads(weather_payload: dict, radiation_payload, lat: float, lon: float, timezone_str: str, hours: int = 96):
+    """CPU part of predict_next_48h, starting from the raw provider payloads."""
+    with stage("parse_openweather"):
+        weather_df = parse_forecast_payload(weather_payload, timezone_str, hours=hours)
+    with stage("parse_open_meteo"):
+        forecast_df = radiation_frame(radiation_payload) if radiation_payload is not None else pd.DataFrame()
+    df = build_feature_frame(weather_df, forecast_df, lat, lon, timezone_str=timezone_str)
+    df["predicted_specific_energy"] = score(df)
+    return df, aggregate_daily(df)
+
+
+async def apredict_next_48h(lat: float, lon: float, timezone_str: str = None, deadline: float = None):
+    """Async predict_next_48h: same (df, daily_df) result (df None if shared by another worker), coalesced on the same key."""
+    if not timezone_str:
+        timezone_str = await run_cpu(timezone_at, lat, lon)
+    return await forecast_flight.ado(
+        forecast_key(lat, lon, timezone_str),
+        lambda: _apredict_next_48h(lat, lon, timezone_str, deadline),
+    )
+
+
+async def _apredict_next_48h(lat: float, lon: float, timezone_str: str, deadline: float = None):
+    weather_payload, radiation_payload = await afetch_upstream(lat, lon, timezone_str, deadline)
+    return await run_cpu(score_payloads, weather_payload, radiation_payload, lat, lon, timezone_str)
@@ -0,0 +1,117 @@
+# ml/batch.py
+"""
+Batch scoring for many sites at once.
+
+Sites are grouped by forecast-cache grid cell (and timezone) so the upstream
+providers are called once per group, every site's hourly rows are stacked
+into a single model.predict() call, and the daily aggregation is done for all
+sites in one groupby.
+"""
+import logging
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import pandas as pd
+
+from .forecast_cache import grid_cell
+from .geometry import precompute_zenith
+from .inference import INFERENCE_BATCH_NUM_THREADS
+from .predict import UPSTREAM_DEADLINE_SECONDS, aggregate_daily, build_feature_frame, score
+from .solar import fetch_solar_forecast
+from .timezones import timezone_at
+from .weather import get_hourly_forecast
+
+logger = logging.getLogger(__name__)
+
+
+def _site(value):
+    """Sites are (lat, lon) or (lat, lon, timezone_str)."""
+    lat, lon, *rest = value
+    return lat, lon, (rest[0] if rest and rest[0] else timezone_at(lat, lon))
+
+
+def group_sites(sites: dict) -> dict:
+    """{site_id: (lat, lon[, tz])} -> {(grid_cell, tz): [site_id, ...]}"""
+    groups = defaultdict(list)
+    for site_id, value in sites.items():
+        lat, lon, timezone_str = _site(value)
+        groups[(grid_cell(lat, lon), timezone_str)].append(site_id)
+    return groups
+
+
+def forecast_sites(sites: dict, fetch_workers: int = 8, timings: dict = None) -> pd.DataFrame:
+    """
+    Score every site in `sites` ({site_id: (lat, lon)} or (lat, lon, tz) when
+    the zone is already stored).
+
+    Returns one row per (site, date) with daily_energy (per kW, like
+    predict_next_48h) and the daytime ghi / air_temp / wind_speed factors.
+    Groups whose upstream fetch fails are logged and left out.
+    """
+    timings = {} if timings is None else timings
+    groups = group_sites(sites)
+
+    # 1. One upstream fetch per group and provider, all on this pool. Not through
+    #    fetch_upstream: its shared pool would queue them, and time spent queued would
+    #    count against its deadline. Each call bounds itself with the same deadline.
+    t0 = time.perf_counter()
+    responses = defaultdict(dict)
+    with ThreadPoolExecutor(max_workers=fetch_workers, thread_name_prefix="batch-fetch") as pool:
+        futures = {}
+        for group, site_ids in groups.items():
+            lat, lon, timezone_str = _site(sites[site_ids[0]])
+            futures[pool.submit(get_hourly_forecast, lat, lon, 96, UPSTREAM_DEADLINE_SECONDS,
+                                timezone_str=timezone_str)] = (group, 0)
+            futures[pool.submit(fetch_solar_forecast, lat, lon, UPSTREAM_DEADLINE_SECONDS,
+                                timezone_str=timezone_str)] = (group, 1)
+        for future in as_completed(futures):
+            group, provider = futures[future]
+            try:
+                responses[group][provider] = future.result()
+            except Exception as e:
+                responses[group][provider] = None
+                logger.error(f"Batch fetch failed for group {group} ({len(groups[group])} sites): {e}")
+    fetched = {
+        group: (pair[0], pair[1]) for group, pair in responses.items()
+        if pair[0] is not None and pair[1] is not None
+    }
+    timings["fetch"] = time.perf_counter() - t0
+
+    # 2. Per-site alignment + zenith + features, reusing the group's responses.
+    #    Zenith for every site/day is filled in one vectorized pass first so the
+    #    per-site step only does cache lookups.
+    t0 = time.perf_counter()
+    days = set()
+    for weather_df, _ in fetched.values():
+        days.update(pd.to_datetime(weather_df["timestamp"]).dt.date.unique())
+    precompute_zenith([_site(sites[site_id]) for group in fetched for site_id in groups[group]], days)
+    timings["geometry"] = time.perf_counter() - t0
+    frames = []
+    for group, (weather_df, forecast_df) in fetched.items():
+        for site_id in groups[group]:
+            lat, lon, timezone_str = _site(sites[site_id])
+            try:
+                frame = build_feature_frame(weather_df.copy(), forecast_df, lat, lon, timezone_str=timezone_str)
+            except ValueError as e:
+                logger.error(f"Batch features failed for site {site_id}: {e}")
+                continue
+            frame["site"] = site_id
+            frames.append(frame)
+    timings["features"] = time.perf_counter() - t0
+
+    if not frames:
+        return pd.DataFrame(columns=["site", "date", "daily_energy", "ghi", "air_temp", "wind_speed"])
+
+    # 3. One predict call for every stacked row
+    t0 = time.perf_counter()
+    df = pd.concat(frames, ignore_index=True)
+    df["predicted_specific_energy"] = score(df, num_threads=INFERENCE_BATCH_NUM_THREADS)
+    timings["predict"] = time.perf_counter() - t0
+    timings["rows"] = len(df)
+
+    # 4. Daily aggregation for all sites together
+    t0 = time.perf_counter()
+    daily_df = aggregate_daily(df, by=["site"])
+    timings["aggregate"] = time.perf_counter() - t0
+    return daily_df
@@ -0,0 +1,283 @@
+# ml/forecast_cache.py
+"""
+Shared cache for raw upstream forecast payloads.
+
+Entries are keyed on a lat/lon grid cell and the provider's current model-run
+slot, so every system inside the same cell reuses one OpenWeather / Open-Meteo
+response until the provider publishes a new run.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+from decouple import config
+
+from .py_files.config import BASE_PATH
+
+logger = logging.getLogger(__name__)
+
+# Cell size in degrees (0.05 deg is roughly 5 km). 0 disables quantization.
+FORECAST_CACHE_GRID_DEG = config("FORECAST_CACHE_GRID_DEG", default=0.05, cast=float)
+# "memory" (per process), "django" (settings.CACHES), "file" or "none".
+FORECAST_CACHE_BACKEND = config("FORECAST_CACHE_BACKEND", default="memory")
+FORECAST_CACHE_MAX_ENTRIES = config("FORECAST_CACHE_MAX_ENTRIES", default=2048, cast=int)
+FORECAST_CACHE_DJANGO_ALIAS = config("FORECAST_CACHE_DJANGO_ALIAS", default="default")
+FORECAST_CACHE_DIR = Path(config("FORECAST_CACHE_DIR", default=str(BASE_PATH / "media" / "cache" / "forecasts")))
+
+# Seconds between upstream model runs. OpenWeather's 5 day / 3 hour product is
+# refreshed every 3 h; Open-Meteo's best-match models update hourly.
+PROVIDER_UPDATE_SECONDS = {
+    "openweather": 3 * 3600,
+    "open_meteo": 3600,
+}
+
+
+# --- Keys ---
+
+def grid_cell(lat: float, lon: float, grid: float = None):
+    grid = FORECAST_CACHE_GRID_DEG if grid is None else grid
+    if grid <= 0:
+        return round(lat, 4), round(lon, 4)
+    return math.floor(lat / grid), math.floor(lon / grid)
+
+
+def cell_center(cell, grid: float = None):
+    """Coordinates sent upstream for a cell, so a cached payload never depends
+    on which system in the cell happened to fetch it first."""
+    grid = FORECAST_CACHE_GRID_DEG if grid is None else grid
+    if grid <= 0:
+        return cell
+    return round((cell[0] + 0.5) * grid, 4), round((cell[1] + 0.5) * grid, 4)
+
+
+def run_slot(provider: str, now: float = None) -> int:
+    """Start (epoch seconds) of the provider's current model run."""
+    cycle = PROVIDER_UPDATE_SECONDS[provider]
+    now = time.time() if now is None else now
+    return int(now // cycle) * cycle
+
+
+def cache_key(provider: str, cell, run: int, extra: str = "") -> str:
+    return f"forecast:{provider}:{cell[0]}:{cell[1]}:{run}:{extra}"
+
+
+# --- Backends ---
+
+class NullBackend:
+    # Whether get/set do I/O (the async path moves those calls off the event loop)
+    blocking = False
+
+    def get(self, key):
+        return None
+
+    def set(self, key, value, ttl):
+        pass
+
+    def clear(self):
+        pass
+
+
+class MemoryBackend:
+    """Per-process LRU bounded by entry count."""
+    blocking = False
+
+    def __init__(self, max_entries: int = FORECAST_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires_at, value = item
+            if expires_at < time.time():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._data[key] = (time.time() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class DjangoCacheBackend:
+    """Delegates to a Django cache alias; size bounds come from its own OPTIONS."""
+    blocking = True
+
+    def __init__(self, alias: str = FORECAST_CACHE_DJANGO_ALIAS):
+        self.alias = alias
+
+    @property
+    def _cache(self):
+        from django.core.cache import caches
+        return caches[self.alias]
+
+    def get(self, key):
+        return self._cache.get(key)
+
+    def set(self, key, value, ttl):
+        self._cache.set(key, value, timeout=ttl)
+
+    def clear(self):
+        self._cache.clear()
+
+
+class FileBackend:
+    """One JSON file per entry; least recently used files are pruned."""
+    blocking = True
+
+    def __init__(self, directory: Path = FORECAST_CACHE_DIR, max_entries: int = FORECAST_CACHE_MAX_ENTRIES):
+        self.directory = Path(directory)
+        self.max_entries = max_entries
+
+    def _path(self, key):
+        return self.directory / (hashlib.sha1(key.encode()).hexdigest() + ".json")
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path) as fh:
+                item = json.load(fh)
+        except (OSError, ValueError):
+            return None
+        if item["expires_at"] < time.time():
+            path.unlink(missing_ok=True)
+            return None
+        os.utime(path)  # mtime doubles as "last used" for LRU pruning
+        return item["value"]
+
+    def set(self, key, value, ttl):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self._path(key)
+        tmp = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(tmp, "w") as fh:
+            json.dump({"expires_at": time.time() + ttl, "value": value}, fh)
+        os.replace(tmp, path)
+        self._prune()
+
+    def _prune(self):
+        entries = [e for e in os.scandir(self.directory) if e.name.endswith(".json")]
+        if len(entries) <= self.max_entries:
+            return
+        entries.sort(key=lambda e: e.stat().st_mtime)
+        for entry in entries[:len(entries) - self.max_entries]:
+            try:
+                os.unlink(entry.path)
+            except OSError:
+                pass
+
+    def clear(self):
+        if self.directory.exists():
+            for entry in os.scandir(self.directory):
+                os.unlink(entry.path)
+
+
+BACKENDS = {
+    "none": NullBackend,
+    "memory": MemoryBackend,
+    "django": DjangoCacheBackend,
+    "file": FileBackend,
+}
+
+
+# --- Cache facade ---
+
+class ForecastCache:
+    def __init__(self, backend):
+        self.backend = backend
+        self._stats_lock = threading.Lock()
+        self.hits = {}
+        self.misses = {}
+
+    def _count(self, bucket, provider):
+        with self._stats_lock:
+            bucket[provider] = bucket.get(provider, 0) + 1
+
+    def get_or_fetch(self, provider: str, lat: float, lon: float, fetch, extra: str = ""):
+        """
+        Return the cached payload for the cell containing (lat, lon), calling
+        ``fetch(cell_lat, cell_lon)`` on a miss. Failed fetches are not cached.
+        """
+        cell = grid_cell(lat, lon)
+        key = cache_key(provider, cell, run_slot(provider), extra)
+
+        try:
+            payload = self.backend.get(key)
+        except Exception as e:
+            logger.warning(f"Forecast cache read failed ({provider}): {e}")
+            payload = None
+
+        if payload is not None:
+            self._count(self.hits, provider)
+            return payload
+
+        self._count(self.misses, provider)
+        payload = fetch(*cell_center(cell))
+        try:
+            self.backend.set(key, payload, PROVIDER_UPDATE_SECONDS[provider])
+        except Exception as e:
+            logger.warning(f"Forecast cache write failed ({provider}): {e}")
+        return payload
+
+    async def aget_or_fetch(self, provider: str, lat: float, lon: float, afetch, extra: str = ""):
+        """Async get_or_fetch: ``afetch(cell_lat, cell_lon)`` is a coroutine function."""
+        cell = grid_cell(lat, lon)
+        key = cache_key(provider, cell, run_slot(provider), extra)
+
+        try:
+            payload = await self._backend_call(self.backend.get, key)
+        except Exception as e:
+            logger.warning(f"Forecast cache read failed ({provider}): {e}")
+            payload = None
+
+        if payload is not None:
+            self._count(self.hits, provider)
+            return payload
+
+        self._count(self.misses, provider)
+        payload = await afetch(*cell_center(cell))
+        try:
+            await self._backend_call(self.backend.set, key, payload, PROVIDER_UPDATE_SECONDS[provider])
+        except Exception as e:
+            logger.warning(f"Forecast cache write failed ({provider}): {e}")
+        return payload
+
+    async def _backend_call(self, fn, *args):
+        if getattr(self.backend, "blocking", True):
+            return await asyncio.to_thread(fn, *args)
+        return fn(*args)
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            return {
+                "backend": type(self.backend).__name__,
+                "hits": dict(self.hits),
+                "misses": dict(self.misses),
+            }
+
+
+def make_backend(name: str = FORECAST_CACHE_BACKEND):
+    try:
+        return BACKENDS[name]()
+    except KeyError:
+        raise ValueError(f"Unknown FORECAST_CACHE_BACKEND '{name}'. Choose from: {', '.join(BACKENDS)}")
+
+
+forecast_cache = ForecastCache(make_backend())
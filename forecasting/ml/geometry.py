@@ -0,0 +1,173 @@
+# ml/geometry.py
+"""
+Solar zenith cache.
+
+Zenith for a site and local hour is fully deterministic, so it is computed
+once per (rounded site, timezone, local date, method) as a 24-value array
+and reused. `precompute_zenith` fills the cache for many sites and days in a
+single vectorized pass (the batch engine and `precompute_geometry` use it).
+"""
+import threading
+
+import numpy as np
+import pandas as pd
+from decouple import config
+
+from .forecast_cache import FORECAST_CACHE_DIR, FileBackend, MemoryBackend, make_backend
+
+# "nrel_numpy" is pvlib's default SPA (what Location.get_solarposition used);
+# "analytical" (Spencer 1971 declination / equation of time) is ~60-100x
+# faster than the per-site legacy call (~10x faster than precomputed
+# nrel_numpy) and within 0.57 deg of it - see benchmarks/bench_geometry.py.
+METHODS = ("nrel_numpy", "analytical")
+SOLAR_GEOMETRY_METHOD = config("SOLAR_GEOMETRY_METHOD", default="nrel_numpy")
+# 3 decimals (~100 m) moves the zenith by well under 0.01 deg
+SOLAR_GEOMETRY_DECIMALS = config("SOLAR_GEOMETRY_DECIMALS", default=3, cast=int)
+SOLAR_GEOMETRY_CACHE_BACKEND = config("SOLAR_GEOMETRY_CACHE_BACKEND", default="memory")
+SOLAR_GEOMETRY_TTL_SECONDS = config("SOLAR_GEOMETRY_TTL_SECONDS", default=8 * 86400, cast=int)
+# Site-days kept by the memory/file backends (one entry = 24 floats)
+SOLAR_GEOMETRY_MAX_ENTRIES = config("SOLAR_GEOMETRY_MAX_ENTRIES", default=50_000, cast=int)
+
+
+# --- Zenith math (arrays of equal shape, angles in degrees) ---
+
+def zenith_utc(unixtime: np.ndarray, lat: np.ndarray, lon: np.ndarray, method: str = SOLAR_GEOMETRY_METHOD) -> np.ndarray:
+    """True (non-refracted) solar zenith in degrees for UTC epoch seconds."""
+    unixtime = np.asarray(unixtime, dtype=np.float64)
+    shape = unixtime.shape
+    # pvlib's SPA wants flat arrays; everything is elementwise so shape is restored at the end
+    unixtime = unixtime.ravel()
+    lat = np.broadcast_to(np.asarray(lat, dtype=np.float64), shape).ravel()
+    lon = np.broadcast_to(np.asarray(lon, dtype=np.float64), shape).ravel()
+
+    if method == "nrel_numpy":
+        from pvlib import spa
+        # One call for every site/time pair instead of one get_solarposition per site
+        times = pd.to_datetime(unixtime, unit="s")
+        delta_t = spa.calculate_deltat(times.year.values, times.month.values)
+        _, theta0, *_ = spa.solar_position(
+            unixtime, lat, lon, 0, 1013.25, 12, delta_t, 0.5667, numthreads=1
+        )
+        return np.asarray(theta0, dtype=np.float64).reshape(shape)
+
+    if method == "analytical":
+        from pvlib import solarposition
+        doy = pd.to_datetime(unixtime, unit="s").dayofyear.values
+        decl = solarposition.declination_spencer71(doy)
+        eot = solarposition.equation_of_time_spencer71(doy)  # minutes
+        utc_hours = (unixtime % 86400) / 3600.0
+        hour_angle = np.radians(15.0 * (utc_hours - 12.0) + lon + eot / 4.0)
+        zenith = solarposition.solar_zenith_analytical(np.radians(lat), hour_angle, decl)
+        return np.degrees(zenith).reshape(shape)
+
+    raise ValueError(f"Unknown SOLAR_GEOMETRY_METHOD '{method}'. Choose from: {', '.join(METHODS)}")
+
+
+def local_day_unixtime(days: list, timezone_str: str) -> np.ndarray:
+    """(len(days), 24) UTC epoch seconds for every local wall-clock hour of each day."""
+    day_starts = np.asarray([np.datetime64(d, "D") for d in days], dtype="datetime64[h]")
+    naive = pd.DatetimeIndex((day_starts[:, None] + np.arange(24).astype("timedelta64[h]")).ravel())
+    # Same DST handling as the original tz_localize call; a repeated autumn hour takes its first occurrence
+    aware = naive.tz_localize(timezone_str, nonexistent="shift_forward", ambiguous=np.ones(len(naive), dtype=bool))
+    return aware.as_unit("s").asi8.astype(np.float64).reshape(len(days), 24)
+
+
+# --- Cache ---
+
+def _round_site(lat: float, lon: float):
+    return round(float(lat), SOLAR_GEOMETRY_DECIMALS), round(float(lon), SOLAR_GEOMETRY_DECIMALS)
+
+
+def _key(method: str, lat: float, lon: float, timezone_str: str, day) -> str:
+    return f"geometry:{method}:{lat}:{lon}:{timezone_str}:{day.isoformat()}"
+
+
+class GeometryCache:
+    def __init__(self, backend):
+        self.backend = backend
+        self._stats_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.computed_days = 0
+
+    def precompute(self, sites, days, method: str = SOLAR_GEOMETRY_METHOD) -> int:
+        """
+        Compute and store zenith for every (lat, lon, tz) site and local day in
+        one vectorized zenith_utc call. Returns the number of site-days stored.
+        """
+        sites = list({(*_round_site(lat, lon), tz) for lat, lon, tz in sites})
+        days = sorted(set(days))
+        if not sites or not days:
+            return 0
+
+        # Local hours -> UTC per timezone (one tz_localize per zone, not per site)
+        by_zone = {tz: local_day_unixtime(days, tz) for tz in {s[2] for s in sites}}
+        unixtime = np.stack([by_zone[tz] for _, _, tz in sites])        # (S, D, 24)
+        lat = np.array([s[0] for s in sites])[:, None, None]
+        lon = np.array([s[1] for s in sites])[:, None, None]
+        zenith = zenith_utc(unixtime, lat, lon, method)
+
+        for i, (site_lat, site_lon, tz) in enumerate(sites):
+            for j, day in enumerate(days):
+                self.backend.set(_key(method, site_lat, site_lon, tz, day), zenith[i, j].tolist(), SOLAR_GEOMETRY_TTL_SECONDS)
+        with self._stats_lock:
+            self.computed_days += len(sites) * len(days)
+        return len(sites) * len(days)
+
+    def zenith_for(self, timestamps, lat: float, lon: float, timezone_str: str, method: str = SOLAR_GEOMETRY_METHOD) -> np.ndarray:
+        """Zenith (degrees) for naive local, hour-aligned `timestamps` at one site."""
+        index = pd.DatetimeIndex(timestamps)
+        site_lat, site_lon = _round_site(lat, lon)
+        local_dates = index.date
+        days = list(dict.fromkeys(local_dates))
+
+        per_day = {}
+        missing = []
+        for day in days:
+            values = self.backend.get(_key(method, site_lat, site_lon, timezone_str, day))
+            if values is None:
+                missing.append(day)
+            else:
+                per_day[day] = values
+        with self._stats_lock:
+            self.hits += len(days) - len(missing)
+            self.misses += len(missing)
+
+        if missing:
+            self.precompute([(site_lat, site_lon, timezone_str)], missing, method)
+            for day in missing:
+                per_day[day] = self.backend.get(_key(method, site_lat, site_lon, timezone_str, day))
+                if per_day[day] is None:  # backend refused to store (e.g. "none")
+                    per_day[day] = self._compute_day(site_lat, site_lon, timezone_str, day, method)
+
+        table = np.array([per_day[d] for d in days])                     # (D, 24)
+        day_pos = {d: i for i, d in enumerate(days)}
+        rows = np.array([day_pos[d] for d in local_dates])
+        return table[rows, index.hour.values]
+
+    @staticmethod
+    def _compute_day(lat, lon, timezone_str, day, method):
+        return zenith_utc(local_day_unixtime([day], timezone_str)[0], lat, lon, method).tolist()
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            return {"hits": self.hits, "misses": self.misses, "computed_days": self.computed_days}
+
+
+def _make_backend(name: str = SOLAR_GEOMETRY_CACHE_BACKEND):
+    if name == "memory":
+        return MemoryBackend(max_entries=SOLAR_GEOMETRY_MAX_ENTRIES)
+    if name == "file":
+        return FileBackend(FORECAST_CACHE_DIR.parent / "geometry", max_entries=SOLAR_GEOMETRY_MAX_ENTRIES)
+    return make_backend(name)
+
+
+geometry_cache = GeometryCache(_make_backend())
+
+
+def zenith_for(timestamps, lat: float, lon: float, timezone_str: str, method: str = SOLAR_GEOMETRY_METHOD) -> np.ndarray:
+    return geometry_cache.zenith_for(timestamps, lat, lon, timezone_str, method)
+
+
+def precompute_zenith(sites, days, method: str = SOLAR_GEOMETRY_METHOD) -> int:
+    return geometry_cache.precompute(sites, days, method)
@@ -0,0 +1,167 @@
+# ml/inference.py
+"""
+Model inference backends.
+
+The sklearn wrapper's predict() validates its input through pandas /
+sklearn on every call and lets LightGBM use every core. Scoring ~96 rows
+in one of several gunicorn workers therefore pays wrapper overhead and
+oversubscribes the CPU. The backends here take the contiguous NumPy matrix
+from FeaturePipeline instead:
+
+- ``booster``: the raw ``lgb.Booster`` with ``num_threads`` (default 1 per
+  request; the fleet batch job passes its own).
+- ``numpy``: the trees compiled into flat arrays and evaluated for all rows
+  and trees at once with vectorized NumPy, no LightGBM call at all. Only
+  plain regression models (numerical splits) are supported; anything else
+  falls back to ``booster``.
+- ``sklearn``: the wrapper, as before.
+"""
+import logging
+import threading
+import weakref
+
+import numpy as np
+from decouple import config
+
+logger = logging.getLogger(__name__)
+
+INFERENCE_BACKEND = config("INFERENCE_BACKEND", default="booster")
+# LightGBM threads per predict call; 0 = LightGBM's default (every core)
+INFERENCE_NUM_THREADS = config("INFERENCE_NUM_THREADS", default=1, cast=int)
+# The offline fleet batch (precompute_forecasts) scores one big matrix and may use every core
+INFERENCE_BATCH_NUM_THREADS = config("INFERENCE_BATCH_NUM_THREADS", default=0, cast=int)
+BACKENDS = ("booster", "numpy", "sklearn")
+
+# Rows per block in the NumPy evaluator (bounds the rows x trees index array)
+NUMPY_BLOCK_ROWS = 4096
+# LightGBM's kZeroThreshold: |x| below this counts as zero for missing_type "Zero"
+_ZERO_THRESHOLD = 1e-35
+
+
+class SklearnPredictor:
+    backend = "sklearn"
+
+    def __init__(self, model):
+        self.model = model
+
+    def predict(self, X, num_threads=None):
+        return self.model.predict(X)
+
+
+class BoosterPredictor:
+    backend = "booster"
+
+    def __init__(self, model, num_threads: int = INFERENCE_NUM_THREADS):
+        # LGBMRegressor keeps its Booster (already cut at best_iteration) in booster_
+        self.booster = getattr(model, "booster_", model)
+        self.num_threads = num_threads
+
+    def predict(self, X, num_threads=None):
+        # Booster.predict copies anything that is not C-contiguous; do it once, explicitly
+        X = np.ascontiguousarray(X)
+        threads = self.num_threads if num_threads is None else num_threads
+        return self.booster.predict(X, num_threads=threads, validate_features=False)
+
+
+class TreeEnsemble:
+    """
+    Every tree of a regression Booster as one flat node table. Leaves are
+    stored as negative indices (~leaf) into `leaf_value`, and evaluation
+    walks all trees for a block of rows together: one gather and compare per
+    tree level.
+    """
+    backend = "numpy"
+
+    def __init__(self, booster):
+        dump = booster.dump_model()
+        if not dump["objective"].startswith("regression") or dump.get("average_output"):
+            raise NotImplementedError(f"NumPy evaluator does not support objective {dump['objective']!r}")
+        if dump["num_tree_per_iteration"] != 1:
+            raise NotImplementedError("NumPy evaluator supports single-output models only")
+
+        feature, threshold, left, right, default_left, missing = [], [], [], [], [], []
+        leaf_value, roots = [], []
+        self.depth = 0
+
+        def add(node, depth):
+            self.depth = max(self.depth, depth)
+            if "leaf_value" in node:
+                leaf_value.append(node["leaf_value"])
+                return ~(len(leaf_value) - 1)
+            if node["decision_type"] != "<=":
+                raise NotImplementedError("NumPy evaluator supports numerical splits only")
+            i = len(feature)
+            feature.append(node["split_feature"])
+            threshold.append(node["threshold"])
+            default_left.append(node["default_left"])
+            missing.append({"None": 0, "Zero": 1, "NaN": 2}[node["missing_type"]])
+            left.append(0)
+            right.append(0)
+            left[i] = add(node["left_child"], depth + 1)
+            right[i] = add(node["right_child"], depth + 1)
+            return i
+
+        for tree in dump["tree_info"]:
+            roots.append(add(tree["tree_structure"], 0))
+
+        self.feature = np.array(feature, dtype=np.intp)
+        self.threshold = np.array(threshold, dtype=np.float64)
+        self.left = np.array(left, dtype=np.int64)
+        self.right = np.array(right, dtype=np.int64)
+        self.default_left = np.array(default_left, dtype=bool)
+        self.missing = np.array(missing, dtype=np.int8)
+        self.leaf_value = np.array(leaf_value, dtype=np.float64)
+        self.roots = np.array(roots, dtype=np.int64)
+
+    def predict(self, X, num_threads=None):
+        X = np.asarray(X, dtype=np.float64)
+        out = np.empty(len(X), dtype=np.float64)
+        for start in range(0, len(X), NUMPY_BLOCK_ROWS):
+            out[start:start + NUMPY_BLOCK_ROWS] = self._predict_block(X[start:start + NUMPY_BLOCK_ROWS])
+        return out
+
+    def _predict_block(self, X):
+        rows = np.arange(len(X))[:, None]
+        node = np.broadcast_to(self.roots, (len(X), len(self.roots))).copy()
+        for _ in range(self.depth):
+            internal = node >= 0
+            if not internal.any():
+                break
+            at = np.where(internal, node, 0)
+            value = X[rows, self.feature[at]]
+            missing = self.missing[at]
+            # Same decision as LightGBM's NumericalDecision
+            is_nan = np.isnan(value)
+            value = np.where(is_nan & (missing != 2), 0.0, value)
+            use_default = ((missing == 1) & (np.abs(value) <= _ZERO_THRESHOLD)) | ((missing == 2) & is_nan)
+            go_left = np.where(use_default, self.default_left[at], value <= self.threshold[at])
+            node = np.where(internal, np.where(go_left, self.left[at], self.right[at]), node)
+        return self.leaf_value[~node].sum(axis=1)
+
+
+def build_predictor(model, backend: str = INFERENCE_BACKEND):
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown INFERENCE_BACKEND {backend!r}; expected one of {BACKENDS}")
+    if backend == "sklearn" or not hasattr(model, "booster_"):
+        return SklearnPredictor(model)
+    if backend == "numpy":
+        try:
+            return TreeEnsemble(model.booster_)
+        except NotImplementedError as e:
+            logger.warning(f"{e}; using the booster backend")
+    return BoosterPredictor(model)
+
+
+_predictors = weakref.WeakKeyDictionary()
+_predictors_lock = threading.Lock()
+
+
+def predictor_for(model):
+    """The configured backend for `model`, built once per model object (hot reloads get a new one)."""
+    predictor = _predictors.get(model)
+    if predictor is None:
+        with _predictors_lock:
+            predictor = _predictors.get(model)
+            if predictor is None:
+                predictor = _predictors[model] = build_predictor(model)
+    return predictor
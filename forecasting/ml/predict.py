@@ -1,54 +1,155 @@
 # ml/predict.py
-import joblib
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
 import pandas as pd
+from decouple import config
 from .weather import get_hourly_forecast
-from .solar import compute_solar_features
-from .py_files.features import add_features
-from .py_files.config import INPUT_COLS, MODEL_PATH
+from .solar import compute_solar_features, fetch_solar_forecast
+from .py_files.features import FeaturePipeline
+from .forecast_cache import run_slot
+from .inference import predictor_for
+from .registry import get_model
+from .singleflight import SingleFlight
+from .telemetry import ROWS_SCORED, stage
+from .timezones import timezone_at
+
+# Wall-clock budget for both upstream calls together (they run in parallel)
+UPSTREAM_DEADLINE_SECONDS = config("UPSTREAM_DEADLINE_SECONDS", default=30.0, cast=float)
+UPSTREAM_FETCH_WORKERS = config("UPSTREAM_FETCH_WORKERS", default=8, cast=int)
+
+# Concurrent requests for the same site + upstream runs share one computation. Other
+# workers only get the small daily frame through the cache, not the 96-row hourly one.
+forecast_flight = SingleFlight("forecast", share=lambda result: (None, result[1]))
+
+_fetch_pool = None
+_fetch_pool_pid = None
+_fetch_pool_lock = threading.Lock()
+
+def _get_fetch_pool() -> ThreadPoolExecutor:
+    # Created lazily and per PID: a pool inherited across a gunicorn fork has no threads.
+    global _fetch_pool, _fetch_pool_pid
+    with _fetch_pool_lock:
+        if _fetch_pool is None or _fetch_pool_pid != os.getpid():
+            _fetch_pool = ThreadPoolExecutor(max_workers=UPSTREAM_FETCH_WORKERS, thread_name_prefix="upstream-fetch")
+            _fetch_pool_pid = os.getpid()
+        return _fetch_pool
+
+def fetch_upstream(lat: float, lon: float, hours: int = 96, deadline: float = None, timezone_str: str = None):
+    """
+    Fetch OpenWeather and Open-Meteo at the same time and return
+    (weather_df, forecast_df) once both are back, so latency is the slower
+    of the two providers rather than their sum.
+
+    Raises TimeoutError if the pair does not finish within `deadline` seconds.
+    Calls that have not started are cancelled; calls already on the wire are
+    bounded by the same value as their socket timeout.
+    """
+    deadline = UPSTREAM_DEADLINE_SECONDS if deadline is None else deadline
+    timezone_str = timezone_str or timezone_at(lat, lon)
+    started = time.monotonic()
+    pool = _get_fetch_pool()
+    weather_future = pool.submit(get_hourly_forecast, lat, lon, hours, deadline, timezone_str=timezone_str)
+    solar_future = pool.submit(fetch_solar_forecast, lat, lon, deadline, timezone_str=timezone_str)
 
-def predict_next_48h(lat: float, lon: float) -> pd.DataFrame:
-    # 1. Fetch weather 
-    weather_df = get_hourly_forecast(lat, lon, hours=96)
+    with stage("fetch_upstream"):
+        done, pending = wait([weather_future, solar_future], timeout=deadline)
+    if pending:
+        for future in pending:
+            future.cancel()
+        raise TimeoutError(f"Upstream fetch exceeded {deadline:.1f}s deadline "
+                           f"(waited {time.monotonic() - started:.1f}s)")
 
-    # 2. Compute solar 
-    solar_df = compute_solar_features(weather_df, lat, lon)
+    # .result() re-raises a provider error in the caller's thread
+    return weather_future.result(), solar_future.result()
+
+def build_feature_frame(weather_df: pd.DataFrame, forecast_df: pd.DataFrame, lat: float, lon: float, timezone_str: str = None) -> pd.DataFrame:
+    """Align the two provider responses for one site (the model inputs are built by `score`)."""
+    # 2. Compute solar (alignment + zenith need both responses)
+    with stage("solar_geometry"):
+        solar_df = compute_solar_features(weather_df, lat, lon, forecast_df=forecast_df, timezone_str=timezone_str)
 
     # 🛑 FIX 1: Prevent the "Error: 'timestamp'" Crash
     if weather_df.empty or solar_df.empty:
         raise ValueError("Weather or Solar API returned no data. Please try again.")
 
     # 3. Merge 
-    df = weather_df.merge(solar_df, on="timestamp", how="inner")
+    with stage("merge"):
+        df = weather_df.merge(solar_df, on="timestamp", how="inner")
     
     if df.empty:
         raise ValueError("Merge result is empty. Check timezone alignment.")
+    return df
 
-    # 4. Feature Engineering
-    df = add_features(df)
+def score(df: pd.DataFrame, num_threads: int = None):
+    """
+    Model output per row of `df`; the INPUT_COLS matrix comes from the same
+    FeaturePipeline as training and goes to the INFERENCE_BACKEND predictor
+    (INFERENCE_NUM_THREADS threads unless `num_threads` is given).
+    """
+    model = get_model()
+    with stage("features"):
+        X = FeaturePipeline.for_model(model).transform(df)
+    with stage("predict"):
+        y = predictor_for(model).predict(X, num_threads=num_threads)
+    ROWS_SCORED.inc(amount=len(X))
+    return y
 
-    # 5. Predict
-    model = joblib.load(MODEL_PATH)
-    df["predicted_specific_energy"] = model.predict(df[INPUT_COLS])
+def aggregate_daily(df: pd.DataFrame, by: list = None) -> pd.DataFrame:
+    """
+    Hourly predictions -> one row per day (plus any extra `by` keys, e.g. a
+    site id when several locations are scored together).
+    """
+    with stage("aggregate"):
+        return _aggregate_daily(df, list(by or []) + ["date"])
 
+def _aggregate_daily(df: pd.DataFrame, keys: list) -> pd.DataFrame:
     # 6. Daily Aggregation for Energy (Needs all 24 hours to sum correctly)
     df["date"] = df["timestamp"].dt.date
-    energy_df = df.groupby("date")["predicted_specific_energy"].sum().reset_index(name="daily_energy")
+    energy_df = df.groupby(keys)["predicted_specific_energy"].sum().reset_index(name="daily_energy")
 
     # 🛑 FIX 2: UI Factors Aggregation
     # Filter for ONLY hours where the sun is up (GHI > 0)
     daylight_df = df[df["ghi"] > 0]
     
     # Calculate factors that humans understand (Daytime averages and High temps)
-    factors_df = daylight_df.groupby("date").agg({
+    factors_df = daylight_df.groupby(keys).agg({
         "ghi": "mean",         # Average radiation *while the sun is shining*
         "air_temp": "mean",    
         "wind_speed": "mean"   # Average wind speed during the day
     }).reset_index()
 
     # Combine the accurate energy sum with the daytime factors
-    daily_df = energy_df.merge(factors_df, on="date", how="left")
+    daily_df = energy_df.merge(factors_df, on=keys, how="left")
     
     # Fallback to 0 if a day mathematically had zero daylight (e.g., polar nights)
-    daily_df = daily_df.fillna(0)
+    return daily_df.fillna(0)
+
+def forecast_key(lat: float, lon: float, timezone_str: str, hours: int = 96) -> str:
+    """Single-flight key: the site (~11 m), its zone and the forecast window (both providers' current runs)."""
+    return f"{round(lat, 4)}:{round(lon, 4)}:{timezone_str}:{hours}:{run_slot('openweather')}:{run_slot('open_meteo')}"
+
+def predict_next_48h(lat: float, lon: float, timezone_str: str = None) -> pd.DataFrame:
+    """
+    `timezone_str` is the system's stored zone; resolved from the coordinates when missing.
+    Returns (hourly df, daily_df); the hourly df is None when another worker computed it.
+    """
+    timezone_str = timezone_str or timezone_at(lat, lon)
+    return forecast_flight.do(forecast_key(lat, lon, timezone_str), lambda: _predict_next_48h(lat, lon, timezone_str))
+
+def _predict_next_48h(lat: float, lon: float, timezone_str: str):
+    # 1. Fetch weather + solar radiation concurrently
+    weather_df, forecast_df = fetch_upstream(lat, lon, hours=96, timezone_str=timezone_str)
+
+    # 2-3. Align and merge
+    df = build_feature_frame(weather_df, forecast_df, lat, lon, timezone_str=timezone_str)
+
+    # 4-5. Features + predict (model is loaded once per worker by the registry)
+    df["predicted_specific_energy"] = score(df)
+
+    # 6. Daily energy + daytime factors
+    daily_df = aggregate_daily(df)
 
-    return df, daily_df
\ No newline at end of file
+    return df, daily_df
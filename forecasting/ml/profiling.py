@@ -0,0 +1,378 @@
+# ml/profiling.py
+"""
+Per-request profile captures for ProfilingMiddleware and the `profiles`
+management command.
+
+Two profilers:
+
+- sampling: a background thread reads every thread's stack
+  (sys._current_frames) each PROFILE_INTERVAL_MS and writes a speedscope
+  file (https://www.speedscope.app), one profile per busy thread. Cheap
+  enough for production, and it also sees the ml-cpu executor and
+  sync_to_async threads the request's work runs on. The samples are
+  process-wide, so on a busy worker they include other in-flight requests.
+- cprofile: deterministic cProfile of the thread running the view, plus
+  every `async_predict.run_cpu` call made on the request's behalf, merged
+  into one .pstats file. Exact call counts, much higher overhead.
+
+With PROFILE_TRACEMALLOC the capture also traces allocations: the peak and
+retained bytes and the top allocating lines go in the capture's metadata,
+the end-of-request snapshot in <id>.tracemalloc (tracemalloc.Snapshot.load).
+Tracing slows every thread of the process while the capture runs.
+
+One capture runs at a time per process; a request that would start a second
+one runs unprofiled. Captures live in PROFILE_DIR, pruned to the newest
+PROFILE_MAX_CAPTURES and PROFILE_MAX_MB.
+"""
+import contextvars
+import cProfile
+import io
+import json
+import logging
+import marshal
+import os
+import pstats
+import re
+import secrets
+import sys
+import threading
+import time
+import tracemalloc
+from collections import defaultdict
+from datetime import datetime, timezone
+from pathlib import Path
+
+from decouple import config
+
+from .py_files.config import BASE_PATH
+
+logger = logging.getLogger(__name__)
+
+PROFILE_DIR = Path(config("PROFILE_DIR", default=str(BASE_PATH / "media" / "profiles")))
+PROFILE_MAX_CAPTURES = config("PROFILE_MAX_CAPTURES", default=50, cast=int)
+PROFILE_MAX_MB = config("PROFILE_MAX_MB", default=200.0, cast=float)
+PROFILE_MODE = config("PROFILE_MODE", default="sampling")
+PROFILE_INTERVAL_MS = config("PROFILE_INTERVAL_MS", default=5.0, cast=float)
+PROFILE_TRACEMALLOC = config("PROFILE_TRACEMALLOC", default=True, cast=bool)
+PROFILE_TRACEMALLOC_FRAMES = config("PROFILE_TRACEMALLOC_FRAMES", default=1, cast=int)
+
+MODES = ("sampling", "cprofile")
+TOP_ALLOCATIONS = 25
+
+_busy = threading.Lock()
+_current = contextvars.ContextVar("profile_capture", default=None)
+
+
+def current():
+    """The capture running for this context (request), if any."""
+    return _current.get()
+
+
+class SamplingProfiler:
+    """Wall-clock stack sampler over every thread of the process."""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.frames = []
+        self._frame_index = {}
+        self.samples = defaultdict(list)  # thread ident -> [(frame index, ...) root first]
+        self.weights = defaultdict(list)
+        self.thread_names = {}
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def call(self, fn, *args):
+        return fn(*args)
+
+    def _frame(self, code) -> int:
+        index = self._frame_index.get(code)
+        if index is None:
+            index = self._frame_index[code] = len(self.frames)
+            self.frames.append({"name": code.co_qualname, "file": code.co_filename, "line": code.co_firstlineno})
+        return index
+
+    def _run(self):
+        own = threading.get_ident()
+        last = time.perf_counter()
+        while not self._stop.wait(self.interval):
+            now = time.perf_counter()
+            elapsed, last = now - last, now
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(self._frame(frame.f_code))
+                    frame = frame.f_back
+                stack.reverse()
+                self.samples[ident].append(tuple(stack))
+                self.weights[ident].append(elapsed)
+                if ident not in self.thread_names:
+                    self.thread_names.update((t.ident, t.name) for t in threading.enumerate())
+
+    def busy_threads(self):
+        """Threads whose stack changed during the capture (idle pool threads are left out)."""
+        return [ident for ident, samples in self.samples.items() if len(set(samples)) > 1]
+
+    def to_speedscope(self, name: str, first_thread: int = None) -> dict:
+        threads = sorted(self.busy_threads(), key=lambda ident: (ident != first_thread, -sum(self.weights[ident])))
+        profiles = []
+        for ident in threads:
+            total = sum(self.weights[ident])
+            profiles.append({
+                "type": "sampled",
+                "name": f"{self.thread_names.get(ident, 'thread')} ({ident})",
+                "unit": "seconds",
+                "startValue": 0,
+                "endValue": total,
+                "samples": [list(stack) for stack in self.samples[ident]],
+                "weights": self.weights[ident],
+            })
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": name,
+            "exporter": "forecasting.ml.profiling",
+            "activeProfileIndex": 0,
+            "shared": {"frames": self.frames},
+            "profiles": profiles,
+        }
+
+
+class DeterministicProfiler:
+    """cProfile on the calling thread, plus one profile per executor call made through `call`."""
+
+    def __init__(self):
+        self.profile = cProfile.Profile()
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def start(self):
+        self.profile.enable()
+
+    def stop(self):
+        self.profile.disable()
+
+    def call(self, fn, *args):
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Python 3.12+ allows one active cProfile per interpreter
+            return fn(*args)
+        try:
+            return fn(*args)
+        finally:
+            profile.disable()
+            with self._lock:
+                self.calls.append(profile)
+
+    def stats(self) -> pstats.Stats:
+        stats = pstats.Stats(self.profile)
+        for profile in self.calls:
+            stats.add(profile)
+        return stats
+
+
+class AllocationTracker:
+    """tracemalloc over the capture window: peak / retained bytes and the top allocating lines."""
+
+    def __init__(self, frames: int = PROFILE_TRACEMALLOC_FRAMES):
+        self.frames = frames
+        self.owned = False
+        self.snapshot = None
+
+    def start(self):
+        self.owned = not tracemalloc.is_tracing()
+        if self.owned:
+            tracemalloc.start(self.frames)
+        tracemalloc.reset_peak()
+        self.base = tracemalloc.get_traced_memory()[0]
+        self.before = tracemalloc.take_snapshot()
+
+    def stop(self) -> dict:
+        current, peak = tracemalloc.get_traced_memory()
+        ignore = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__)]
+        self.snapshot = tracemalloc.take_snapshot().filter_traces(ignore)
+        if self.owned:
+            tracemalloc.stop()
+        top = self.snapshot.compare_to(self.before.filter_traces(ignore), "lineno")[:TOP_ALLOCATIONS]
+        return {
+            "peak_kib": round((peak - self.base) / 1024, 1),
+            "retained_kib": round((current - self.base) / 1024, 1),
+            "top": [{"where": f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+                     "size_kib": round(stat.size_diff / 1024, 1), "count": stat.count_diff}
+                    for stat in top if stat.size_diff > 0],
+        }
+
+
+class Capture:
+    """One profiled request: start() before the view, finish() after, save() writes the files."""
+
+    def __init__(self, route: str, mode: str = PROFILE_MODE, trigger: str = "sampled",
+                 directory: Path = PROFILE_DIR, allocations: bool = PROFILE_TRACEMALLOC):
+        if mode not in MODES:
+            raise ValueError(f"Unknown profile mode {mode!r}; expected one of {MODES}")
+        self.route = route
+        self.mode = mode
+        self.trigger = trigger
+        self.directory = Path(directory)
+        self.profiler = SamplingProfiler(PROFILE_INTERVAL_MS / 1000) if mode == "sampling" else DeterministicProfiler()
+        self.allocations = AllocationTracker() if allocations else None
+        self.meta = {}
+        self._token = None
+
+    @classmethod
+    def begin(cls, route: str, **kwargs):
+        """A started capture, or None while another one is running in this process."""
+        if not _busy.acquire(blocking=False):
+            return None
+        try:
+            capture = cls(route, **kwargs)
+            capture.start()
+        except Exception:
+            _busy.release()
+            raise
+        return capture
+
+    def start(self):
+        self.thread = threading.get_ident()
+        self.created = datetime.now(timezone.utc)
+        self._token = _current.set(self)
+        if self.allocations:
+            self.allocations.start()
+        self._start = time.perf_counter()
+        self.profiler.start()
+
+    def call(self, fn, *args):
+        """Run `fn(*args)` for this request on another thread (async_predict.run_cpu)."""
+        return self.profiler.call(fn, *args)
+
+    def finish(self, request=None, response=None):
+        self.profiler.stop()
+        duration = time.perf_counter() - self._start
+        _current.reset(self._token)
+        self.meta = {
+            "route": self.route,
+            "mode": self.mode,
+            "trigger": self.trigger,
+            "created": self.created.isoformat(timespec="seconds"),
+            "pid": os.getpid(),
+            "duration_ms": round(duration * 1e3, 2),
+            "method": getattr(request, "method", None),
+            "path": getattr(request, "path", None),
+            "status": getattr(response, "status_code", None),
+        }
+        if self.allocations:
+            self.meta["memory"] = self.allocations.stop()
+
+    def save(self) -> str:
+        """Write the capture files, prune the directory and free the process slot. Returns the id."""
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            route = re.sub(r"[^A-Za-z0-9_]+", "_", self.route or "unmatched")
+            capture_id = f"{self.created:%Y%m%dT%H%M%S}-{route}-{os.getpid()}-{secrets.token_hex(2)}"
+            files = {}
+            if self.mode == "sampling":
+                files["profile"] = f"{capture_id}.speedscope.json"
+                _write(self.directory / files["profile"],
+                       json.dumps(self.profiler.to_speedscope(capture_id, self.thread)).encode())
+                self.meta["samples"] = sum(len(self.profiler.samples[i]) for i in self.profiler.busy_threads())
+            else:
+                files["profile"] = f"{capture_id}.pstats"
+                # Same bytes as Stats.dump_stats, written atomically
+                _write(self.directory / files["profile"], marshal.dumps(self.profiler.stats().stats))
+            if self.allocations and self.allocations.snapshot is not None:
+                files["snapshot"] = f"{capture_id}.tracemalloc"
+                self.allocations.snapshot.dump(str(self.directory / files["snapshot"]))
+            self.meta.update(id=capture_id, files=files)
+            _write(self.directory / f"{capture_id}.meta.json", json.dumps(self.meta, indent=1).encode())
+            prune(self.directory)
+            logger.info("Saved %s profile %s (%.1f ms)", self.mode, capture_id, self.meta["duration_ms"])
+            return capture_id
+        finally:
+            _busy.release()
+
+
+def _write(path: Path, data: bytes):
+    tmp = path.with_name(f".{path.name}.tmp")
+    tmp.write_bytes(data)
+    os.replace(tmp, path)
+
+
+def captures(directory: Path = PROFILE_DIR):
+    """Metadata of every stored capture, newest first."""
+    rows = []
+    for path in Path(directory).glob("*.meta.json"):
+        try:
+            rows.append(json.loads(path.read_bytes()))
+        except (OSError, ValueError):
+            continue
+    return sorted(rows, key=lambda meta: meta["id"], reverse=True)
+
+
+def prune(directory: Path = PROFILE_DIR, max_captures: int = PROFILE_MAX_CAPTURES,
+          max_mb: float = PROFILE_MAX_MB) -> int:
+    """Delete the oldest captures beyond the count and size bounds; returns how many were removed."""
+    directory = Path(directory)
+    files = defaultdict(list)
+    for path in directory.iterdir():
+        if not path.name.startswith("."):
+            files[path.name.split(".", 1)[0]].append(path)
+    sizes = {capture_id: sum(p.stat().st_size for p in paths) for capture_id, paths in files.items()}
+    removed = 0
+    total = sum(sizes.values())
+    for capture_id in sorted(files):
+        if len(files) - removed <= max_captures and total <= max_mb * 2**20:
+            break
+        for path in files[capture_id]:
+            path.unlink(missing_ok=True)
+        total -= sizes[capture_id]
+        removed += 1
+    return removed
+
+
+def summarize(meta: dict, directory: Path = PROFILE_DIR, limit: int = 25, sort: str = "cumulative") -> str:
+    """Text summary of one capture: hottest functions and top allocations."""
+    directory = Path(directory)
+    out = io.StringIO()
+    out.write(f"{meta['id']}  {meta['method']} {meta['path']} -> {meta['status']}  "
+              f"{meta['duration_ms']:.1f} ms  ({meta['mode']}, {meta['trigger']})\n\n")
+    path = directory / meta["files"]["profile"]
+    if meta["mode"] == "cprofile":
+        pstats.Stats(str(path), stream=out).strip_dirs().sort_stats(sort).print_stats(limit)
+    else:
+        _summarize_speedscope(json.loads(path.read_bytes()), out, limit, sort)
+    memory = meta.get("memory")
+    if memory:
+        out.write(f"\nallocations: peak {memory['peak_kib']:,.1f} KiB, retained {memory['retained_kib']:,.1f} KiB\n")
+        for row in memory["top"][:limit]:
+            out.write(f"  {row['size_kib']:>10,.1f} KiB {row['count']:>8,}  {row['where']}\n")
+    return out.getvalue()
+
+
+def _summarize_speedscope(document: dict, out, limit: int, sort: str):
+    frames = document["shared"]["frames"]
+    for profile in document["profiles"]:
+        self_time = defaultdict(float)
+        total_time = defaultdict(float)
+        for stack, weight in zip(profile["samples"], profile["weights"]):
+            if stack:
+                self_time[stack[-1]] += weight
+            for index in set(stack):
+                total_time[index] += weight
+        out.write(f"{profile['name']}: {len(profile['samples'])} samples, {profile['endValue'] * 1e3:.1f} ms\n")
+        out.write(f"  {'self ms':>10}{'total ms':>10}  function\n")
+        key = self_time if sort == "tottime" else total_time
+        for index in sorted(key, key=key.get, reverse=True)[:limit]:
+            frame = frames[index]
+            out.write(f"  {self_time[index] * 1e3:>10.1f}{total_time[index] * 1e3:>10.1f}  "
+                      f"{frame['name']} ({os.path.basename(frame['file'])}:{frame['line']})\n")
+        out.write("\n")
@@ -4,4 +4,6 @@ TARGET_COL="specific_energy"
 ML_PATH=Path(__file__).parent.parent.resolve()
 MODEL_PATH=ML_PATH / "models"/"lgb_model.pkl"
 BASE_PATH=Path(__file__).parent.parent.parent.parent.resolve()
-DATA_PATH=BASE_PATH/"media"/"pv_weather_hourly.csv"
\ No newline at end of file
+DATA_PATH=BASE_PATH/"media"/"pv_weather_hourly.csv"
+# Typed memmap cache of DATA_PATH built by data_cache.py
+DATA_CACHE_PATH=BASE_PATH/"media"/"pv_weather_cache"
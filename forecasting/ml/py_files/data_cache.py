@@ -0,0 +1,115 @@
+"""
+Typed columnar cache of the training CSV.
+
+`build_cache` parses pv_weather_hourly.csv once (in chunks), runs the
+FeaturePipeline and writes memory-mappable .npy files:
+
+    features.npy   float32 (n_rows, len(INPUT_COLS)), columns in INPUT_COLS order
+    target.npy     float64 (n_rows,) specific_energy
+    day_code.npy   int32   (n_rows,) UTC date as days since 1970-01-01
+    meta.json      columns, split boundaries + the source file's size / mtime
+
+Rows are stored train first, then val, then test (the 70/15/15 day split of
+`split_indices`, CSV order kept within each split), so `load_cache` maps the
+arrays back without copying and each split is a contiguous slice between
+the `split_bounds` offsets: a view, not a copy.
+
+    python data_cache.py        # run from py_files/, like run_train.py
+"""
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+import features
+from config import DATA_CACHE_PATH, DATA_PATH, INPUT_COLS
+
+CACHE_VERSION = 2
+CHUNK_ROWS = 500_000
+
+
+def _source_stamp(path):
+    stat = os.stat(path)
+    return {"path": str(path), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def build_cache(path=DATA_PATH, cache_dir=DATA_CACHE_PATH, chunk_rows=CHUNK_ROWS):
+    """Convert the CSV at `path` into the cache directory; returns the row count."""
+    os.makedirs(cache_dir, exist_ok=True)
+    X_parts, y_parts, day_parts = [], [], []
+    for chunk in pd.read_csv(path, chunksize=chunk_rows):
+        X, day_code = features.feature_pipeline.transform(chunk, with_day_codes=True)
+        X_parts.append(X)
+        y_parts.append((chunk["energy_mwh"] / chunk["capacity_mw"]).to_numpy(dtype=np.float64))
+        day_parts.append(day_code)
+
+    arrays = {
+        "features": np.concatenate(X_parts) if X_parts else np.empty((0, len(INPUT_COLS)), np.float32),
+        "target": np.concatenate(y_parts) if y_parts else np.empty(0, np.float64),
+        "day_code": np.concatenate(day_parts) if day_parts else np.empty(0, np.int32),
+    }
+    # Group the rows by split so loading one is a slice of the memmap
+    splits = split_indices(arrays["day_code"])
+    order = np.concatenate(splits)
+    for name, array in arrays.items():
+        np.save(os.path.join(cache_dir, f"{name}.npy"), np.ascontiguousarray(array[order]))
+
+    meta = {"version": CACHE_VERSION, "columns": INPUT_COLS, "rows": len(arrays["target"]),
+            "splits": np.cumsum([0] + [len(idx) for idx in splits]).tolist(),
+            "source": _source_stamp(path)}
+    with open(os.path.join(cache_dir, "meta.json"), "w") as f:
+        json.dump(meta, f, indent=2)
+    return meta["rows"]
+
+
+def cache_is_fresh(path=DATA_PATH, cache_dir=DATA_CACHE_PATH):
+    """True when the cache exists, matches INPUT_COLS and was built from the current CSV."""
+    try:
+        with open(os.path.join(cache_dir, "meta.json")) as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return False
+    if meta.get("version") != CACHE_VERSION or meta.get("columns") != INPUT_COLS:
+        return False
+    if not os.path.exists(path):
+        return True  # cache shipped without the CSV
+    stamp = _source_stamp(path)
+    return meta["source"]["size"] == stamp["size"] and meta["source"]["mtime_ns"] == stamp["mtime_ns"]
+
+
+def load_cache(cache_dir=DATA_CACHE_PATH):
+    """(features, target, day_code) as read-only memmaps; nothing is read until touched."""
+    load = lambda name: np.load(os.path.join(cache_dir, f"{name}.npy"), mmap_mode="r")
+    return load("features"), load("target"), load("day_code")
+
+
+def split_bounds(cache_dir=DATA_CACHE_PATH):
+    """Row offsets [train_start, val_start, test_start, n_rows] of the cached arrays."""
+    with open(os.path.join(cache_dir, "meta.json")) as f:
+        return json.load(f)["splits"]
+
+
+def split_indices(day_code, seed=42):
+    """
+    Row indices of the train / val / test days. Same split as the CSV path:
+    unique days in order of first appearance, shuffled with `seed`, cut 70/15/15.
+    """
+    unique_days = pd.unique(day_code)
+    rng = np.random.default_rng(seed=seed)
+    rng.shuffle(unique_days)
+
+    n_days = len(unique_days)
+    cuts = [0, int(0.7 * n_days), int(0.85 * n_days), n_days]
+    # day code -> split number (0 train, 1 val, 2 test) as a lookup table instead of three isin() passes
+    base = int(unique_days.min()) if n_days else 0
+    split_of_day = np.full(int(unique_days.max()) - base + 1 if n_days else 0, -1, dtype=np.int8)
+    for split, (lo, hi) in enumerate(zip(cuts[:-1], cuts[1:])):
+        split_of_day[unique_days[lo:hi] - base] = split
+    row_split = split_of_day[day_code - base]
+    return tuple(np.flatnonzero(row_split == split) for split in range(3))
+
+
+if __name__ == "__main__":
+    rows = build_cache()
+    print(f"Cached {rows} rows from {DATA_PATH} into {DATA_CACHE_PATH}")
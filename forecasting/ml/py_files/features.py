@@ -1,7 +1,13 @@
 import pandas as pd
 import numpy as np
 
+try:  # imported as forecasting.ml.py_files.features by the app, flat from py_files/ for training
+    from .config import INPUT_COLS
+except ImportError:
+    from config import INPUT_COLS
+
 def add_features(df):
+    # Column-by-column reference version; train / predict use FeaturePipeline below
     # Ensure timestamp is datetime
     df["timestamp"] = pd.to_datetime(df["timestamp"], utc=True)
     df["date"]=(pd.to_datetime(df["timestamp"])).dt.date
@@ -20,3 +26,91 @@ def add_features(df):
     df["day_cos"] = np.cos(2 * np.pi * (df["day"] - 1) / 31)
 
     return df
+
+
+def _cyclic(values, period):
+    angle = 2 * np.pi * values / period
+    return np.sin(angle), np.cos(angle)
+
+
+class FeaturePipeline:
+    """
+    Writes exactly `columns` (INPUT_COLS) into one preallocated float32
+    matrix, the same way for training and serving. Timestamps are read as
+    UTC like add_features (naive values are taken as UTC wall time), and the
+    calendar encodings are looked up from per-hour / day / month tables
+    instead of computing sin / cos per row.
+    """
+
+    def __init__(self, columns=INPUT_COLS, dtype=np.float32):
+        self.columns = list(columns)
+        self.dtype = np.dtype(dtype)
+        hour_sin, hour_cos = _cyclic(np.arange(24), 24)
+        # Indexed by day of month (1-31) and month (1-12); slot 0 is unused
+        day_sin, day_cos = _cyclic(np.arange(32) - 1, 31)
+        month_sin, month_cos = _cyclic(np.arange(13) - 1, 12)
+        tables = {
+            "hour_sin": ("hour", hour_sin), "hour_cos": ("hour", hour_cos),
+            "day_sin": ("day", day_sin), "day_cos": ("day", day_cos),
+            "month_sin": ("month", month_sin), "month_cos": ("month", month_cos),
+        }
+        self._calendar = {name: (unit, table.astype(self.dtype)) for name, (unit, table) in tables.items()}
+
+    @staticmethod
+    def _utc_wall_times(timestamps):
+        if not pd.api.types.is_datetime64_any_dtype(timestamps):
+            timestamps = pd.to_datetime(timestamps, utc=True)
+        if getattr(timestamps.dt, "tz", None) is not None:
+            timestamps = timestamps.dt.tz_convert("UTC").dt.tz_localize(None)
+        return timestamps.to_numpy(dtype="datetime64[ns]")
+
+    def calendar(self, timestamps):
+        """{hour, day, month, day_code} integer arrays; day_code = UTC date as days since 1970-01-01."""
+        values = self._utc_wall_times(timestamps)
+        days = values.astype("datetime64[D]")
+        months = values.astype("datetime64[M]")
+        return {
+            "hour": ((values - days) // np.timedelta64(1, "h")).astype(np.intp),
+            "day": (days - months.astype("datetime64[D]")).astype(np.intp) + 1,
+            "month": months.astype(np.intp) % 12 + 1,
+            "day_code": days.astype(np.int32),
+        }
+
+    def transform(self, df, out=None, with_day_codes=False):
+        """
+        Feature matrix of `df` (raw weather / solar columns + timestamp),
+        shape (len(df), len(columns)). Pass `out` to fill an existing array;
+        with_day_codes=True also returns the rows' UTC day codes.
+        """
+        X = out if out is not None else np.empty((len(df), len(self.columns)), dtype=self.dtype)
+        parts = None
+        if with_day_codes or any(col in self._calendar for col in self.columns):
+            parts = self.calendar(df["timestamp"])
+        for j, col in enumerate(self.columns):
+            if col in self._calendar:
+                unit, table = self._calendar[col]
+                X[:, j] = table[parts[unit]]
+            else:
+                X[:, j] = df[col].to_numpy()
+        return (X, parts["day_code"]) if with_day_codes else X
+
+    def frame(self, df):
+        """transform() as a DataFrame with INPUT_COLS names (shares the matrix)."""
+        return pd.DataFrame(self.transform(df), columns=self.columns, index=df.index, copy=False)
+
+    @classmethod
+    def for_model(cls, model):
+        """
+        The pipeline to serve `model` with. train.py stores the matrix dtype
+        on the model (`feature_dtype_`); a float32-trained tree and float64
+        inputs (or the reverse) can land on different sides of a split, so
+        serving matches it. Older models were fit on float64 columns.
+        """
+        dtype = np.dtype(getattr(model, "feature_dtype_", "float64"))
+        if dtype not in _pipelines:
+            _pipelines[dtype] = cls(dtype=dtype)
+        return _pipelines[dtype]
+
+
+feature_pipeline = FeaturePipeline()
+_pipelines = {feature_pipeline.dtype: feature_pipeline}
@@ -1,25 +1,35 @@
 import pandas as pd
 import numpy as np
-import features
-from config import DATA_PATH
+import data_cache
+from features import feature_pipeline
+from config import DATA_PATH, DATA_CACHE_PATH, INPUT_COLS, TARGET_COL
 
-def load_and_split_data():
-    
-    df = pd.read_csv(DATA_PATH)
-    df = features.add_features(df)
-    df["specific_energy"]=df["energy_mwh"]/df["capacity_mw"]
-    unique_dates = df["date"].unique()
-    rng = np.random.default_rng(seed=42)
-    rng.shuffle(unique_dates)
+def load_and_split_data(path=DATA_PATH, cache_dir=DATA_CACHE_PATH, use_cache=True):
+    # Fast path: the typed cache from data_cache.py, if it was built from this CSV
+    if use_cache and data_cache.cache_is_fresh(path, cache_dir):
+        return load_split_from_cache(cache_dir)
 
-    n_days = len(unique_dates)
+    df = pd.read_csv(path)
+    # Same FeaturePipeline as predict_next_48h, so training and serving see identical features
+    X, day_code = feature_pipeline.transform(df, with_day_codes=True)
+    y = (df["energy_mwh"] / df["capacity_mw"]).to_numpy()
+    del df
 
-    train_dates = unique_dates[:int(0.7 * n_days)]
-    val_dates   = unique_dates[int(0.7 * n_days):int(0.85 * n_days)]
-    test_dates  = unique_dates[int(0.85 * n_days):]
+    # Unique UTC days, shuffled (seed 42) and cut 70/15/15 into train / val / test
+    return tuple(_frame(X[idx], y[idx]) for idx in data_cache.split_indices(day_code))
 
-    train_df = df[df["date"].isin(train_dates)]
-    val_df   = df[df["date"].isin(val_dates)]
-    test_df  = df[df["date"].isin(test_dates)]
+def load_split_arrays(cache_dir=DATA_CACHE_PATH):
+    """[(X, y)] for train / val / test from the cache: float32 X, memmap slices (no copy)."""
+    X, y, _ = data_cache.load_cache(cache_dir)
+    bounds = data_cache.split_bounds(cache_dir)
+    return [(X[a:b], y[a:b]) for a, b in zip(bounds[:-1], bounds[1:])]
 
-    return train_df, val_df, test_df
+def load_split_from_cache(cache_dir=DATA_CACHE_PATH):
+    # Same (train_df, val_df, test_df) contract as the CSV path
+    return tuple(_frame(X, y) for X, y in load_split_arrays(cache_dir))
+
+def _frame(X, y):
+    # INPUT_COLS + TARGET_COL only, sharing X
+    df = pd.DataFrame(X, columns=INPUT_COLS, copy=False)
+    df[TARGET_COL] = y
+    return df
@@ -0,0 +1,39 @@
+import argparse
+import json
+
+from search import PARAM_GRID, load_arrays, run_search, sample_configs, time_series_folds
+from train import train_and_save_model
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Parallel time-series CV + hyperparameter search for the LightGBM model.")
+    parser.add_argument("--folds", type=int, default=4, help="Validation blocks (default: 4).")
+    parser.add_argument("--gap-days", type=int, default=1, help="Days left out between train and validation (default: 1).")
+    parser.add_argument("--window-days", type=int, help="Rolling training window; default is an expanding window.")
+    parser.add_argument("--configs", type=int, help=f"Random configs to try (default: the full grid of {len(sample_configs())}).")
+    parser.add_argument("--workers", type=int, help="Worker processes (default: one per core).")
+    parser.add_argument("--threads", type=int, help="LightGBM threads per worker (default: cores // workers).")
+    parser.add_argument("--json", help="Write the summary, per-fit rows and overall stats to this file.")
+    parser.add_argument("--save", action="store_true", help="Refit the best config with train.py and save it to MODEL_PATH.")
+    args = parser.parse_args()
+
+    arrays = load_arrays()
+    folds = time_series_folds(arrays["day_code"], n_folds=args.folds, gap_days=args.gap_days, window_days=args.window_days)
+    configs = sample_configs(PARAM_GRID, n_configs=args.configs)
+    summary, rows, overall = run_search(arrays, configs, folds, workers=args.workers, threads_per_worker=args.threads)
+
+    print(f"\n{'config':>6}{'rmse':>9}{'±':>8}{'mae':>9}{'r2':>8}{'trees':>7}{'wall s':>9}{'cpu s':>9}{'cpu %':>7}  params")
+    for s in summary:
+        print(f"{s['config']:>6}{s['rmse']:>9.4f}{s['rmse_std']:>8.4f}{s['mae']:>9.4f}{s['r2']:>8.4f}{s['best_iteration']:>7}"
+              f"{s['wall_seconds']:>9.1f}{s['cpu_seconds']:>9.1f}{100 * s['cpu_utilization']:>6.0f}%  {s['params']}")
+    print(f"\n{overall['fits']} fits in {overall['wall_seconds']:.1f}s wall, {overall['cpu_seconds']:.1f}s CPU "
+          f"({100 * overall['cpu_utilization']:.0f}% of {overall['cores']} cores, "
+          f"{overall['workers']} workers x {overall['threads_per_worker']} threads)")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"summary": summary, "fits": rows, "overall": overall, "folds": folds}, f, indent=2, default=int)
+
+    if args.save:
+        best = summary[0]
+        print(f"\nRefitting config {best['config']}: {best['params']}")
+        train_and_save_model(params=best["params"])
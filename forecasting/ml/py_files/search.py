@@ -0,0 +1,223 @@
+"""
+Time-aware cross-validation and hyperparameter search.
+
+The dataset (the data_cache arrays) is loaded once and copied into
+multiprocessing shared memory; a process pool attaches to it by name, so
+every worker trains on the same pages instead of re-reading or pickling it.
+Each task is one (config, fold) fit, and LightGBM runs with
+`threads_per_worker` threads so workers x threads never exceeds the cores.
+
+Folds are blocked by day: the sorted unique days are cut into n_folds + 1
+blocks, fold k validates on block k + 1 after `gap_days`, training on
+everything before it (expanding) or on the last `window_days` before it
+(rolling). Rows of one day never end up on both sides.
+"""
+import itertools
+import os
+import random
+import resource
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
+
+import numpy as np
+
+import data_cache
+from config import DATA_CACHE_PATH, DATA_PATH
+from metrics import regression_metrics
+
+# Defaults of every scored config; train.py refits the winner on top of the same dict
+BASE_PARAMS = {
+    "n_estimators": 1000,
+    "learning_rate": 0.05,
+    "num_leaves": 64,
+    "subsample": 0.8,
+    "colsample_bytree": 0.8,
+    "random_state": 42,
+    "verbose": -1,
+}
+
+PARAM_GRID = {
+    "learning_rate": [0.03, 0.05, 0.1],
+    "num_leaves": [31, 64, 127],
+    "min_child_samples": [20, 50, 100],
+    "colsample_bytree": [0.7, 0.9],
+    "reg_lambda": [0.0, 1.0],
+}
+
+EARLY_STOPPING_ROUNDS = 50
+
+
+# --- Folds ---
+
+def time_series_folds(day_code, n_folds=4, gap_days=1, window_days=None):
+    """[(train_lo, train_hi, val_lo, val_hi)] day-code ranges (hi exclusive), oldest fold first."""
+    days = np.unique(day_code)
+    blocks = np.array_split(days, n_folds + 1)
+    folds = []
+    for k in range(1, n_folds + 1):
+        val = blocks[k]
+        train_hi = int(val[0]) - gap_days
+        train_lo = int(days[0]) if window_days is None else max(int(days[0]), train_hi - window_days)
+        if train_hi <= train_lo or len(val) == 0:
+            continue
+        folds.append((train_lo, train_hi, int(val[0]), int(val[-1]) + 1))
+    return folds
+
+
+def sample_configs(grid=PARAM_GRID, n_configs=None, seed=0):
+    """Every grid combination, or `n_configs` of them drawn without replacement."""
+    keys = list(grid)
+    combos = [dict(zip(keys, values)) for values in itertools.product(*(grid[k] for k in keys))]
+    if n_configs is not None and n_configs < len(combos):
+        combos = random.Random(seed).sample(combos, n_configs)
+    return combos
+
+
+# --- Shared memory ---
+
+class SharedArrays:
+    """Named arrays copied into shared memory once; workers attach with `attach(spec)`."""
+
+    def __init__(self, arrays):
+        self._blocks = []
+        self.spec = {}
+        for name, array in arrays.items():
+            block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+            np.ndarray(array.shape, array.dtype, buffer=block.buf)[...] = array
+            self._blocks.append(block)
+            self.spec[name] = (block.name, array.shape, array.dtype.str)
+
+    def close(self):
+        for block in self._blocks:
+            block.close()
+            block.unlink()
+        self._blocks = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+_worker = {}
+
+
+def attach(spec):
+    arrays, blocks = {}, []
+    for name, (block_name, shape, dtype) in spec.items():
+        block = shared_memory.SharedMemory(name=block_name)
+        blocks.append(block)  # must stay referenced for as long as the views are used
+        arrays[name] = np.ndarray(shape, np.dtype(dtype), buffer=block.buf)
+    return arrays, blocks
+
+
+def _init_worker(spec, threads):
+    # Native thread pools read these at first use; LightGBM also gets n_jobs explicitly
+    for var in ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS"):
+        os.environ[var] = str(threads)
+    _worker["arrays"], _worker["blocks"] = attach(spec)
+    _worker["threads"] = threads
+
+
+# --- One fit ---
+
+def fit_fold(config_id, params, fold_id, fold):
+    """Train on one fold in a worker; returns metrics plus wall / CPU seconds."""
+    import lightgbm as lgb
+
+    X, y, day = _worker["arrays"]["features"], _worker["arrays"]["target"], _worker["arrays"]["day_code"]
+    train_lo, train_hi, val_lo, val_hi = fold
+    train_idx = np.flatnonzero((day >= train_lo) & (day < train_hi))
+    val_idx = np.flatnonzero((day >= val_lo) & (day < val_hi))
+
+    wall0, cpu0 = time.perf_counter(), time.process_time()
+    model = lgb.LGBMRegressor(**{**BASE_PARAMS, **params, "n_jobs": _worker["threads"]})
+    model.fit(
+        X[train_idx], y[train_idx],
+        eval_set=[(X[val_idx], y[val_idx])],
+        eval_metric="rmse",
+        callbacks=[lgb.early_stopping(stopping_rounds=EARLY_STOPPING_ROUNDS, verbose=False)],
+    )
+    metrics = regression_metrics(y[val_idx], model.predict(X[val_idx]))
+    return {
+        "config": config_id,
+        "fold": fold_id,
+        "train_rows": len(train_idx),
+        "val_rows": len(val_idx),
+        "best_iteration": int(model.best_iteration_ or model.n_estimators),
+        "wall_seconds": time.perf_counter() - wall0,
+        "cpu_seconds": time.process_time() - cpu0,
+        **{k: float(v) for k, v in metrics.items()},
+    }
+
+
+# --- Driver ---
+
+def load_arrays(path=DATA_PATH, cache_dir=DATA_CACHE_PATH):
+    """features / target / day_code from the data cache, building it from the CSV first if stale."""
+    if not data_cache.cache_is_fresh(path, cache_dir):
+        data_cache.build_cache(path, cache_dir)
+    X, y, day_code = data_cache.load_cache(cache_dir)
+    return {"features": X, "target": y, "day_code": day_code}
+
+
+def run_search(arrays, configs, folds, workers=None, threads_per_worker=None, log=print):
+    """
+    Fit every (config, fold) on a process pool. Returns (per-config summary
+    sorted by mean RMSE, per-fit rows, overall stats).
+    """
+    cores = os.cpu_count() or 1
+    workers = max(1, min(workers or cores, len(configs) * len(folds)))
+    threads = threads_per_worker or max(1, cores // workers)
+    log(f"{len(configs)} configs x {len(folds)} folds on {workers} workers x {threads} threads ({cores} cores)")
+
+    usage0 = resource.getrusage(resource.RUSAGE_CHILDREN)
+    start = time.perf_counter()
+    rows = []
+    with SharedArrays(arrays) as shared, ProcessPoolExecutor(
+        max_workers=workers, initializer=_init_worker, initargs=(shared.spec, threads)
+    ) as pool:
+        futures = [
+            pool.submit(fit_fold, config_id, params, fold_id, fold)
+            for config_id, params in enumerate(configs)
+            for fold_id, fold in enumerate(folds)
+        ]
+        for future in as_completed(futures):
+            row = future.result()
+            rows.append(row)
+            log(f"  config {row['config']:>3} fold {row['fold']}: rmse {row['rmse']:.4f} "
+                f"({row['wall_seconds']:.1f}s, {row['best_iteration']} trees)")
+    elapsed = time.perf_counter() - start
+    usage1 = resource.getrusage(resource.RUSAGE_CHILDREN)
+    cpu = (usage1.ru_utime - usage0.ru_utime) + (usage1.ru_stime - usage0.ru_stime)
+
+    summary = []
+    for config_id, params in enumerate(configs):
+        fits = [r for r in rows if r["config"] == config_id]
+        wall = sum(r["wall_seconds"] for r in fits)
+        cpu_seconds = sum(r["cpu_seconds"] for r in fits)
+        summary.append({
+            "config": config_id,
+            "params": params,
+            **{k: float(np.mean([r[k] for r in fits])) for k in ("mae", "rmse", "r2")},
+            "rmse_std": float(np.std([r["rmse"] for r in fits])),
+            "best_iteration": int(np.mean([r["best_iteration"] for r in fits])),
+            "wall_seconds": wall,
+            "cpu_seconds": cpu_seconds,
+            # Share of its threads' capacity the config kept busy
+            "cpu_utilization": cpu_seconds / (wall * threads) if wall else 0.0,
+        })
+    summary.sort(key=lambda s: s["rmse"])
+    overall = {
+        "workers": workers,
+        "threads_per_worker": threads,
+        "cores": cores,
+        "fits": len(rows),
+        "wall_seconds": elapsed,
+        "cpu_seconds": cpu,
+        # Share of the whole machine the search kept busy
+        "cpu_utilization": cpu / (elapsed * cores) if elapsed else 0.0,
+    }
+    return summary, rows, overall
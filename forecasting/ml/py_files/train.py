@@ -2,21 +2,20 @@ import lightgbm as lgb
 import joblib
 from load_data import load_and_split_data
 from config import INPUT_COLS, TARGET_COL, MODEL_PATH
+from features import feature_pipeline
 from metrics import regression_metrics
+from search import BASE_PARAMS
 
 
-def train_and_save_model():
+def train_and_save_model(params=None):
+    # `params` (e.g. the best config from run_search.py) override the search's BASE_PARAMS
     train_df, val_df, test_df = load_and_split_data()
 
-    model = lgb.LGBMRegressor(
-        n_estimators=1000,
-        learning_rate=0.05,
-        num_leaves=64,
-        subsample=0.8,
-        colsample_bytree=0.8,
-        random_state=42,
-        n_jobs=-1
-    )
+    model = lgb.LGBMRegressor(**{
+        **BASE_PARAMS,
+        "n_jobs": -1,
+        **(params or {}),
+    })
 
     model.fit(
         train_df[INPUT_COLS],
@@ -35,4 +34,6 @@ def train_and_save_model():
     for k, v in metrics.items():
         print(f"{k.upper()}: {v:.4f}")
 
+    # Serving builds its feature matrix in the dtype the model was trained on
+    model.feature_dtype_ = feature_pipeline.dtype.name
     joblib.dump(model, MODEL_PATH)
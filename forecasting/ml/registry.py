@@ -0,0 +1,148 @@
+# ml/registry.py
+import gc
+import hashlib
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+
+import joblib
+import numpy as np
+from decouple import config
+
+from .inference import predictor_for
+from .py_files.config import INPUT_COLS, MODEL_PATH
+from .telemetry import STAGE_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# How often (seconds) a request is allowed to stat() the model file.
+# 0 means "check on every call", which is still just one stat syscall.
+MODEL_RELOAD_CHECK_SECONDS = config("MODEL_RELOAD_CHECK_SECONDS", default=5.0, cast=float)
+
+
+def _file_digest(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class ModelRegistry:
+    """
+    Keeps one unpickled model per process and swaps it atomically when the
+    file on disk changes. Requests only pay for a cheap (throttled) stat().
+    """
+
+    def __init__(self, path: Path, check_interval: float = MODEL_RELOAD_CHECK_SECONDS):
+        self.path = Path(path)
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        # (model, version, mtime_ns, size) is replaced as a single tuple so
+        # readers never see a half-updated registry.
+        self._state = None
+        self._last_check = 0.0
+        self.load_seconds = 0.0
+        self.warmup_seconds = 0.0
+        self.loaded_at = None
+        self.reload_count = 0
+
+    # --- Public API ---
+
+    def get(self):
+        """Return the current model, loading or hot-reloading it if needed."""
+        state = self._state
+        if state is None:
+            return self._load(reason="initial")[0]
+
+        now = time.monotonic()
+        if now - self._last_check >= self.check_interval:
+            self._last_check = now
+            try:
+                st = os.stat(self.path)
+            except OSError:
+                # File briefly missing during a deploy: keep serving the old model.
+                return state[0]
+            if (st.st_mtime_ns, st.st_size) != (state[2], state[3]):
+                state = self._load(reason="file changed")
+        return state[0]
+
+    @property
+    def version(self):
+        return self._state[1] if self._state else None
+
+    def stats(self) -> dict:
+        return {
+            "path": str(self.path),
+            "version": self.version,
+            "loaded": self._state is not None,
+            "load_seconds": round(self.load_seconds, 4),
+            "warmup_seconds": round(self.warmup_seconds, 4),
+            "loaded_at": self.loaded_at,
+            "reload_count": self.reload_count,
+            "pid": os.getpid(),
+        }
+
+    def preload(self, freeze: bool = True):
+        """
+        Load + warm up eagerly. Call this in the gunicorn master (``--preload``)
+        so forked workers share the booster pages copy-on-write; ``gc.freeze()``
+        keeps the collector from touching (and so copying) those objects.
+        """
+        model = self.get()
+        if freeze:
+            gc.freeze()
+        return model
+
+    # --- Internals ---
+
+    def _load(self, reason: str):
+        with self._lock:
+            st = os.stat(self.path)
+            self._last_check = time.monotonic()  # this stat() opens a new check window
+            current = self._state
+            # Another thread may have reloaded while we waited for the lock.
+            if current is not None and (st.st_mtime_ns, st.st_size) == (current[2], current[3]):
+                return current
+
+            digest = _file_digest(self.path)[:12]
+            if current is not None and digest == current[1]:
+                # Touched but identical content (e.g. re-deploy of the same file).
+                self._state = (current[0], digest, st.st_mtime_ns, st.st_size)
+                return self._state
+
+            start = time.perf_counter()
+            model = joblib.load(self.path)
+            self.load_seconds = time.perf_counter() - start
+
+            start = time.perf_counter()
+            self._warm_up(model)
+            self.warmup_seconds = time.perf_counter() - start
+            STAGE_SECONDS.observe(self.load_seconds + self.warmup_seconds, "model_load")
+
+            if current is not None:
+                self.reload_count += 1
+            self.loaded_at = time.time()
+            self._state = (model, digest, st.st_mtime_ns, st.st_size)
+            logger.info(
+                "Model %s loaded (%s) in %.3fs, warm-up %.3fs, reloads=%d, pid=%d",
+                digest, reason, self.load_seconds, self.warmup_seconds,
+                self.reload_count, os.getpid(),
+            )
+            return self._state
+
+    @staticmethod
+    def _warm_up(model):
+        # First predict() lazily builds LightGBM's internal buffers (and the
+        # numpy backend compiles its trees); do it here instead of on the
+        # first user request.
+        predictor_for(model).predict(np.zeros((1, len(INPUT_COLS)), dtype=np.float32))
+
+
+registry = ModelRegistry(MODEL_PATH)
+
+
+def get_model():
+    return registry.get()
@@ -0,0 +1,199 @@
+# ml/singleflight.py
+"""
+Single-flight coalescing for identical in-flight computations.
+
+Callers asking for the same key while a computation for it is running wait
+for that one computation and share its result instead of starting their own:
+
+- within a process, through a shared future per key;
+- across gunicorn workers, through an ``add()`` lock in a Django cache.
+  Workers that find the lock taken flag that they are waiting and poll for
+  the result; the lock holder publishes ``share(result)`` under a
+  short-lived key only when that flag is set. Without waiters a computation
+  costs three cache round-trips (add, get, delete) and stores nothing. If
+  the lock holder fails or the wait times out, a waiter computes the value
+  itself, so coalescing never turns into an error.
+
+``ado`` coalesces in-process per event loop. Under ASGI that is the
+worker's loop; under WSGI every request runs on its own loop, so only the
+cache layer coalesces there (use ``do`` from sync code).
+
+Shared results are handed to every caller as-is; treat them as read-only.
+"""
+import asyncio
+import logging
+import threading
+import time
+import weakref
+from concurrent.futures import Future
+
+from decouple import config
+
+logger = logging.getLogger(__name__)
+
+SINGLEFLIGHT_ENABLED = config("SINGLEFLIGHT_ENABLED", default=True, cast=bool)
+# Django cache alias used for the cross-worker lock; empty = in-process only.
+# LocMemCache is per process, so cross-worker coalescing needs a shared cache
+# (database / redis / memcached, see CACHE_BACKEND in settings).
+SINGLEFLIGHT_CACHE_ALIAS = config("SINGLEFLIGHT_CACHE_ALIAS", default="default")
+# Must outlive one computation (the upstream deadline plus the model run)
+SINGLEFLIGHT_LOCK_SECONDS = config("SINGLEFLIGHT_LOCK_SECONDS", default=60.0, cast=float)
+SINGLEFLIGHT_POLL_SECONDS = config("SINGLEFLIGHT_POLL_SECONDS", default=0.1, cast=float)
+# How long a published result stays readable for waiting workers
+SINGLEFLIGHT_RESULT_SECONDS = config("SINGLEFLIGHT_RESULT_SECONDS", default=30.0, cast=float)
+
+
+class SingleFlight:
+    def __init__(self, namespace: str, cache_alias: str = SINGLEFLIGHT_CACHE_ALIAS,
+                 lock_seconds: float = SINGLEFLIGHT_LOCK_SECONDS, poll_seconds: float = SINGLEFLIGHT_POLL_SECONDS,
+                 result_seconds: float = SINGLEFLIGHT_RESULT_SECONDS, enabled: bool = SINGLEFLIGHT_ENABLED,
+                 share=None):
+        self.namespace = namespace
+        # What waiting workers receive through the cache (keep it small: it is pickled)
+        self.share = share or (lambda result: result)
+        self.cache_alias = cache_alias
+        self.lock_seconds = lock_seconds
+        self.poll_seconds = poll_seconds
+        self.result_seconds = result_seconds
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._inflight = {}                              # key -> concurrent Future
+        self._ainflight = weakref.WeakKeyDictionary()    # event loop -> {key: Task}
+        self._counts = {"leader": 0, "coalesced_local": 0, "coalesced_remote": 0, "fallback": 0}
+
+    # --- Sync ---
+
+    def do(self, key: str, fn):
+        """Return fn() for `key`, sharing one in-flight call between concurrent callers."""
+        if not self.enabled:
+            return fn()
+
+        with self._lock:
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = self._inflight[key] = Future()
+        if not leader:
+            self._count("coalesced_local")
+            return future.result(timeout=self.lock_seconds)
+
+        try:
+            result = self._run_leader(key, fn)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def _run_leader(self, key: str, fn):
+        cache = self._cache()
+        if cache is None:
+            self._count("leader")
+            return fn()
+
+        lock_key, wait_key, result_key = self._keys(key)
+        if cache.add(lock_key, 1, timeout=self.lock_seconds):
+            started = time.monotonic()
+            try:
+                self._count("leader")
+                result = fn()
+                if cache.get(wait_key):
+                    cache.set(result_key, self.share(result), timeout=self.result_seconds)
+                return result
+            finally:
+                # Past lock_seconds the lock may have expired and been taken by another worker
+                if time.monotonic() - started < self.lock_seconds:
+                    cache.delete(lock_key)
+
+        # Another worker holds the lock: tell it to publish, then wait for its result
+        cache.set(wait_key, 1, timeout=self.lock_seconds)
+        deadline = time.monotonic() + self.lock_seconds
+        while time.monotonic() < deadline:
+            time.sleep(self.poll_seconds)
+            result = cache.get(result_key)
+            if result is not None:
+                self._count("coalesced_remote")
+                return result
+            if cache.get(lock_key) is None:
+                break  # lock holder failed without publishing
+        self._count("fallback")
+        return fn()
+
+    # --- Async ---
+
+    async def ado(self, key: str, afn):
+        """Async `do`: ``afn()`` returns an awaitable. A cancelled caller does not cancel the shared run."""
+        if not self.enabled:
+            return await afn()
+
+        with self._lock:
+            tasks = self._ainflight.setdefault(asyncio.get_running_loop(), {})
+        task = tasks.get(key)
+        if task is None:
+            task = tasks[key] = asyncio.ensure_future(self._arun_leader(key, afn))
+            task.add_done_callback(lambda _: tasks.pop(key, None))
+        else:
+            self._count("coalesced_local")
+        return await asyncio.shield(task)
+
+    async def _arun_leader(self, key: str, afn):
+        cache = self._cache()
+        if cache is None:
+            self._count("leader")
+            return await afn()
+
+        lock_key, wait_key, result_key = self._keys(key)
+        if await cache.aadd(lock_key, 1, timeout=self.lock_seconds):
+            started = time.monotonic()
+            try:
+                self._count("leader")
+                result = await afn()
+                if await cache.aget(wait_key):
+                    await cache.aset(result_key, self.share(result), timeout=self.result_seconds)
+                return result
+            finally:
+                if time.monotonic() - started < self.lock_seconds:
+                    await cache.adelete(lock_key)
+
+        await cache.aset(wait_key, 1, timeout=self.lock_seconds)
+        deadline = time.monotonic() + self.lock_seconds
+        while time.monotonic() < deadline:
+            await asyncio.sleep(self.poll_seconds)
+            result = await cache.aget(result_key)
+            if result is not None:
+                self._count("coalesced_remote")
+                return result
+            if await cache.aget(lock_key) is None:
+                break
+        self._count("fallback")
+        return await afn()
+
+    # --- Helpers ---
+
+    def _cache(self):
+        if not self.cache_alias:
+            return None
+        from django.core.cache import caches
+        return caches[self.cache_alias]
+
+    def _keys(self, key: str):
+        prefix = f"singleflight:{self.namespace}"
+        return f"{prefix}:lock:{key}", f"{prefix}:wait:{key}", f"{prefix}:result:{key}"
+
+    def _count(self, name: str):
+        with self._lock:
+            self._counts[name] += 1
+        if name.startswith("coalesced"):
+            logger.debug("singleflight %s: %s hit", self.namespace, name)
+
+    def stats(self) -> dict:
+        """leader = computations run; coalesced_* = callers served by someone else's run."""
+        with self._lock:
+            counts = dict(self._counts)
+            counts["inflight"] = len(self._inflight)
+        counts["coalesced"] = counts["coalesced_local"] + counts["coalesced_remote"]
+        return counts
@@ -1,49 +1,81 @@
-import requests
 import pandas as pd
-import pvlib
-from timezonefinder import TimezoneFinder
+from .forecast_cache import forecast_cache
+from . import upstream
+from .geometry import zenith_for
+from .telemetry import stage
+from .timezones import timezone_at
 
-# Initialize TimezoneFinder once
-tf = TimezoneFinder()
+OPEN_METEO_FORECAST_URL = f"{upstream.OPEN_METEO_BASE_URL}/v1/forecast"
 
-def compute_solar_features(df_weather: pd.DataFrame, lat: float, lon: float) -> pd.DataFrame:
-    """
-    Fetches 3-day solar forecast from Open-Meteo and calculates Solar Zenith locally.
-    Returns GHI, DNI, DHI, and solar_zenith aligned with df_weather.
-    """
-    
-    # 1. Get the Timezone String (e.g., "America/Chicago")
-    timezone_str = tf.timezone_at(lng=lon, lat=lat)
-    if not timezone_str:
-        timezone_str = "UTC"
-
-    # 2. Open-Meteo API Call (ONLY for radiation, NO zenith to avoid 400 error)
-    url = "https://api.open-meteo.com/v1/forecast"
-    params = {
+def _radiation_params(lat: float, lon: float, timezone_str: str) -> dict:
+    # ONLY radiation, NO zenith to avoid 400 error
+    return {
         "latitude": lat,
         "longitude": lon,
         "hourly": "shortwave_radiation,direct_normal_irradiance,diffuse_radiation",
         "forecast_days": 5,
         "timezone": timezone_str
     }
-    
-    try:
-        response = requests.get(url, params=params, timeout=30)
-        response.raise_for_status()
-        data = response.json()['hourly']
-    except Exception as e:
-        print(f"Error fetching solar forecast: {e}")
-        return pd.DataFrame()
 
-    # 3. Create DataFrame
+def fetch_radiation_payload(lat: float, lon: float, timezone_str: str, timeout: float = None) -> dict:
+    """Hourly GHI/DNI/DHI block of the Open-Meteo forecast, in `timezone_str` local time."""
+    params = _radiation_params(lat, lon, timezone_str)
+    return upstream.get_json("open_meteo_forecast", OPEN_METEO_FORECAST_URL, params=params, timeout=timeout)['hourly']
+
+async def afetch_radiation_payload(lat: float, lon: float, timezone_str: str, timeout: float = None) -> dict:
+    """Async fetch_radiation_payload (httpx, for the async prediction path)."""
+    params = _radiation_params(lat, lon, timezone_str)
+    data = await upstream.aget_json("open_meteo_forecast", OPEN_METEO_FORECAST_URL, params=params, timeout=timeout)
+    return data['hourly']
+
+def radiation_frame(data: dict) -> pd.DataFrame:
+    """Open-Meteo `hourly` block -> DataFrame (timestamp, ghi, dni, dhi)."""
     # Convert API time strings to datetime objects
-    forecast_df = pd.DataFrame({
+    return pd.DataFrame({
         "timestamp": pd.to_datetime(data['time']),
         "ghi": data['shortwave_radiation'],
         "dni": data['direct_normal_irradiance'],
         "dhi": data['diffuse_radiation']
     })
 
+def fetch_solar_forecast(lat: float, lon: float, timeout: float = None, timezone_str: str = None) -> pd.DataFrame:
+    """
+    Fetches the 5-day radiation forecast from Open-Meteo (no dependency on the
+    weather data, so it can run concurrently with the OpenWeather call).
+    Returns an empty DataFrame if the provider is unavailable.
+    """
+    # 1. Get the Timezone String (e.g., "America/Chicago"), unless the caller has it stored
+    timezone_str = timezone_str or timezone_at(lat, lon)
+
+    # 2. Open-Meteo radiation (shared per grid cell + timezone until the next model run)
+    try:
+        with stage("fetch_open_meteo"):
+            data = forecast_cache.get_or_fetch(
+                "open_meteo", lat, lon,
+                lambda cell_lat, cell_lon: fetch_radiation_payload(cell_lat, cell_lon, timezone_str, timeout),
+                extra=timezone_str,
+            )
+    except Exception as e:
+        print(f"Error fetching solar forecast: {e}")
+        return pd.DataFrame()
+
+    # 3. Create DataFrame
+    with stage("parse_open_meteo"):
+        return radiation_frame(data)
+
+def compute_solar_features(df_weather: pd.DataFrame, lat: float, lon: float, forecast_df: pd.DataFrame = None, timezone_str: str = None) -> pd.DataFrame:
+    """
+    Aligns the Open-Meteo radiation forecast with df_weather and calculates Solar Zenith locally.
+    Returns GHI, DNI, DHI, and solar_zenith aligned with df_weather.
+    Pass `forecast_df` (from fetch_solar_forecast) when it was already fetched.
+    """
+    timezone_str = timezone_str or timezone_at(lat, lon)
+    if forecast_df is None:
+        forecast_df = fetch_solar_forecast(lat, lon, timezone_str=timezone_str)
+    if forecast_df.empty:
+        return pd.DataFrame()
+    forecast_df = forecast_df.copy()
+
     # 4. Filter to match your Weather Data (Tomorrow/Overmorrow)
     # Ensure both are 'naive' and floored to hour for perfect merging
     df_weather['timestamp'] = pd.to_datetime(df_weather['timestamp']).dt.tz_localize(None).dt.floor('h')
@@ -55,16 +87,7 @@ def compute_solar_features(df_weather: pd.DataFrame, lat: float, lon: float) ->
     # 5. Calculate Solar Zenith LOCALLY (The Fix)
     # We use the final timestamps and the location to calculate the sun's angle
     # This keeps your ML model happy without relying on the API
-    location = pvlib.location.Location(latitude=lat, longitude=lon, tz=timezone_str)
-    
-    # pvlib needs the timestamps to be localized to the specific timezone to calculate zenith correctly
-    times_for_zenith = pd.DatetimeIndex(final_df['timestamp']).tz_localize(
-        timezone_str,
-        nonexistent="shift_forward"
-    )
-
-    solar_position = location.get_solarposition(times_for_zenith)
-    final_df['solar_zenith'] = solar_position['zenith'].values    
-
+    # Zenith only depends on site + local hour, so it comes from the geometry cache
+    final_df['solar_zenith'] = zenith_for(final_df['timestamp'], lat, lon, timezone_str)
 
     return final_df
\ No newline at end of file
@@ -0,0 +1,373 @@
+# ml/telemetry.py
+"""
+Low-overhead counters and histograms, aggregated across workers and
+rendered as Prometheus text for the /metrics view.
+
+Recording is in-process (a lock and a few additions). Each worker also
+writes its values to METRICS_DIR/worker-<pid>.json at most every
+METRICS_FLUSH_SECONDS (and at exit), and the /metrics view sums every
+worker's file. Files of workers that have exited are folded into
+archive.json, so counters never go backwards when gunicorn recycles a
+worker. METRICS_DIR defaults to a directory in the host's temp dir, shared
+by every worker on the host; set it empty to report the serving process
+only.
+
+Cache, single-flight, upstream-connection and model stats the ML modules
+already keep are read at flush time, from modules that are already imported
+(scraping never loads the ML stack).
+"""
+import atexit
+import json
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+from bisect import bisect_left
+from pathlib import Path
+
+from decouple import config
+
+logger = logging.getLogger(__name__)
+
+# Directory shared by every worker on the host; empty = this process only
+METRICS_DIR = config("METRICS_DIR", default=os.path.join(tempfile.gettempdir(), "solar-metrics"))
+METRICS_FLUSH_SECONDS = config("METRICS_FLUSH_SECONDS", default=5.0, cast=float)
+
+PREFIX = "solar_"
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, registry, name: str, help: str, labelnames=()):
+        self.registry = registry
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+
+    def reset(self):
+        self.values = {}
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, *labels, amount: float = 1.0):
+        with self.registry.lock:
+            self.values[labels] = self.values.get(labels, 0.0) + amount
+        self.registry.maybe_flush()
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, registry, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(registry, name, help, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, *labels):
+        # Per label set: [count per bucket (last = +Inf)..., sum, count]
+        i = bisect_left(self.buckets, value)
+        with self.registry.lock:
+            row = self.values.get(labels)
+            if row is None:
+                row = self.values[labels] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+            row[i] += 1
+            row[-2] += value
+            row[-1] += 1
+        self.registry.maybe_flush()
+
+    def time(self, *labels):
+        """`with histogram.time("label"):` observes the block's wall time."""
+        return _Timer(self, labels)
+
+
+class _Timer:
+    __slots__ = ("histogram", "labels", "start")
+
+    def __init__(self, histogram, labels):
+        self.histogram, self.labels = histogram, labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start, *self.labels)
+
+
+class Registry:
+    def __init__(self, directory: str = METRICS_DIR, flush_seconds: float = METRICS_FLUSH_SECONDS):
+        self.directory = Path(directory) if directory else None
+        self.flush_seconds = flush_seconds
+        self.lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._next_flush = 0.0
+        self.metrics = {}
+        self.collectors = []
+        os.register_at_fork(after_in_child=self._after_fork)
+        atexit.register(self.flush)
+
+    def counter(self, name, help, labelnames=()):
+        return self._add(Counter(self, PREFIX + name, help, labelnames))
+
+    def histogram(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._add(Histogram(self, PREFIX + name, help, labelnames, buckets))
+
+    def _add(self, metric):
+        self.metrics[metric.name] = metric
+        return metric
+
+    def register_collector(self, fn):
+        """`fn()` yields (name, kind, help, {label: value}, value) samples at snapshot time."""
+        self.collectors.append(fn)
+        return fn
+
+    def _after_fork(self):
+        # A forked worker starts from zero; the parent's values are the parent's
+        self.lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._next_flush = 0.0
+        for metric in self.metrics.values():
+            metric.reset()
+
+    # --- Snapshots ---
+
+    def snapshot(self) -> dict:
+        """This process's values: {name: {kind, help, labelnames, buckets?, samples: [[labels, value]]}}."""
+        out = {}
+        with self.lock:
+            for metric in self.metrics.values():
+                entry = out[metric.name] = {"kind": metric.kind, "help": metric.help,
+                                            "labelnames": list(metric.labelnames),
+                                            "samples": [[list(k), list(v) if isinstance(v, list) else v]
+                                                        for k, v in metric.values.items()]}
+                if metric.kind == "histogram":
+                    entry["buckets"] = list(metric.buckets)
+        for collector in self.collectors:
+            try:
+                samples = list(collector())
+            except Exception as e:
+                logger.warning(f"Metrics collector {collector.__name__} failed: {e}")
+                continue
+            for name, kind, help, labels, value in samples:
+                entry = out.setdefault(PREFIX + name, {"kind": kind, "help": help,
+                                                       "labelnames": list(labels), "samples": []})
+                entry["samples"].append([[str(labels[k]) for k in entry["labelnames"]], value])
+        return out
+
+    def maybe_flush(self):
+        if self.directory is not None and time.monotonic() >= self._next_flush:
+            self.flush()
+
+    def flush(self):
+        """Write this process's snapshot to its worker file (no-op without METRICS_DIR)."""
+        if self.directory is None or not self._flush_lock.acquire(blocking=False):
+            return
+        try:
+            self._next_flush = time.monotonic() + self.flush_seconds
+            payload = {"pid": os.getpid(), "written": time.time(), "metrics": self.snapshot()}
+            self.directory.mkdir(parents=True, exist_ok=True)
+            path = self.directory / f"worker-{os.getpid()}.json"
+            tmp = path.with_suffix(".tmp")
+            tmp.write_text(json.dumps(payload, separators=(",", ":")))
+            os.replace(tmp, path)
+        except OSError as e:
+            logger.warning(f"Metrics flush failed: {e}")
+        finally:
+            self._flush_lock.release()
+
+    # --- Aggregation ---
+
+    def collect(self) -> dict:
+        """Every worker's values merged (this process only without METRICS_DIR)."""
+        if self.directory is None:
+            return self.snapshot()
+        self.flush()
+        import fcntl
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+        with open(self.directory / ".lock", "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            archive_path = self.directory / "archive.json"
+            archive = _read(archive_path) or {"metrics": {}}
+            live, dead = [], []
+            for path in self.directory.glob("worker-*.json"):
+                snapshot = _read(path)
+                if snapshot is None:
+                    continue
+                (live if _alive(snapshot["pid"]) else dead).append((path, snapshot))
+            if dead:
+                # Keep the last values of exited workers; their gauges die with them
+                for _, snapshot in dead:
+                    archive["metrics"] = merge([archive["metrics"], snapshot["metrics"]], gauges=False)
+                tmp = archive_path.with_suffix(".tmp")
+                tmp.write_text(json.dumps(archive, separators=(",", ":")))
+                os.replace(tmp, archive_path)
+                for path, _ in dead:
+                    path.unlink(missing_ok=True)
+        return merge([archive["metrics"]] + [snapshot["metrics"] for _, snapshot in live])
+
+
+def _read(path: Path):
+    try:
+        return json.loads(path.read_text())
+    except (OSError, ValueError):
+        return None
+
+
+def _alive(pid: int) -> bool:
+    if pid == os.getpid():
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def merge(snapshots, gauges: bool = True) -> dict:
+    """Sum counters and histograms across snapshots; gauges take the max (dropped with gauges=False)."""
+    merged = {}
+    for snapshot in snapshots:
+        for name, entry in snapshot.items():
+            if entry["kind"] == "gauge" and not gauges:
+                continue
+            target = merged.setdefault(name, {**entry, "samples": {}})
+            if entry.get("buckets") != target.get("buckets"):
+                logger.warning(f"Metric {name}: bucket layout changed, skipping a worker's samples")
+                continue
+            samples = target["samples"]
+            for labels, value in entry["samples"]:
+                labels = tuple(labels)
+                current = samples.get(labels)
+                if current is None:
+                    samples[labels] = list(value) if isinstance(value, list) else value
+                elif entry["kind"] == "histogram":
+                    samples[labels] = [a + b for a, b in zip(current, value)]
+                elif entry["kind"] == "gauge":
+                    samples[labels] = max(current, value)
+                else:
+                    samples[labels] = current + value
+    for entry in merged.values():
+        entry["samples"] = [[list(k), v] for k, v in entry["samples"].items()]
+    return merged
+
+
+# --- Prometheus text format ---
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _number(value) -> str:
+    value = float(value)
+    return str(int(value)) if value.is_integer() and abs(value) < 1e15 else repr(value)
+
+
+def render(metrics: dict) -> str:
+    lines = []
+    for name in sorted(metrics):
+        entry = metrics[name]
+        lines.append(f"# HELP {name} {entry['help']}")
+        lines.append(f"# TYPE {name} {entry['kind']}")
+        names = entry["labelnames"]
+        for labels, value in sorted(entry["samples"], key=lambda s: s[0]):
+            if entry["kind"] != "histogram":
+                lines.append(f"{name}{_labels(names, labels)} {_number(value)}")
+                continue
+            cumulative = 0
+            for bound, count in zip(list(entry["buckets"]) + ["+Inf"], value[:-2]):
+                cumulative += count
+                le = 'le="+Inf"' if bound == "+Inf" else f'le="{_number(bound)}"'
+                lines.append(f"{name}_bucket{_labels(names, labels, le)} {cumulative}")
+            lines.append(f"{name}_sum{_labels(names, labels)} {_number(value[-2])}")
+            lines.append(f"{name}_count{_labels(names, labels)} {_number(value[-1])}")
+    return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+# --- Request-path metrics ---
+
+STAGE_SECONDS = registry.histogram("stage_seconds", "Wall time of each prediction pipeline stage.", ["stage"])
+UPSTREAM_SECONDS = registry.histogram("upstream_request_seconds", "Upstream HTTP attempts by endpoint.", ["endpoint"])
+UPSTREAM_ERRORS = registry.counter("upstream_errors_total", "Failed upstream attempts by endpoint and reason (HTTP status or exception).", ["endpoint", "reason"])
+UPSTREAM_RETRIES = registry.counter("upstream_retries_total", "Upstream attempts retried after an error.", ["endpoint"])
+ROWS_SCORED = registry.counter("rows_scored_total", "Hourly rows passed through the model.")
+REQUEST_SECONDS = registry.histogram("request_seconds", "Django request wall time by route and status class.", ["view", "status"])
+PREDICTION_ERRORS = registry.counter("prediction_errors_total", "run_prediction requests that failed, by exception type.", ["error"])
+
+
+def stage(name: str):
+    """`with stage("merge"):` times one pipeline stage into solar_stage_seconds."""
+    return STAGE_SECONDS.time(name)
+
+
+# --- Stats the ML modules already keep ---
+
+def _loaded(module: str):
+    return sys.modules.get(f"forecasting.ml.{module}")
+
+
+@registry.register_collector
+def _ml_stats():
+    forecast_cache = _loaded("forecast_cache")
+    if forecast_cache is not None:
+        stats = forecast_cache.forecast_cache.stats()
+        for outcome in ("hits", "misses"):
+            for provider, n in stats[outcome].items():
+                yield (f"forecast_cache_{outcome}_total", "counter", f"Upstream payload cache {outcome} by provider.",
+                       {"provider": provider}, n)
+
+    geometry = _loaded("geometry")
+    if geometry is not None:
+        stats = geometry.geometry_cache.stats()
+        yield "geometry_cache_hits_total", "counter", "Solar zenith days served from the geometry cache.", {}, stats["hits"]
+        yield "geometry_cache_misses_total", "counter", "Solar zenith days missing from the geometry cache.", {}, stats["misses"]
+        yield "geometry_days_computed_total", "counter", "Solar zenith days computed with pvlib.", {}, stats["computed_days"]
+
+    timezones = _loaded("timezones")
+    if timezones is not None:
+        info = timezones.cache_info()["timezone"]
+        yield "timezone_cache_hits_total", "counter", "Memoized coordinate -> timezone lookups.", {}, info["hits"]
+        yield "timezone_cache_misses_total", "counter", "Point-in-polygon timezone lookups.", {}, info["misses"]
+
+    predict = _loaded("predict")
+    if predict is not None:
+        stats = predict.forecast_flight.stats()
+        for outcome in ("leader", "coalesced_local", "coalesced_remote", "fallback"):
+            yield ("singleflight_total", "counter", "Forecast computations run (leader) or shared with concurrent callers.",
+                   {"outcome": outcome}, stats.get(outcome, 0))
+
+    upstream = _loaded("upstream")
+    if upstream is not None:
+        for host, stats in upstream.client.stats().items():
+            yield ("upstream_connections_opened_total", "counter", "New upstream TCP connections (the rest reuse keep-alive).",
+                   {"host": host}, stats["connections_opened"])
+
+    registry_module = _loaded("registry")
+    if registry_module is not None:
+        stats = registry_module.registry.stats()
+        yield "model_reloads_total", "counter", "Model hot reloads.", {}, stats["reload_count"]
+        if stats["loaded"]:
+            yield "model_info", "gauge", "Loaded model version.", {"version": stats["version"]}, 1
+
+    inference = _loaded("inference")
+    if inference is not None:
+        yield ("inference_info", "gauge", "Configured inference backend and LightGBM threads per request.",
+               {"backend": inference.INFERENCE_BACKEND, "num_threads": inference.INFERENCE_NUM_THREADS}, 1)
@@ -0,0 +1,52 @@
+# ml/timezones.py
+"""
+Single place for coordinate -> timezone resolution.
+
+One lazily created TimezoneFinder per process, a bounded memo of lookups and
+a memo of pvlib Locations. SolarSystem.timezone persists the resolved zone so
+the request path normally skips the point-in-polygon query entirely.
+"""
+import threading
+from functools import lru_cache
+
+from decouple import config
+
+from .telemetry import stage
+
+TIMEZONE_CACHE_SIZE = config("TIMEZONE_CACHE_SIZE", default=4096, cast=int)
+# ~11 m; two systems this close can never straddle a real timezone border in practice
+COORD_DECIMALS = 4
+
+_finder = None
+_finder_lock = threading.Lock()
+
+
+def get_finder():
+    global _finder
+    if _finder is None:
+        with _finder_lock:
+            if _finder is None:
+                from timezonefinder import TimezoneFinder
+                _finder = TimezoneFinder()
+    return _finder
+
+
+@lru_cache(maxsize=TIMEZONE_CACHE_SIZE)
+def _timezone_at(lat: float, lon: float) -> str:
+    with stage("timezone_lookup"):
+        return get_finder().timezone_at(lng=lon, lat=lat) or "UTC"
+
+
+def timezone_at(lat: float, lon: float) -> str:
+    """IANA zone for the coordinates, "UTC" when the point is outside every zone."""
+    return _timezone_at(round(float(lat), COORD_DECIMALS), round(float(lon), COORD_DECIMALS))
+
+
+@lru_cache(maxsize=TIMEZONE_CACHE_SIZE)
+def get_location(lat: float, lon: float, timezone_str: str):
+    import pvlib
+    return pvlib.location.Location(latitude=lat, longitude=lon, tz=timezone_str)
+
+
+def cache_info() -> dict:
+    return {"timezone": _timezone_at.cache_info()._asdict(), "location": get_location.cache_info()._asdict()}
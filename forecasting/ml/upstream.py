@@ -0,0 +1,342 @@
+# ml/upstream.py
+"""
+Shared HTTP client for every upstream call (OpenWeather, Open-Meteo, geocoding).
+
+One keep-alive ``requests.Session`` per host and per process, with bounded
+retries, jittered backoff and per-endpoint timeouts. The async prediction
+path uses ``aget_json``: same rules over one ``httpx.AsyncClient`` per host
+and per event loop. That pools connections only on a long-lived loop (an
+ASGI worker); code running on a short-lived loop (async_to_sync under WSGI)
+should use get_json, or call aclose() before its loop ends.
+"""
+import asyncio
+import logging
+import os
+import random
+import threading
+import time
+import weakref
+from collections import deque
+from dataclasses import dataclass
+from urllib.parse import urlsplit
+
+import requests
+from decouple import config
+from requests.adapters import HTTPAdapter
+
+from .telemetry import UPSTREAM_ERRORS, UPSTREAM_RETRIES, UPSTREAM_SECONDS
+
+logger = logging.getLogger(__name__)
+
+UPSTREAM_POOL_MAXSIZE = config("UPSTREAM_POOL_MAXSIZE", default=16, cast=int)
+UPSTREAM_BACKOFF_BASE = config("UPSTREAM_BACKOFF_BASE", default=0.25, cast=float)
+UPSTREAM_BACKOFF_CAP = config("UPSTREAM_BACKOFF_CAP", default=4.0, cast=float)
+# Open sockets per host for the async client; in-flight requests beyond this wait for a free one
+UPSTREAM_ASYNC_MAX_CONNECTIONS = config("UPSTREAM_ASYNC_MAX_CONNECTIONS", default=100, cast=int)
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# Provider base URLs; point both at a stand-in (benchmarks.upstream_server) for load tests
+OPENWEATHER_BASE_URL = config("OPENWEATHER_BASE_URL", default="https://api.openweathermap.org").rstrip("/")
+OPEN_METEO_BASE_URL = config("OPEN_METEO_BASE_URL", default="https://api.open-meteo.com").rstrip("/")
+
+OPENWEATHER_GEOCODE_URL = f"{OPENWEATHER_BASE_URL}/geo/1.0/reverse"
+
+
+@dataclass(frozen=True)
+class Endpoint:
+    connect_timeout: float
+    read_timeout: float
+    retries: int
+
+
+ENDPOINTS = {
+    "openweather_forecast": Endpoint(connect_timeout=3.05, read_timeout=30, retries=2),
+    "openweather_geocode": Endpoint(connect_timeout=3.05, read_timeout=5, retries=1),
+    "open_meteo_forecast": Endpoint(connect_timeout=3.05, read_timeout=30, retries=2),
+}
+
+
+class HostStats:
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.retries = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+        self.recent = deque(maxlen=512)
+
+    def record(self, seconds: float, ok: bool):
+        self.requests += 1
+        self.errors += 0 if ok else 1
+        self.latency_total += seconds
+        self.latency_max = max(self.latency_max, seconds)
+        self.recent.append(seconds)
+
+
+class UpstreamClient:
+    def __init__(self, pool_maxsize: int = UPSTREAM_POOL_MAXSIZE):
+        self.pool_maxsize = pool_maxsize
+        self._lock = threading.Lock()
+        self._sessions = {}
+        # event loop -> {host: httpx.AsyncClient}; an AsyncClient is bound to the loop it was used on
+        self._async_clients = weakref.WeakKeyDictionary()
+        # host -> httpx transport used instead of the network (see mount_async)
+        self._async_transports = {}
+        self._pid = os.getpid()
+        self._stats = {}
+
+    # --- Sessions ---
+
+    def _check_fork(self):
+        # Never share sockets with the parent after a fork. Caller holds the lock.
+        if self._pid != os.getpid():
+            self._sessions, self._stats, self._pid = {}, {}, os.getpid()
+            self._async_clients = weakref.WeakKeyDictionary()
+
+    def _session_for(self, url: str):
+        host = _host(url)
+        with self._lock:
+            self._check_fork()
+            session = self._sessions.get(host)
+            if session is None:
+                session = requests.Session()
+                # Retries are handled in get_json so they can respect the deadline.
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_maxsize, max_retries=0)
+                session.mount(host, adapter)
+                session.headers.update({
+                    "Accept-Encoding": "gzip, deflate",
+                    "Connection": "keep-alive",
+                    "User-Agent": "SolarDrishti/1.0",
+                })
+                self._sessions[host] = session
+                self._stats.setdefault(host, HostStats())
+            return session, self._stats[host]
+
+    def _async_client_for(self, url: str):
+        import httpx  # only the async path needs it
+
+        host = _host(url)
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            self._check_fork()
+            self._drop_closed_loops()
+            clients = self._async_clients.setdefault(loop, {})
+            client = clients.get(host)
+            if client is None:
+                client = httpx.AsyncClient(
+                    transport=self._async_transports.get(host),
+                    limits=httpx.Limits(max_connections=UPSTREAM_ASYNC_MAX_CONNECTIONS,
+                                        max_keepalive_connections=self.pool_maxsize),
+                    headers={"Accept-Encoding": "gzip, deflate", "User-Agent": "SolarDrishti/1.0"},
+                )
+                clients[host] = client
+                self._stats.setdefault(host, HostStats())
+            return client, self._stats[host]
+
+    def _drop_closed_loops(self):
+        # Clients reference their loop through open connections, so a closed loop's entry is never
+        # collected on its own. Caller holds the lock.
+        for loop in [loop for loop in self._async_clients if loop.is_closed()]:
+            del self._async_clients[loop]
+
+    def mount(self, prefix: str, adapter):
+        """Route a URL prefix through a custom transport adapter (used for replay/fakes)."""
+        self._session_for(prefix)[0].mount(prefix, adapter)
+
+    def mount_async(self, prefix: str, transport):
+        """
+        Async twin of mount: every request to the prefix's host goes through an
+        httpx transport. Mount before the async path first runs: clients already
+        built for the host keep their transport and cannot be closed from here,
+        so a host with clients on an open loop raises RuntimeError (aclose()
+        them on their loop first).
+        """
+        host = _host(prefix)
+        with self._lock:
+            self._check_fork()
+            self._drop_closed_loops()
+            if any(host in clients for clients in self._async_clients.values()):
+                raise RuntimeError(f"{host} already has open async clients; aclose() them before mount_async")
+            self._async_transports[host] = transport
+
+    # --- Requests ---
+
+    def get_json(self, endpoint: str, url: str, params: dict = None, timeout: float = None):
+        """
+        GET `url` and return the decoded JSON body.
+
+        `timeout` caps the total time budget (e.g. the caller's deadline); the
+        endpoint's connect/read timeouts are shrunk to fit what is left of it.
+        Connection errors and 429/5xx responses are retried up to the
+        endpoint's limit; anything else raises immediately.
+        """
+        spec = ENDPOINTS[endpoint]
+        session, host_stats = self._session_for(url)
+        budget = timeout if timeout is not None else spec.connect_timeout + spec.read_timeout * (spec.retries + 1)
+        started = time.monotonic()
+
+        attempt = 0
+        while True:
+            remaining = budget - (time.monotonic() - started)
+            if remaining <= 0:
+                raise requests.Timeout(f"{endpoint}: deadline of {budget:.1f}s exhausted")
+            call_timeout = (min(spec.connect_timeout, remaining), min(spec.read_timeout, remaining))
+
+            t0 = time.perf_counter()
+            try:
+                resp = session.get(url, params=params, timeout=call_timeout)
+            except requests.RequestException as e:
+                self._record(endpoint, host_stats, time.perf_counter() - t0, error=type(e).__name__)
+                # A read timeout already spent the budget; only connection failures are retried
+                if not isinstance(e, requests.ConnectionError):
+                    raise
+                error, retry_after = e, None
+            else:
+                ok = resp.status_code < 400
+                self._record(endpoint, host_stats, time.perf_counter() - t0, error=None if ok else str(resp.status_code))
+                if ok:
+                    return resp.json()
+                if resp.status_code not in RETRY_STATUSES:
+                    resp.raise_for_status()
+                error = requests.HTTPError(f"{resp.status_code} from {endpoint}", response=resp)
+                retry_after = _retry_after_seconds(resp)
+
+            if attempt >= spec.retries:
+                raise error
+            attempt += 1
+            delay = _backoff_delay(attempt, retry_after)
+            if time.monotonic() - started + delay >= budget:
+                raise error
+            with self._lock:
+                host_stats.retries += 1
+            UPSTREAM_RETRIES.inc(endpoint)
+            logger.warning(f"Retrying {endpoint} in {delay:.2f}s (attempt {attempt}/{spec.retries}): {error}")
+            time.sleep(delay)
+
+    async def aget_json(self, endpoint: str, url: str, params: dict = None, timeout: float = None):
+        """
+        Async get_json over httpx, with the same budget, retry and backoff
+        rules. Waiting on the network never holds a thread.
+        """
+        import httpx
+
+        spec = ENDPOINTS[endpoint]
+        client, host_stats = self._async_client_for(url)
+        budget = timeout if timeout is not None else spec.connect_timeout + spec.read_timeout * (spec.retries + 1)
+        started = time.monotonic()
+
+        attempt = 0
+        while True:
+            remaining = budget - (time.monotonic() - started)
+            if remaining <= 0:
+                raise TimeoutError(f"{endpoint}: deadline of {budget:.1f}s exhausted")
+            call_timeout = httpx.Timeout(min(spec.read_timeout, remaining), connect=min(spec.connect_timeout, remaining))
+
+            t0 = time.perf_counter()
+            try:
+                resp = await client.get(url, params=params, timeout=call_timeout)
+            except httpx.TransportError as e:
+                self._record(endpoint, host_stats, time.perf_counter() - t0, error=type(e).__name__)
+                if not isinstance(e, (httpx.ConnectError, httpx.ConnectTimeout)):
+                    raise
+                error, retry_after = e, None
+            else:
+                ok = resp.status_code < 400
+                self._record(endpoint, host_stats, time.perf_counter() - t0, error=None if ok else str(resp.status_code))
+                if ok:
+                    return resp.json()
+                if resp.status_code not in RETRY_STATUSES:
+                    resp.raise_for_status()
+                error = httpx.HTTPStatusError(f"{resp.status_code} from {endpoint}", request=resp.request, response=resp)
+                retry_after = _retry_after_seconds(resp)
+
+            if attempt >= spec.retries:
+                raise error
+            attempt += 1
+            delay = _backoff_delay(attempt, retry_after)
+            if time.monotonic() - started + delay >= budget:
+                raise error
+            with self._lock:
+                host_stats.retries += 1
+            UPSTREAM_RETRIES.inc(endpoint)
+            logger.warning(f"Retrying {endpoint} in {delay:.2f}s (attempt {attempt}/{spec.retries}): {error}")
+            await asyncio.sleep(delay)
+
+    async def aclose(self):
+        """Close the async clients bound to the running event loop."""
+        with self._lock:
+            clients = self._async_clients.pop(asyncio.get_running_loop(), {})
+        for client in clients.values():
+            await client.aclose()
+
+    def _record(self, endpoint: str, host_stats: HostStats, seconds: float, error: str = None):
+        """`error` is the HTTP status or exception name of a failed attempt."""
+        with self._lock:
+            host_stats.record(seconds, error is None)
+        UPSTREAM_SECONDS.observe(seconds, endpoint)
+        if error is not None:
+            UPSTREAM_ERRORS.inc(endpoint, error)
+
+    # --- Reporting ---
+
+    def stats(self) -> dict:
+        """Per-host request/latency counters plus connection reuse from the urllib3 pools."""
+        report = {}
+        with self._lock:
+            for host, s in self._stats.items():
+                session = self._sessions.get(host)
+                new_connections = pool_requests = 0
+                for adapter in (session.adapters.values() if session is not None else ()):
+                    pools = getattr(adapter, "poolmanager", None)
+                    if pools is None:
+                        continue
+                    for key in list(pools.pools.keys()):
+                        pool = pools.pools.get(key)
+                        if pool is not None:
+                            new_connections += pool.num_connections
+                            pool_requests += pool.num_requests
+                recent = sorted(s.recent)
+                report[host] = {
+                    "requests": s.requests,
+                    "errors": s.errors,
+                    "retries": s.retries,
+                    "latency_mean": round(s.latency_total / s.requests, 4) if s.requests else None,
+                    "latency_p50": round(recent[len(recent) // 2], 4) if recent else None,
+                    "latency_p95": round(recent[int(len(recent) * 0.95)], 4) if recent else None,
+                    "latency_max": round(s.latency_max, 4),
+                    "connections_opened": new_connections,
+                    "connection_reuse": round(1 - new_connections / pool_requests, 3) if pool_requests else None,
+                }
+        return report
+
+
+def _host(url: str) -> str:
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}"
+
+
+def _backoff_delay(attempt: int, retry_after: float = None) -> float:
+    # Full jitter: spreads retries from many workers hitting the same outage
+    if retry_after is not None:
+        return retry_after
+    return random.uniform(0, min(UPSTREAM_BACKOFF_CAP, UPSTREAM_BACKOFF_BASE * 2 ** attempt))
+
+
+def _retry_after_seconds(resp):
+    value = resp.headers.get("Retry-After")
+    try:
+        return min(float(value), UPSTREAM_BACKOFF_CAP) if value is not None else None
+    except ValueError:
+        return None
+
+
+client = UpstreamClient()
+
+
+def get_json(endpoint: str, url: str, params: dict = None, timeout: float = None):
+    return client.get_json(endpoint, url, params=params, timeout=timeout)
+
+
+async def aget_json(endpoint: str, url: str, params: dict = None, timeout: float = None):
+    return await client.aget_json(endpoint, url, params=params, timeout=timeout)
@@ -1,64 +1,105 @@
 # ml/weather.py
-import requests
+import numpy as np
 import pandas as pd
 from decouple import config
-from timezonefinder import TimezoneFinder  # New library
-import pytz
+from .forecast_cache import forecast_cache
+from . import upstream
+from .telemetry import stage
+from .timezones import timezone_at
 
 OPENWEATHER_API_KEY = config("OPENWEATHER_API_KEY")
-OPENWEATHER_FORECAST_URL = "https://api.openweathermap.org/data/2.5/forecast"
+OPENWEATHER_FORECAST_URL = f"{upstream.OPENWEATHER_BASE_URL}/data/2.5/forecast"
 
-# Initialize once
-tf = TimezoneFinder()
+# How 3-hourly OpenWeather steps become hourly rows: "ffill", "linear" or "cubic"
+RESAMPLE_MODES = ("ffill", "linear", "cubic")
+WEATHER_RESAMPLE = config("WEATHER_RESAMPLE", default="ffill")
 
-def get_hourly_forecast(lat: float, lon: float, hours: int = 48) -> pd.DataFrame:
+def _forecast_params(lat: float, lon: float) -> dict:
+    return {
+        "lat": lat, "lon": lon,
+        "appid": OPENWEATHER_API_KEY, "units": "metric"
+    }
+
+def fetch_forecast_payload(lat: float, lon: float, timeout: float = None) -> dict:
+    """Raw OpenWeather 5 day / 3 hour forecast JSON."""
+    params = _forecast_params(lat, lon)
+    return upstream.get_json("openweather_forecast", OPENWEATHER_FORECAST_URL, params=params, timeout=timeout)
+
+async def afetch_forecast_payload(lat: float, lon: float, timeout: float = None) -> dict:
+    """Async fetch_forecast_payload (httpx, for the async prediction path)."""
+    params = _forecast_params(lat, lon)
+    return await upstream.aget_json("openweather_forecast", OPENWEATHER_FORECAST_URL, params=params, timeout=timeout)
+
+def _hourly_values(kind: str, epoch_out: np.ndarray, epoch_in: np.ndarray, values: np.ndarray, step_index: np.ndarray) -> np.ndarray:
+    """Fill the 3-hourly `values` onto the hourly output grid."""
+    if kind == "ffill":
+        return values[step_index]
+    if kind == "linear":
+        # np.interp holds the end values outside the sampled range, like ffill does
+        return np.interp(epoch_out, epoch_in, values)
+    from scipy.interpolate import CubicSpline  # pvlib already depends on scipy
+    clipped = np.clip(epoch_out, epoch_in[0], epoch_in[-1])
+    return CubicSpline(epoch_in, values)(clipped)
+
+def parse_forecast_payload(data: dict, timezone_str: str, hours: int = 48, resample: str = WEATHER_RESAMPLE) -> pd.DataFrame:
+    """
+    OpenWeather 3-hourly `list` -> HOURLY frame in the location's naive LST.
+
+    resample="ffill" repeats each 3-hour step (the original behaviour);
+    "linear" / "cubic" interpolate air_temp and wind_speed in UTC time.
+    cloud_cover is always step-filled.
+    """
+    if resample not in RESAMPLE_MODES:
+        raise ValueError(f"Unknown resample mode '{resample}'. Choose from: {', '.join(RESAMPLE_MODES)}")
+
+    entries = data["list"]
+    n = len(entries)
+    if n == 0:
+        return pd.DataFrame(columns=["timestamp", "air_temp", "wind_speed", "cloud_cover"])
+    epoch = np.fromiter((e["dt"] for e in entries), dtype=np.int64, count=n)
+    air_temp = np.fromiter((e["main"]["temp"] for e in entries), dtype=np.float64, count=n)
+    wind_speed = np.fromiter((e["wind"]["speed"] for e in entries), dtype=np.float64, count=n)
+    cloud_cover = np.fromiter((e["clouds"]["all"] for e in entries), dtype=np.float64, count=n)
+
+    # UTC -> location's wall clock -> naive LST, in one vectorized call
+    local = pd.to_datetime(epoch, unit="s", utc=True).tz_convert(timezone_str).tz_localize(None).floor("h")
+
+    # OpenWeather gives 3-hour steps. Expand each to 3 hourly rows.
+    step_index = np.repeat(np.arange(n), 3)
+    offset = np.tile(np.arange(3, dtype=np.int64), n)
+    timestamps = local.values[step_index] + (offset * 3600).astype("timedelta64[s]")
+    epoch_out = epoch[step_index] + offset * 3600
+
+    # Sort + drop duplicate wall-clock hours (DST fall-back), then keep `hours`.
+    # On a tie the real 3-hourly sample (offset 0) wins over a filled hour.
+    order = np.lexsort((offset, timestamps))
+    timestamps, step_index, epoch_out = timestamps[order], step_index[order], epoch_out[order]
+    keep = np.ones(len(timestamps), dtype=bool)
+    keep[1:] = timestamps[1:] != timestamps[:-1]
+    keep_idx = np.flatnonzero(keep)[:hours]
+
+    timestamps, step_index, epoch_out = timestamps[keep_idx], step_index[keep_idx], epoch_out[keep_idx]
+    return pd.DataFrame({
+        "timestamp": timestamps,
+        "air_temp": _hourly_values(resample, epoch_out, epoch, air_temp, step_index),
+        # a cubic spline can overshoot below zero between calm samples
+        "wind_speed": np.maximum(_hourly_values(resample, epoch_out, epoch, wind_speed, step_index), 0.0),
+        "cloud_cover": cloud_cover[step_index],
+    })
+
+def get_hourly_forecast(lat: float, lon: float, hours: int = 48, timeout: float = None, resample: str = WEATHER_RESAMPLE, timezone_str: str = None) -> pd.DataFrame:
     """
     Fetch OpenWeather forecast and return HOURLY data in the LOCATION'S LST.
     """
-    # 1. Find the local timezone string (e.g., "America/Chicago")
-    timezone_str = tf.timezone_at(lng=lon, lat=lat)
-    if not timezone_str:
-        timezone_str = "UTC" # Fallback
-    local_tz = pytz.timezone(timezone_str)
+    # 1. Find the local timezone string (e.g., "America/Chicago"), unless the caller has it stored
+    timezone_str = timezone_str or timezone_at(lat, lon)
 
-    params = {
-        "lat": lat, "lon": lon,
-        "appid": OPENWEATHER_API_KEY, "units": "metric"
-    }
+    # Shared across every system in the same grid cell until the next model run
+    with stage("fetch_openweather"):
+        data = forecast_cache.get_or_fetch(
+            "openweather", lat, lon,
+            lambda cell_lat, cell_lon: fetch_forecast_payload(cell_lat, cell_lon, timeout),
+        )
 
-    resp = requests.get(OPENWEATHER_FORECAST_URL, params=params, timeout=30)
-    resp.raise_for_status()
-    data = resp.json()
-
-    records = []
-    for entry in data["list"]:
-        # 2. Get UTC time
-        dt_utc = pd.to_datetime(entry["dt"], unit="s", utc=True)
-        
-        # 3. Convert to the specific location's time
-        dt_local = dt_utc.astimezone(local_tz)
-        
-        # 4. Remove timezone info so it matches your model's expectation of "Naive LST"
-        dt_naive = dt_local.tz_localize(None)
-
-        air_temp = entry["main"]["temp"]
-        wind_speed = entry["wind"]["speed"]
-        cloud_cover = entry["clouds"]["all"]
-
-        # OpenWeather gives 3-hour steps. We fill the gaps.
-        for h in range(3):
-            ts_final = dt_naive + pd.Timedelta(hours=h)
-            records.append({
-                "timestamp": ts_final,
-                "air_temp": air_temp,
-                "wind_speed": wind_speed,
-                "cloud_cover": cloud_cover
-            })
-
-    df = pd.DataFrame(records)
-    
-    # Clean up
-    df['timestamp'] = df['timestamp'].dt.floor('h') # Fix the 'H' warning
-    df = df.sort_values("timestamp").drop_duplicates("timestamp").head(hours).reset_index(drop=True)
-
-    return df
\ No newline at end of file
+    with stage("parse_openweather"):
+        return parse_forecast_payload(data, timezone_str, hours=hours, resample=resample)
@@ -61,6 +61,8 @@ class SolarSystem(models.Model):
     latitude = models.FloatField()
     longitude = models.FloatField()
     location_name = models.CharField(max_length=255)
+    # IANA zone resolved once in add_system, so predictions skip the lookup
+    timezone = models.CharField(max_length=64, blank=True, default="")
     class Meta:
         constraints = [
             models.UniqueConstraint(fields=['user', 'name'], name='unique_system_name_per_user')
@@ -114,6 +116,17 @@ class Prediction(models.Model):
     pred_value = models.FloatField()
     actual_value = models.FloatField(null=True, blank=True)
 
+    class Meta:
+        indexes = [
+            # History / profile / keyset pagination: a system's rows by date
+            models.Index(fields=['system', 'target_date'], name='prediction_system_date_idx'),
+            # Only rows still waiting for an actual value (a small, shrinking set)
+            models.Index(
+                fields=['system', 'created_at'], name='prediction_pending_idx',
+                condition=models.Q(actual_value__isnull=True),
+            ),
+        ]
+
     @property
     def accuracy(self):
         if self.actual_value is not None and self.actual_value > 0:
@@ -121,4 +134,50 @@ class Prediction(models.Model):
             error = abs(self.pred_value - self.actual_value)
             acc = max(0, 100 - (error / self.actual_value * 100))
             return round(acc, 2)
-        return None
\ No newline at end of file
+        return None
+
+class SystemForecast(models.Model):
+    """
+    Precomputed daily forecast for a system. Written in bulk by
+    `precompute_forecasts` and write-through by `run_prediction`; served
+    directly while fresh (see forecast_store.py).
+    """
+    system = models.ForeignKey(SolarSystem, on_delete=models.CASCADE, related_name="forecasts")
+    target_date = models.DateField()
+    # Whole-system energy in kWh (daily_energy * system_size)
+    pred_value = models.FloatField()
+    # Daytime factors shown next to the prediction
+    ghi = models.FloatField(default=0)
+    air_temp = models.FloatField(default=0)
+    wind_speed = models.FloatField(default=0)
+    computed_at = models.DateTimeField(default=timezone.now)
+    # Start of the upstream (OpenWeather) model run the forecast was built from
+    upstream_run_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['system', 'target_date'], name='unique_forecast_per_system_day')
+        ]
+
+class AccuracyRollup(models.Model):
+    """
+    Running accuracy sums for one system over one day / week / month of
+    target dates. Kept in step with Prediction.actual_value by
+    forecasting/rollups.py; `rebuild_rollups` recomputes them from scratch.
+    """
+    DAY, WEEK, MONTH = 'day', 'week', 'month'
+    PERIOD_CHOICES = [(DAY, 'Day'), (WEEK, 'Week'), (MONTH, 'Month')]
+
+    system = models.ForeignKey(SolarSystem, on_delete=models.CASCADE, related_name="rollups")
+    period = models.CharField(max_length=5, choices=PERIOD_CHOICES)
+    # First target_date of the period (the day itself, its Monday, the 1st of the month)
+    period_start = models.DateField()
+    # Over verified predictions only: sum of actual_value, sum of |pred - actual|, row count
+    actual_sum = models.FloatField(default=0)
+    abs_error_sum = models.FloatField(default=0)
+    verified_count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['system', 'period', 'period_start'], name='unique_rollup_per_system_period')
+        ]
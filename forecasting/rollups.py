@@ -0,0 +1,241 @@
+# forecasting/rollups.py
+"""
+Per-system accuracy rollups (AccuracyRollup).
+
+Every verified prediction contributes (actual, |pred - actual|, 1) to the
+day, week and month rollup of its target_date. Views that change an
+actual value call `apply_change` inside the same transaction, which moves
+the contribution with F() increments, so dashboards read a few rows per
+period instead of scanning every prediction. A period that has no row yet
+is summed from its predictions instead, so an edit never goes missing.
+`rebuild` recomputes the table from the predictions (`manage.py
+rebuild_rollups`; migration 0014 runs it once).
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import Abs, TruncMonth, TruncWeek
+
+from .models import AccuracyRollup, Prediction
+
+REBUILD_BATCH_SIZE = 5000
+# Rollup rows touched by one apply_changes() call above which it switches to bulk writes
+BULK_THRESHOLD = 50
+# Rows per UPDATE ... CASE statement in bulk writes
+UPDATE_BATCH_SIZE = 500
+
+
+def period_starts(day):
+    """[(period, period_start)] for the three rollups a target date falls in."""
+    return [
+        (AccuracyRollup.DAY, day),
+        (AccuracyRollup.WEEK, day - timedelta(days=day.weekday())),
+        (AccuracyRollup.MONTH, day.replace(day=1)),
+    ]
+
+
+def _contribution(pred_value, actual):
+    if actual is None:
+        return 0.0, 0.0, 0
+    return actual, abs(pred_value - actual), 1
+
+
+def lock_predictions(queryset):
+    """
+    Lock the predictions in `queryset` by writing to them, and return it for
+    reading. Call it first in the transaction that edits them. The no-op
+    UPDATE locks the rows on PostgreSQL and takes the database write lock on
+    SQLite, where SELECT ... FOR UPDATE is a plain read: a transaction that
+    reads first cannot upgrade to a write while another one is writing, and
+    fails with "database is locked" instead of waiting.
+    """
+    queryset.update(actual_value=F("actual_value"))
+    return queryset
+
+
+def apply_change(prediction, old_actual, new_actual):
+    """
+    Move `prediction`'s contribution from `old_actual` to `new_actual`
+    (None = not verified) in its rollups. Call it inside the transaction
+    that writes the prediction, after the write (a missing rollup row is
+    recomputed from the predictions), with the row locked by
+    `lock_predictions` so concurrent edits cannot both apply a delta from
+    the same old value.
+    """
+    apply_changes([(prediction, old_actual, new_actual)])
+
+
+def apply_changes(changes):
+    """
+    Batch form of `apply_change` for an iterable of (prediction, old_actual,
+    new_actual). Deltas are summed per rollup row first; small change sets
+    then use F() increments, larger ones (bulk imports) lock the touched rows
+    once and write them back with bulk_update / bulk_create.
+    """
+    deltas = defaultdict(lambda: [0.0, 0.0, 0])
+    for prediction, old_actual, new_actual in changes:
+        old = _contribution(prediction.pred_value, old_actual)
+        new = _contribution(prediction.pred_value, new_actual)
+        for period, start in period_starts(prediction.target_date):
+            delta = deltas[(prediction.system_id, period, start)]
+            for i in range(3):
+                delta[i] += new[i] - old[i]
+    deltas = {key: delta for key, delta in deltas.items() if any(delta)}
+    if not deltas:
+        return
+
+    with transaction.atomic():
+        if len(deltas) <= BULK_THRESHOLD:
+            _increment(deltas)
+        else:
+            try:
+                with transaction.atomic():
+                    _bulk_apply(deltas)
+            except IntegrityError:
+                _increment(deltas)  # a concurrent writer created one of our rows first
+
+        emptied = {system_id for (system_id, _, _), delta in deltas.items() if delta[2] < 0}
+        if emptied:
+            # Drop periods left with no verified rows instead of keeping float residue around
+            AccuracyRollup.objects.filter(system_id__in=emptied, verified_count__lte=0).delete()
+
+
+def _increment(deltas):
+    for key, (d_actual, d_error, d_count) in deltas.items():
+        system_id, period, start = key
+        rows = AccuracyRollup.objects.filter(system_id=system_id, period=period, period_start=start)
+        update = {
+            "actual_sum": F("actual_sum") + d_actual,
+            "abs_error_sum": F("abs_error_sum") + d_error,
+            "verified_count": F("verified_count") + d_count,
+        }
+        if rows.update(**update):
+            continue
+        # No row yet: build it from the predictions, which already hold this change
+        missing = _recompute([key])
+        if not missing:
+            continue
+        try:
+            with transaction.atomic():
+                missing[0].save(force_insert=True)
+        except IntegrityError:
+            rows.update(**update)  # created concurrently from committed rows; add ours on top
+
+
+def _bulk_apply(deltas):
+    starts = [start for _, _, start in deltas]
+    existing = AccuracyRollup.objects.select_for_update().filter(
+        system_id__in={system_id for system_id, _, _ in deltas},
+        period_start__range=(min(starts), max(starts)),
+    )
+    changed = []
+    for row in existing:
+        delta = deltas.get((row.system_id, row.period, row.period_start))
+        if delta is None:
+            continue
+        row.actual_sum += delta[0]
+        row.abs_error_sum += delta[1]
+        row.verified_count += delta[2]
+        changed.append(row)
+    AccuracyRollup.objects.bulk_update(changed, ["actual_sum", "abs_error_sum", "verified_count"],
+                                       batch_size=UPDATE_BATCH_SIZE)
+
+    seen = {(row.system_id, row.period, row.period_start) for row in changed}
+    # Missing rows are built from the predictions, which already hold these changes
+    AccuracyRollup.objects.bulk_create(_recompute([key for key in deltas if key not in seen]),
+                                       batch_size=REBUILD_BATCH_SIZE)
+
+
+def _period_end(period, start):
+    if period == AccuracyRollup.DAY:
+        return start + timedelta(days=1)
+    if period == AccuracyRollup.WEEK:
+        return start + timedelta(days=7)
+    return (start + timedelta(days=32)).replace(day=1)
+
+
+def _recompute(keys):
+    """Unsaved rollup rows for (system_id, period, period_start) keys, summed from their verified predictions."""
+    by_period = defaultdict(list)
+    for key in keys:
+        by_period[key[1]].append(key)
+    rows = []
+    for period, period_keys in by_period.items():
+        wanted = set(period_keys)
+        predictions = Prediction.objects.filter(
+            actual_value__isnull=False,
+            system_id__in={system_id for system_id, _, _ in period_keys},
+            target_date__gte=min(start for _, _, start in period_keys),
+            target_date__lt=max(_period_end(period, start) for _, _, start in period_keys),
+        )
+        for row in _period_sums(predictions, period):
+            if (row.system_id, period, row.period_start) in wanted:
+                rows.append(row)
+    return rows
+
+
+def _period_sums(predictions, period, rollup_model=AccuracyRollup):
+    """Unsaved `rollup_model` rows of one period type, summed from verified `predictions`."""
+    trunc = {
+        AccuracyRollup.DAY: F("target_date"),
+        AccuracyRollup.WEEK: TruncWeek("target_date"),
+        AccuracyRollup.MONTH: TruncMonth("target_date"),
+    }[period]
+    sums = (
+        predictions.filter(actual_value__isnull=False)
+        .annotate(start=trunc)
+        .values("system_id", "start")
+        .annotate(
+            actual_total=Sum("actual_value"),
+            error_total=Sum(Abs(F("pred_value") - F("actual_value"))),
+            count=Count("id"),
+        )
+        .order_by()
+    )
+    for row in sums.iterator(chunk_size=REBUILD_BATCH_SIZE):
+        yield rollup_model(
+            system_id=row["system_id"], period=period, period_start=row["start"],
+            actual_sum=row["actual_total"], abs_error_sum=row["error_total"], verified_count=row["count"],
+        )
+
+
+def rebuild(systems=None, prediction_model=Prediction, rollup_model=AccuracyRollup):
+    """
+    Recompute the rollups of `systems` (a SolarSystem queryset / list of ids;
+    None = all) from their predictions in one transaction. Returns rows written.
+    Migrations pass their historical models.
+    """
+    predictions = prediction_model.objects.filter(actual_value__isnull=False)
+    rollups = rollup_model.objects.all()
+    if systems is not None:
+        predictions = predictions.filter(system__in=systems)
+        rollups = rollups.filter(system__in=systems)
+
+    written = 0
+    with transaction.atomic():
+        rollups.delete()
+        for period in (AccuracyRollup.DAY, AccuracyRollup.WEEK, AccuracyRollup.MONTH):
+            batch = []
+            for row in _period_sums(predictions, period, rollup_model):
+                batch.append(row)
+                if len(batch) >= REBUILD_BATCH_SIZE:
+                    written += len(rollup_model.objects.bulk_create(batch))
+                    batch.clear()
+            written += len(rollup_model.objects.bulk_create(batch))
+    return written
+
+
+def totals(**filters):
+    """
+    {system_id: (actual_sum, abs_error_sum, verified_count)} summed over the
+    month rollups matching `filters` (e.g. system__user=user).
+    """
+    rows = (
+        AccuracyRollup.objects.filter(period=AccuracyRollup.MONTH, **filters)
+        .values("system_id")
+        .annotate(actual_total=Sum("actual_sum"), error_total=Sum("abs_error_sum"), count=Sum("verified_count"))
+        .order_by()
+    )
+    return {r["system_id"]: (r["actual_total"], r["error_total"], r["count"]) for r in rows}
@@ -1,3 +1,729 @@
-from django.test import TestCase
+import asyncio
+import hashlib
+import os
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+import httpx
+import joblib
+import numpy as np
+import pandas as pd
+import requests
+from scipy.interpolate import CubicSpline
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from benchmarks.bench_weather_parse import legacy_parse, synthetic_payload
+
+from .ml.py_files.config import INPUT_COLS
+from .ml.py_files.features import FeaturePipeline, add_features, feature_pipeline
+from .ml import registry, upstream
+from .ml.singleflight import SingleFlight
+from .ml.weather import RESAMPLE_MODES, parse_forecast_payload
+from . import forecast_store, rollups
+from .actuals_import import ActualsImportError, import_actuals
+from .models import AccuracyRollup, Prediction, SolarSystem, SystemForecast
+from .views import _parse_cursor, chart_points, keyset_page
+
+
+def _raw_frame(timestamps, seed=0):
+    rng = np.random.default_rng(seed)
+    n = len(timestamps)
+    return pd.DataFrame({
+        "timestamp": timestamps,
+        "ghi": rng.uniform(0, 1000, n),
+        "dni": rng.uniform(0, 900, n),
+        "dhi": rng.uniform(0, 300, n),
+        "air_temp": rng.normal(25, 8, n),
+        "wind_speed": rng.gamma(2, 1.5, n),
+        "solar_zenith": rng.uniform(0, 180, n),
+        "cloud_cover": rng.uniform(0, 100, n),
+    })
+
+
+class FeaturePipelineTests(SimpleTestCase):
+    # All of leap year 2024 plus its edges: every hour, day of month and month occurs
+    hours = pd.date_range("2023-12-30", "2025-01-02", freq="h")
+
+    def timestamp_variants(self):
+        return {
+            "naive": self.hours,  # what predict_next_48h passes (local wall time)
+            "aware": self.hours.tz_localize("Asia/Kolkata"),
+            "string": self.hours.tz_localize("UTC").strftime("%Y-%m-%d %H:%M:%S+00:00"),  # the training CSV
+        }
+
+    def test_matches_add_features(self):
+        for name, timestamps in self.timestamp_variants().items():
+            with self.subTest(timestamps=name):
+                df = _raw_frame(timestamps)
+                expected = add_features(df.copy())[INPUT_COLS].to_numpy()
+                X = feature_pipeline.transform(df)
+                self.assertEqual(X.shape, (len(df), len(INPUT_COLS)))
+                self.assertEqual(X.dtype, np.float32)
+                # float32 storage: equal up to float32 rounding of each value
+                np.testing.assert_allclose(X, expected, rtol=1e-6, atol=1e-6)
+
+    def test_float64_pipeline_is_exact(self):
+        df = _raw_frame(self.hours)
+        expected = add_features(df.copy())[INPUT_COLS].to_numpy()
+        np.testing.assert_array_equal(FeaturePipeline(dtype=np.float64).transform(df), expected)
+
+    def test_day_codes_are_add_features_dates(self):
+        for name, timestamps in self.timestamp_variants().items():
+            with self.subTest(timestamps=name):
+                df = _raw_frame(timestamps)
+                expected = np.array(add_features(df.copy())["date"].tolist(), dtype="datetime64[D]").astype(np.int32)
+                _, day_code = feature_pipeline.transform(df, with_day_codes=True)
+                np.testing.assert_array_equal(day_code, expected)
+
+    def test_fills_out_and_leaves_input_untouched(self):
+        df = _raw_frame(self.hours[:96])
+        before = df.copy()
+        out = np.full((96, len(INPUT_COLS)), np.nan, dtype=np.float32)
+        self.assertIs(feature_pipeline.transform(df, out=out), out)
+        self.assertFalse(np.isnan(out).any())
+        pd.testing.assert_frame_equal(df, before)
+
+    def test_serving_dtype_follows_model(self):
+        class Legacy:
+            pass
+
+        class Retrained:
+            feature_dtype_ = "float32"
+
+        self.assertEqual(FeaturePipeline.for_model(Legacy()).dtype, np.float64)
+        self.assertIs(FeaturePipeline.for_model(Retrained()), feature_pipeline)
+
+
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+                                       "LOCATION": "singleflight-tests"}})
+class SingleFlightTests(SimpleTestCase):
+    def setUp(self):
+        caches["default"].clear()
+        self.flight = SingleFlight("test", cache_alias="default", lock_seconds=2, poll_seconds=0.01)
+        self.lock_key, self.wait_key, self.result_key = self.flight._keys("k")
+        self.calls = 0
+
+    def compute(self, value="own"):
+        self.calls += 1
+        return value
+
+    def other_worker(self, publish):
+        """Hold the cache lock like another process; once a waiter flags itself, run `publish`."""
+        cache = caches["default"]
+        cache.add(self.lock_key, 1)
+
+        def run():
+            deadline = time.monotonic() + 2
+            while not cache.get(self.wait_key) and time.monotonic() < deadline:
+                time.sleep(0.005)
+            publish(cache)
+
+        thread = threading.Thread(target=run)
+        thread.start()
+        self.addCleanup(thread.join)
+
+    def test_leader_without_waiters_publishes_nothing(self):
+        self.assertEqual(self.flight.do("k", self.compute), "own")
+        cache = caches["default"]
+        self.assertIsNone(cache.get(self.result_key))
+        self.assertIsNone(cache.get(self.lock_key))
+        self.assertEqual(self.flight.stats()["leader"], 1)
+
+    def test_leader_publishes_shared_part_for_waiters(self):
+        flight = SingleFlight("test", cache_alias="default", share=lambda result: result[1])
+        caches["default"].set(self.wait_key, 1)
+        self.assertEqual(flight.do("k", lambda: ("frame", "daily")), ("frame", "daily"))
+        self.assertEqual(caches["default"].get(self.result_key), "daily")
+
+    def test_local_followers_share_one_call(self):
+        started, release = threading.Event(), threading.Event()
+
+        def slow():
+            started.set()
+            release.wait(2)
+            return self.compute()
+
+        results = []
+        leader = threading.Thread(target=lambda: results.append(self.flight.do("k", slow)))
+        leader.start()
+        started.wait(2)
+        follower = threading.Thread(target=lambda: results.append(self.flight.do("k", slow)))
+        follower.start()
+        while self.flight.stats()["coalesced_local"] == 0:
+            time.sleep(0.005)
+        release.set()
+        leader.join()
+        follower.join()
+        self.assertEqual(results, ["own", "own"])
+        self.assertEqual(self.calls, 1)
+
+    def test_remote_follower_gets_published_result(self):
+        self.other_worker(lambda cache: cache.set(self.result_key, "theirs"))
+        self.assertEqual(self.flight.do("k", self.compute), "theirs")
+        self.assertEqual(self.calls, 0)
+        self.assertEqual(self.flight.stats()["coalesced_remote"], 1)
+
+    def test_falls_back_when_lock_holder_fails(self):
+        self.other_worker(lambda cache: cache.delete(self.lock_key))
+        self.assertEqual(self.flight.do("k", self.compute), "own")
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(self.flight.stats()["fallback"], 1)
+
+    def test_async_callers_share_one_call(self):
+        async def acompute():
+            await asyncio.sleep(0.01)
+            return self.compute()
+
+        async def main():
+            return await asyncio.gather(*(self.flight.ado("k", acompute) for _ in range(3)))
+
+        self.assertEqual(asyncio.run(main()), ["own"] * 3)
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(self.flight.stats()["coalesced_local"], 2)
+
+
+def _system(username="owner", name="Roof"):
+    user = get_user_model().objects.create_user(username=username, email=f"{username}@example.com", password="pw")
+    return SolarSystem.objects.create(user=user, name=name, system_size=5, latitude=19.07, longitude=72.88,
+                                      location_name="Mumbai")
+
+
+class KeysetPageTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        system = _system()
+        # Several rows per target_date, so pages split inside a day and the id tiebreak matters
+        for i in range(13):
+            Prediction.objects.create(system=system, target_date=date(2026, 9, 1) + timedelta(days=i % 5),
+                                      day_target="tomorrow", pred_value=i)
+        cls.expected = list(Prediction.objects.order_by("-target_date", "-id"))
+
+    def walk_older(self, size):
+        pages, cursor = [], None
+        while True:
+            rows, older, newer = keyset_page(Prediction.objects.all(), after=cursor, size=size)
+            pages.append((rows, older, newer))
+            if older is None:
+                return pages
+            cursor = _parse_cursor(older)
+
+    def test_older_pages_cover_every_row_once(self):
+        pages = self.walk_older(size=4)
+        self.assertEqual([p for rows, _, _ in pages for p in rows], self.expected)
+        self.assertEqual([len(rows) for rows, _, _ in pages], [4, 4, 4, 1])
+        self.assertIsNone(pages[0][2])        # nothing newer than the first page
+        self.assertIsNotNone(pages[-1][2])
+
+    def test_newer_cursor_returns_previous_page(self):
+        pages = self.walk_older(size=4)
+        for (previous, _, _), (_, _, newer) in zip(pages, pages[1:]):
+            rows, older, _ = keyset_page(Prediction.objects.all(), before=_parse_cursor(newer), size=4)
+            self.assertEqual(rows, previous)
+            self.assertIsNotNone(older)
+        rows, _, newer = keyset_page(Prediction.objects.all(), before=_parse_cursor(pages[1][2]), size=4)
+        self.assertIsNone(newer)
+
+    def test_exact_multiple_of_page_size_has_no_empty_last_page(self):
+        pages = self.walk_older(size=13)
+        self.assertEqual(len(pages), 1)
+        self.assertEqual(pages[0], (self.expected, None, None))
+
+    def test_malformed_cursor_is_ignored(self):
+        for value in (None, "", "2026-09-01", "yesterday.3", "2026-09-01.x", "2026-09-01.1.2"):
+            with self.subTest(value=value):
+                self.assertIsNone(_parse_cursor(value))
+        self.assertEqual(_parse_cursor("2026-09-03.7"), (date(2026, 9, 3), 7))
+
+    def test_chart_points_are_latest_per_system(self):
+        other = SolarSystem.objects.create(user=self.expected[0].system.user, name="Shed", system_size=2,
+                                           latitude=19.07, longitude=72.88, location_name="Mumbai")
+        Prediction.objects.create(system=other, target_date=date(2026, 1, 1), day_target="tomorrow", pred_value=1)
+        points = chart_points(Prediction.objects.all(), per_system=3)
+        self.assertEqual([(p["system_id"], p["pred_value"]) for p in points],
+                         [(p.system_id, p.pred_value) for p in self.expected[:3]] + [(other.id, 1)])
+
+
+class RollupTests(TestCase):
+    def setUp(self):
+        self.system = _system()
+        # Aug 25 - Sep 14: spans a month boundary and a week split across it; every third day verified
+        self.predictions = [
+            Prediction.objects.create(system=self.system, target_date=date(2026, 8, 25) + timedelta(days=i),
+                                      day_target="tomorrow", pred_value=10 + i % 4,
+                                      actual_value=9.0 if i % 3 == 0 else None)
+            for i in range(21)
+        ]
+        rollups.rebuild()
+
+    def snapshot(self):
+        return {
+            (r.period, r.period_start): (r.actual_sum, r.abs_error_sum, r.verified_count)
+            for r in AccuracyRollup.objects.filter(system=self.system)
+        }
+
+    def assertMatchesRebuild(self):
+        incremental = self.snapshot()
+        rollups.rebuild()
+        rebuilt = self.snapshot()
+        self.assertEqual(incremental.keys(), rebuilt.keys())
+        for key, values in rebuilt.items():
+            with self.subTest(rollup=key):
+                for got, want in zip(incremental[key], values):
+                    self.assertAlmostEqual(got, want, places=9)
+
+    def set_actual(self, prediction, actual):
+        old = rollups.lock_predictions(Prediction.objects.filter(pk=prediction.pk)).get().actual_value
+        prediction.actual_value = actual
+        prediction.save()
+        rollups.apply_change(prediction, old, actual)
+
+    def test_period_starts(self):
+        self.assertEqual(rollups.period_starts(date(2026, 9, 2)), [
+            (AccuracyRollup.DAY, date(2026, 9, 2)),
+            (AccuracyRollup.WEEK, date(2026, 8, 31)),
+            (AccuracyRollup.MONTH, date(2026, 9, 1)),
+        ])
+
+    def test_edit_verify_unverify_and_delete(self):
+        self.set_actual(self.predictions[0], 12.5)       # edit
+        self.set_actual(self.predictions[1], 7.0)        # verify: its day has no row yet
+        self.set_actual(self.predictions[3], None)       # unverify: the day row goes away
+        deleted = self.predictions[6]
+        deleted.delete()
+        rollups.apply_change(deleted, deleted.actual_value, None)
+        self.assertNotIn((AccuracyRollup.DAY, date(2026, 8, 28)), self.snapshot())
+        self.assertMatchesRebuild()
+
+    def test_missing_period_is_recomputed_not_dropped(self):
+        AccuracyRollup.objects.filter(system=self.system, period=AccuracyRollup.MONTH,
+                                      period_start=date(2026, 9, 1)).delete()
+        self.set_actual(self.predictions[9], 11.0)        # Sep 3, a verified day: delta on a missing month
+        self.assertMatchesRebuild()
+
+    def test_bulk_changes_match_rebuild(self):
+        AccuracyRollup.objects.filter(system=self.system, period=AccuracyRollup.DAY).delete()
+        changes = []
+        for i, p in enumerate(self.predictions):
+            changes.append((p, p.actual_value, 5.0 + i))
+            p.actual_value = 5.0 + i
+        Prediction.objects.bulk_update(self.predictions, ["actual_value"])
+        self.assertGreater(len(changes) * 3, rollups.BULK_THRESHOLD)
+        rollups.apply_changes(changes)
+        self.assertMatchesRebuild()
+
+    def test_totals_read_month_rows(self):
+        verified = [p for p in self.predictions if p.actual_value is not None]
+        actual, error, count = rollups.totals(system__user=self.system.user)[self.system.id]
+        self.assertEqual(count, len(verified))
+        self.assertAlmostEqual(actual, sum(p.actual_value for p in verified))
+        self.assertAlmostEqual(error, sum(abs(p.pred_value - p.actual_value) for p in verified))
+
+
+class ImportActualsTests(TestCase):
+    def setUp(self):
+        self.roof = _system()
+        self.shed = SolarSystem.objects.create(user=self.roof.user, name="Shed", system_size=2,
+                                               latitude=19.07, longitude=72.88, location_name="Mumbai")
+        self.stranger = _system(username="stranger", name="Roof")
+        for system in (self.roof, self.shed, self.stranger):
+            for day in range(1, 6):
+                Prediction.objects.create(system=system, target_date=date(2026, 9, day),
+                                          day_target="tomorrow", pred_value=10,
+                                          actual_value=8.0 if day == 1 else None)
+        rollups.rebuild()
+
+    def actual(self, system, day):
+        return Prediction.objects.get(system=system, target_date=date(2026, 9, day)).actual_value
+
+    def run_import(self, csv_text, **kwargs):
+        return import_actuals(self.roof.user, csv_text.splitlines(keepends=True), **kwargs)
+
+    def test_matches_by_id_and_name_and_counts_every_row(self):
+        result = self.run_import(
+            "System,Date,kWh\n"
+            f"{self.roof.id},2026-09-01,8\n"          # matched, unchanged
+            f"{self.roof.id},2026-09-02,9.5\n"
+            "shed,2026-09-02,3\n"                     # name, case-insensitive
+            "Shed,2026-09-03,4\n"
+            "Shed,2026-09-03,4.5\n"                   # same key in the same batch: the last row wins
+            f"{self.roof.id},2026-08-01,5\n"          # no prediction that day
+            "\n"
+            f"{self.stranger.id},2026-09-02,1\n"      # another user's system
+            "Roof,not-a-date,1\n"
+            "Roof,2026-09-04,-1\n"
+            "Roof,2999-01-01,1\n",
+            batch_size=3,
+        )
+        self.assertEqual({k: result[k] for k in ("rows", "matched", "updated", "unmatched", "invalid", "future")},
+                         {"rows": 10, "matched": 5, "updated": 3, "unmatched": 1, "invalid": 3, "future": 1})
+        self.assertEqual(len(result["errors"]), 3)
+        self.assertEqual(self.actual(self.roof, 2), 9.5)
+        self.assertEqual(self.actual(self.shed, 2), 3)
+        self.assertEqual(self.actual(self.shed, 3), 4.5)
+        self.assertIsNone(self.actual(self.stranger, 2))
+
+        self.roof.refresh_from_db()
+        self.shed.refresh_from_db()
+        self.assertEqual((self.roof.actuals_in_cycle, self.shed.actuals_in_cycle), (1, 2))
+
+    def test_pinned_system_and_rollups(self):
+        result = self.run_import("date,actual\n2026-09-01,6\n2026-09-02,7\n", system=self.shed)
+        self.assertEqual((result["matched"], result["updated"]), (2, 2))
+        self.assertEqual(self.actual(self.shed, 1), 6)
+        self.assertIsNone(self.actual(self.roof, 2))
+
+        month = (AccuracyRollup.MONTH, date(2026, 9, 1))
+        incremental = {(r.system_id, r.period, r.period_start): r.verified_count
+                       for r in AccuracyRollup.objects.all()}
+        rollups.rebuild()
+        rebuilt = {(r.system_id, r.period, r.period_start): r.verified_count for r in AccuracyRollup.objects.all()}
+        self.assertEqual(incremental, rebuilt)
+        self.assertEqual(rebuilt[(self.shed.id, *month)], 2)
+
+    def test_rejects_bad_files(self):
+        with self.assertRaisesMessage(ActualsImportError, "missing column(s): system"):
+            self.run_import("date,actual\n2026-09-01,6\n")
+        with self.assertRaisesMessage(ActualsImportError, "System not found."):
+            self.run_import("date,actual\n", system=self.stranger)
+        with self.assertRaisesMessage(ActualsImportError, "empty"):
+            self.run_import("")
+
+
+class MetricsViewTests(TestCase):
+    def test_requires_token_or_staff(self):
+        self.assertEqual(self.client.get("/metrics").status_code, 403)
+        with mock.patch.dict(os.environ, {"METRICS_TOKEN": "s3cret"}):
+            self.assertEqual(self.client.get("/metrics", HTTP_AUTHORIZATION="Bearer wrong").status_code, 403)
+            response = self.client.get("/metrics", HTTP_AUTHORIZATION="Bearer s3cret")
+            self.assertEqual(response.status_code, 200)
+            self.assertIn("# TYPE solar_", response.content.decode())
+
+        user = _system().user
+        self.client.force_login(user)
+        self.assertEqual(self.client.get("/metrics").status_code, 403)
+        user.is_admin = True
+        user.save()
+        self.assertEqual(self.client.get("/metrics").status_code, 200)
+
+
+class ForecastStoreTests(TestCase):
+    def setUp(self):
+        self.system = _system()
+        self.system.timezone = "Asia/Kolkata"
+        self.system.save()
+        self.client.force_login(self.system.user)
+        self.tomorrow = timezone.now().date() + timedelta(days=1)
+        self.run_seconds = forecast_store.PROVIDER_UPDATE_SECONDS["openweather"]
+
+    def forecast(self, age=timedelta(0), runs_behind=0, pred_value=12.5, save=True):
+        forecast = SystemForecast(
+            system=self.system, target_date=self.tomorrow, pred_value=pred_value, ghi=500, air_temp=30,
+            wind_speed=3, computed_at=timezone.now() - age,
+            upstream_run_at=forecast_store.current_upstream_run() - timedelta(seconds=runs_behind * self.run_seconds),
+        )
+        if save:
+            forecast.save()
+        return forecast
+
+    def daily_frame(self):
+        days = [self.tomorrow, self.tomorrow + timedelta(days=1)]
+        return pd.DataFrame({"date": days, "daily_energy": [4.0, 5.0], "ghi": [400.0, 450.0],
+                             "air_temp": [28.0, 29.0], "wind_speed": [2.0, 2.5]})
+
+    def test_is_fresh(self):
+        max_age = timedelta(hours=forecast_store.FORECAST_STORE_MAX_AGE_HOURS)
+        max_runs = forecast_store.FORECAST_STORE_MAX_RUNS_BEHIND
+        cases = {
+            "new": (self.forecast(save=False), True),
+            "just under max age": (self.forecast(age=max_age - timedelta(minutes=1), save=False), True),
+            "too old": (self.forecast(age=max_age + timedelta(minutes=1), save=False), False),
+            "max runs behind": (self.forecast(runs_behind=max_runs, save=False), True),
+            "too many runs behind": (self.forecast(runs_behind=max_runs + 1, save=False), False),
+        }
+        unknown_run = self.forecast(save=False)
+        unknown_run.upstream_run_at = None
+        cases["no upstream run"] = (unknown_run, True)
+        for name, (forecast, fresh) in cases.items():
+            with self.subTest(name):
+                self.assertIs(forecast_store.is_fresh(forecast), fresh)
+
+    def test_fresh_row_is_served_from_the_store(self):
+        self.forecast(pred_value=12.5)
+        with mock.patch("forecasting.ml.predict_next_48h") as live:
+            response = self.client.get(f"/run-prediction/{self.system.id}/?day=tomorrow")
+        live.assert_not_called()
+        body = response.json()
+        self.assertEqual((body["source"], body["predicted_energy"]), ("store", 12.5))
+        self.assertEqual(list(Prediction.objects.values_list("target_date", "pred_value")),
+                         [(self.tomorrow, 12.5)])
+
+    def test_stale_row_falls_back_to_live_and_is_refreshed(self):
+        self.forecast(runs_behind=forecast_store.FORECAST_STORE_MAX_RUNS_BEHIND + 1, pred_value=1.0)
+        with mock.patch("forecasting.ml.predict_next_48h", return_value=(None, self.daily_frame())) as live:
+            response = self.client.get(f"/run-prediction/{self.system.id}/?day=tomorrow")
+        live.assert_called_once()
+        body = response.json()
+        self.assertEqual((body["source"], body["predicted_energy"]), ("live", 20.0))  # 4 kWh/kW x 5 kW
+        self.assertEqual(Prediction.objects.get().pred_value, 20.0)
+        stored = SystemForecast.objects.get(system=self.system, target_date=self.tomorrow)
+        self.assertEqual(stored.pred_value, 20.0)
+        self.assertTrue(forecast_store.is_fresh(stored))
+
+    def test_store_write_failure_does_not_fail_the_prediction(self):
+        with mock.patch("forecasting.ml.predict_next_48h", return_value=(None, self.daily_frame())), \
+                mock.patch("forecasting.views.astore_daily_forecasts", side_effect=RuntimeError("db down")), \
+                self.assertLogs("forecasting.views", "WARNING"):
+            response = self.client.get(f"/run-prediction/{self.system.id}/?day=tomorrow")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["source"], "live")
+        self.assertEqual(Prediction.objects.count(), 1)
+
+
+class ScriptedAdapter(requests.adapters.BaseAdapter):
+    """requests adapter replaying `script`: a status, (status, headers) or an exception per attempt."""
+
+    def __init__(self, script):
+        super().__init__()
+        self.script = list(script)
+        self.timeouts = []
+
+    def send(self, request, timeout=None, **kwargs):
+        self.timeouts.append(timeout)
+        step = self.script.pop(0)
+        if isinstance(step, Exception):
+            raise step
+        status, headers = step if isinstance(step, tuple) else (step, {})
+        response = requests.Response()
+        response.status_code = status
+        response.headers.update(headers)
+        response._content = b'{"ok": true}'
+        response.url = request.url
+        response.request = request
+        return response
+
+    def close(self):
+        pass
+
+
+class UpstreamRetryTests(SimpleTestCase):
+    host = "http://upstream.test"
+    url = host + "/data"
+
+    def setUp(self):
+        sleep = mock.patch("forecasting.ml.upstream.time.sleep")
+        self.sleep = sleep.start()
+        self.addCleanup(sleep.stop)
+
+    def get(self, script, endpoint="openweather_forecast", **kwargs):
+        client = upstream.UpstreamClient()
+        adapter = ScriptedAdapter(script)
+        client.mount(self.host, adapter)
+        try:
+            return client.get_json(endpoint, self.url, **kwargs), adapter, client.stats()[self.host]
+        except Exception as e:
+            return e, adapter, client.stats()[self.host]
+
+    def test_retries_connection_errors_and_5xx(self):
+        result, adapter, stats = self.get([requests.ConnectionError("reset"), 503, 200])
+        self.assertEqual(result, {"ok": True})
+        self.assertEqual(len(adapter.timeouts), 3)
+        self.assertEqual((stats["requests"], stats["errors"], stats["retries"]), (3, 2, 2))
+
+    def test_gives_up_after_the_endpoint_retries(self):
+        result, adapter, stats = self.get([500, 502, 504, 200])
+        self.assertIsInstance(result, requests.HTTPError)
+        self.assertEqual(len(adapter.timeouts), upstream.ENDPOINTS["openweather_forecast"].retries + 1)
+        self.assertEqual(stats["retries"], 2)
+
+    def test_honours_retry_after(self):
+        result, _, _ = self.get([(429, {"Retry-After": "1.5"}), 200])
+        self.assertEqual(result, {"ok": True})
+        self.sleep.assert_called_once_with(1.5)
+
+    def test_other_errors_are_not_retried(self):
+        for script in ([404], [400], [requests.ReadTimeout("slow")]):
+            with self.subTest(script=script):
+                result, adapter, stats = self.get(script + [200])
+                self.assertIsInstance(result, requests.RequestException)
+                self.assertEqual((len(adapter.timeouts), stats["retries"]), (1, 0))
+
+    def test_per_endpoint_timeouts_fit_the_budget(self):
+        spec = upstream.ENDPOINTS["openweather_geocode"]
+        _, adapter, _ = self.get([200], endpoint="openweather_geocode")
+        self.assertEqual(adapter.timeouts, [(spec.connect_timeout, spec.read_timeout)])
+        _, adapter, _ = self.get([200], endpoint="openweather_geocode", timeout=2.0)
+        connect, read = adapter.timeouts[0]
+        self.assertAlmostEqual(connect, 2.0, places=2)
+        self.assertAlmostEqual(read, 2.0, places=2)
+
+    def test_async_client_follows_the_same_rules(self):
+        def run(script, endpoint="openweather_forecast"):
+            script, seen = list(script), []
+
+            def handler(request):
+                seen.append(request.extensions["timeout"])
+                step = script.pop(0)
+                if isinstance(step, Exception):
+                    raise step
+                status, headers = step if isinstance(step, tuple) else (step, {})
+                return httpx.Response(status, headers=headers, json={"ok": True})
+
+            client = upstream.UpstreamClient()
+            client.mount_async(self.host, httpx.MockTransport(handler))
+
+            async def call():
+                try:
+                    return await client.aget_json(endpoint, self.url)
+                except Exception as e:
+                    return e
+                finally:
+                    await client.aclose()
+
+            with mock.patch("forecasting.ml.upstream.asyncio.sleep") as sleep:
+                result = asyncio.run(call())
+            return result, seen, sleep, client.stats()[self.host]
+
+        result, seen, sleep, stats = run([httpx.ConnectError("refused"), (429, {"Retry-After": "2"}), 200])
+        self.assertEqual(result, {"ok": True})
+        self.assertEqual((len(seen), stats["retries"]), (3, 2))
+        self.assertEqual(sleep.call_args.args, (2.0,))
+
+        result, seen, _, stats = run([404, 200])
+        self.assertIsInstance(result, httpx.HTTPStatusError)
+        self.assertEqual((len(seen), stats["retries"]), (1, 0))
+
+        spec = upstream.ENDPOINTS["openweather_geocode"]
+        _, seen, _, _ = run([200], endpoint="openweather_geocode")
+        self.assertEqual((seen[0]["connect"], seen[0]["read"]), (spec.connect_timeout, spec.read_timeout))
+
+
+class _ConstantModel:
+    """Stands in for the LightGBM model: no booster_, so the registry serves it through SklearnPredictor."""
+
+    def __init__(self, value):
+        self.value = value
+
+    def predict(self, X):
+        return np.full(len(X), self.value)
+
+
+class ModelRegistryTests(SimpleTestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = Path(tmp.name) / "model.pkl"
+        clock = mock.patch("forecasting.ml.registry.time", wraps=time)
+        self.clock = clock.start()
+        self.addCleanup(clock.stop)
+        self.clock.monotonic.return_value = 1000.0
+        self.mtime = 1_700_000_000
+
+    def write(self, model):
+        joblib.dump(model, self.path)
+        self.mtime += 60  # a new mtime even when the content is the same
+        os.utime(self.path, (self.mtime, self.mtime))
+        return hashlib.sha256(self.path.read_bytes()).hexdigest()[:12]
+
+    def test_hot_reload_after_check_window(self):
+        first = self.write(_ConstantModel(1.0))
+        models = registry.ModelRegistry(self.path, check_interval=5)
+        self.assertEqual(models.get().value, 1.0)
+        self.assertEqual((models.version, models.reload_count), (first, 0))
+
+        second = self.write(_ConstantModel(2.0))  # same size, new mtime and content
+        self.clock.monotonic.return_value = 1004.0  # inside the window: no stat(), old model
+        self.assertEqual(models.get().value, 1.0)
+        self.assertEqual(models.version, first)
+
+        self.clock.monotonic.return_value = 1005.0
+        self.assertEqual(models.get().value, 2.0)
+        self.assertEqual((models.version, models.reload_count), (second, 1))
+        self.assertEqual(models.stats()["version"], second)
+
+    def test_touched_but_identical_file_is_not_reloaded(self):
+        digest = self.write(_ConstantModel(1.0))
+        models = registry.ModelRegistry(self.path, check_interval=5)
+        model = models.get()
+        self.path.write_bytes(self.path.read_bytes())
+        os.utime(self.path, (self.mtime + 60, self.mtime + 60))
+        self.clock.monotonic.return_value = 1010.0
+        self.assertIs(models.get(), model)
+        self.assertEqual((models.version, models.reload_count), (digest, 0))
+
+    def test_missing_file_keeps_serving(self):
+        self.write(_ConstantModel(1.0))
+        models = registry.ModelRegistry(self.path, check_interval=0)
+        model = models.get()
+        self.path.unlink()
+        self.assertIs(models.get(), model)
+
+
+class WeatherParseTests(SimpleTestCase):
+    payload = synthetic_payload()
+    # 2026-11-01 06:00 UTC: 01:00 CDT, the last step before Chicago falls back to CST
+    fall_back = 1_793_512_800
+
+    def samples(self, timezone_str, resample, payload=None):
+        """(frame, the rows that are real 3-hourly samples, in payload order)."""
+        payload = payload or self.payload
+        df = parse_forecast_payload(payload, timezone_str, hours=96, resample=resample)
+        local = (pd.to_datetime([e["dt"] for e in payload["list"]], unit="s", utc=True)
+                 .tz_convert(timezone_str).tz_localize(None))
+        return df, df.set_index("timestamp").loc[local.intersection(df["timestamp"])]
+
+    def test_ffill_matches_legacy_loop(self):
+        for timezone_str in ("Asia/Kolkata", "America/Chicago", "Australia/Adelaide"):
+            with self.subTest(timezone=timezone_str):
+                pd.testing.assert_frame_equal(
+                    parse_forecast_payload(self.payload, timezone_str, hours=96, resample="ffill"),
+                    legacy_parse(self.payload, timezone_str, 96), check_dtype=False,
+                )
+
+    def test_interpolated_modes_pass_through_samples(self):
+        temps = [e["main"]["temp"] for e in self.payload["list"]]
+        for mode in RESAMPLE_MODES:
+            with self.subTest(resample=mode):
+                df, at_samples = self.samples("Asia/Kolkata", mode)
+                self.assertEqual(len(df), 96)
+                np.testing.assert_allclose(at_samples["air_temp"], temps[:len(at_samples)])
+
+    def test_linear_fills_between_samples(self):
+        df = parse_forecast_payload(self.payload, "UTC", hours=6, resample="linear")
+        t0, t1 = (e["main"]["temp"] for e in self.payload["list"][:2])
+        np.testing.assert_allclose(df["air_temp"][:4], [t0, t0 + (t1 - t0) / 3, t0 + 2 * (t1 - t0) / 3, t1])
+
+    def test_wind_is_clamped_at_zero(self):
+        payload = {"list": [dict(e, wind={"speed": 12.0 if i == 4 else 0.0})
+                            for i, e in enumerate(self.payload["list"][:10])]}
+        epoch = [e["dt"] for e in payload["list"]]
+        raw = CubicSpline(epoch, [e["wind"]["speed"] for e in payload["list"]])(np.arange(epoch[0], epoch[-1], 3600))
+        self.assertLess(raw.min(), 0)  # the spline alone overshoots
+        df = parse_forecast_payload(payload, "UTC", hours=30, resample="cubic")
+        self.assertGreaterEqual(df["wind_speed"].min(), 0.0)
+        self.assertEqual(df["wind_speed"].max(), 12.0)
+
+    def test_dst_fall_back_keeps_one_row_per_hour(self):
+        base = self.payload["list"][0]
+        payload = {"list": [dict(base, dt=self.fall_back + (i - 2) * 10800, main={"temp": float(i)})
+                            for i in range(8)]}
+        for mode in RESAMPLE_MODES:
+            with self.subTest(resample=mode):
+                df, at_samples = self.samples("America/Chicago", mode, payload)
+                self.assertTrue(df["timestamp"].is_unique)
+                self.assertTrue(df["timestamp"].is_monotonic_increasing)
+                # 03:00 CST is both a filled hour of the 01:00 CDT step and the next real sample;
+                # the real sample wins
+                self.assertEqual(df.set_index("timestamp").loc[pd.Timestamp("2026-11-01 03:00"), "air_temp"], 3.0)
+                np.testing.assert_allclose(at_samples["air_temp"], range(8))
+
+    def test_rejects_unknown_mode_and_handles_empty_payload(self):
+        with self.assertRaises(ValueError):
+            parse_forecast_payload(self.payload, "UTC", resample="nearest")
+        self.assertTrue(parse_forecast_payload({"list": []}, "UTC").empty)
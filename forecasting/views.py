@@ -1,16 +1,22 @@
+import hmac
 import json
 import random
-import requests
-from django.shortcuts import render, redirect, get_object_or_404
+from django.shortcuts import render, redirect, get_object_or_404, aget_object_or_404
 from django.contrib.auth import authenticate, login, logout, get_user_model
 from django.contrib.auth.models import update_last_login
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.http import JsonResponse, HttpResponse
+from django.core.handlers.asgi import ASGIRequest
 from django.core.mail import send_mail
 from django.conf import settings
 from django.views.decorators.csrf import csrf_exempt
-from .ml.predict import predict_next_48h
+from . import ml
+from .ml import upstream
+from .ml.telemetry import PREDICTION_ERRORS, stage
+from .ml.timezones import timezone_at
+from .forecast_store import aget_fresh_forecast, astore_daily_forecasts
+from asgiref.sync import sync_to_async
 from decouple import config
 import random
 import logging
@@ -27,6 +33,8 @@ logger = logging.getLogger(__name__)
 
 # Import your models
 from .models import SolarSystem, Prediction
+from . import rollups
+from .actuals_import import ActualsImportError, import_actuals, iter_lines
 
 # Correctly define the User model for the entire file
 User = get_user_model()
@@ -215,10 +223,17 @@ def profile_view(request, user_id):
     # Count predictions across all systems owned by this user
     # This uses the 'related_name' defined in your models
     total_insights = Prediction.objects.filter(system__user=profile_user).count()
-    
+
+    # Accuracy over every verified log, read from the month rollups
+    sums = rollups.totals(system__user=profile_user).values()
+    total_actual = sum(s[0] or 0 for s in sums)
+    total_error = sum(s[1] or 0 for s in sums)
+
     return render(request, 'forecasting/profile.html', {
         'profile_user': profile_user,
-        'total_insights': total_insights
+        'total_insights': total_insights,
+        'verified_insights': sum(s[2] or 0 for s in sums),
+        'avg_acc': round(weighted_accuracy(total_error, total_actual), 2),
     })
 @login_required
 def profile_update_view(request):
@@ -263,12 +278,12 @@ def add_system(request):
             
             # Geocoding logic
             api_key = config("OPENWEATHER_API_KEY")
-            geo_url = f"http://api.openweathermap.org/geo/1.0/reverse?lat={lat}&lon={lon}&limit=1&appid={api_key}"
+            geo_params = {"lat": lat, "lon": lon, "limit": 1, "appid": api_key}
             
             try:
-                response = requests.get(geo_url).json()
+                response = upstream.get_json("openweather_geocode", upstream.OPENWEATHER_GEOCODE_URL, params=geo_params)
                 location_name = f"{response[0]['name']}, {response[0]['country']}"
-            except:
+            except Exception:
                 location_name = "Unknown Location"
 
             # 2. SAVE ATTEMPT: Wrapped in try-except for absolute safety
@@ -278,7 +293,8 @@ def add_system(request):
                 system_size=size,
                 latitude=lat,
                 longitude=lon,
-                location_name=location_name
+                location_name=location_name,
+                timezone=timezone_at(float(lat), float(lon))
             )
             messages.success(request, f"System '{name}' added successfully!")
             
@@ -302,18 +318,48 @@ import random
 
 
 @login_required
-def run_prediction(request, system_id):
-    system = get_object_or_404(SolarSystem, id=system_id, user=request.user)
+async def run_prediction(request, system_id):
+    # Async view: under ASGI, waiting on the upstream APIs holds no worker thread
+    user = await request.auser()
+    system = await aget_object_or_404(SolarSystem, id=system_id, user=user)
     target = request.GET.get('day', 'tomorrow')
     target_date = timezone.now().date() + (timedelta(days=2) if target == 'day_after' else timedelta(days=1))
 
+    # Fast path: a fresh precomputed forecast is a single indexed lookup
+    with stage("store_lookup"):
+        stored = await aget_fresh_forecast(system, target_date)
+    if stored is not None:
+        with stage("db_write"):
+            await Prediction.objects.acreate(
+                system=system, target_date=target_date, day_target=target,
+                pred_value=stored.pred_value
+            )
+        return JsonResponse({
+            "status": "success",
+            "date": target_date.isoformat(),
+            "predicted_energy": stored.pred_value,
+            "factors": {"ghi": stored.ghi, "temp": stored.air_temp, "wind": stored.wind_speed},
+            "source": "store",
+        })
+
+    # Systems created before timezones were stored get theirs resolved once here
+    if not system.timezone:
+        system.timezone = await sync_to_async(timezone_at)(system.latitude, system.longitude)
+        await system.asave(update_fields=["timezone"])
+
     try:
-        _, daily_df = predict_next_48h(system.latitude, system.longitude)
+        if isinstance(request, ASGIRequest):
+            _, daily_df = await ml.apredict_next_48h(system.latitude, system.longitude, system.timezone)
+        else:
+            # Under WSGI this coroutine runs on a throwaway event loop (async_to_sync); per-loop
+            # httpx clients would open new sockets every request, so keep the pooled sync client
+            _, daily_df = await sync_to_async(ml.predict_next_48h)(system.latitude, system.longitude, system.timezone)
         row = daily_df[daily_df["date"] == target_date]
         
         if row.empty:
-            row = daily_df.iloc[[0]] if not daily_df.empty else None
-            if not row: return JsonResponse({'status': 'error', 'message': 'No data'}, status=400)
+            if daily_df.empty:
+                return JsonResponse({'status': 'error', 'message': 'No data'}, status=400)
+            row = daily_df.iloc[[0]]
 
         predicted_energy = float(row["daily_energy"].iloc[0])
         predicted_kwh = predicted_energy * system.system_size
@@ -330,6 +376,7 @@ def run_prediction(request, system_id):
         }
 
     except Exception as e:
+        PREDICTION_ERRORS.inc(type(e).__name__)
         import traceback
         traceback.print_exc()
         logger.error(f"Prediction Error: {e}")
@@ -340,16 +387,26 @@ def run_prediction(request, system_id):
             'message': 'Weather service temporarily unavailable.'
         }, status=500)
 
-    Prediction.objects.create(
-        system=system, target_date=target_date, day_target=target,
-        pred_value=round(predicted_kwh, 2)
-    )
+    with stage("db_write"):
+        await Prediction.objects.acreate(
+            system=system, target_date=target_date, day_target=target,
+            pred_value=round(predicted_kwh, 2)
+        )
+        # Write-through for both served days so the next click is a lookup. The store is a
+        # cache: failing to fill it must not fail a prediction that was already made.
+        today = timezone.now().date()
+        try:
+            await astore_daily_forecasts(system, daily_df, [today + timedelta(days=1), today + timedelta(days=2)])
+        except Exception as e:
+            logger.warning(f"Forecast store write-through failed for system {system.id}: {e}")
 
     return JsonResponse({
         "status": "success",
         "date": target_date.isoformat(),
         "predicted_energy": round(predicted_kwh, 2),
-        "factors": factors
+        "factors": factors,
+        "model_version": ml.model_registry.version,
+        "source": "live",
     })
 
 @login_required
@@ -358,14 +415,16 @@ def update_actual_power(request, system_id):
         system = get_object_or_404(SolarSystem, id=system_id, user=request.user)
         val = float(request.POST.get('actual_val'))
 
-        # Find the latest prediction that doesn't have an actual value yet
-        latest_pred = system.predictions.filter(actual_value__isnull=True).latest('timestamp')
-        latest_pred.actual_value = val
-        latest_pred.save()
+        with transaction.atomic():
+            # Find the latest prediction that doesn't have an actual value yet
+            latest_pred = rollups.lock_predictions(system.predictions.filter(actual_value__isnull=True)).latest('created_at')
+            latest_pred.actual_value = val
+            latest_pred.save()
+            rollups.apply_change(latest_pred, None, val)
 
-        # Update cycle counter
-        system.actuals_in_cycle += 1
-        system.save()
+            # Update cycle counter
+            system.actuals_in_cycle += 1
+            system.save()
 
         messages.success(request, "Actual power recorded! System status updated.")
     
@@ -400,8 +459,12 @@ from .models import Prediction
 def delete_entry(request, entry_id):
     if request.method == 'POST':
         # Get the entry and ensure it belongs to the user (security check)
-        entry = get_object_or_404(Prediction, id=entry_id, system__user=request.user)
-        entry.delete()
+        with transaction.atomic():
+            entry = get_object_or_404(
+                rollups.lock_predictions(Prediction.objects.filter(id=entry_id, system__user=request.user))
+            )
+            entry.delete()
+            rollups.apply_change(entry, entry.actual_value, None)
         messages.success(request, "Record deleted successfully.")
     
     return redirect('history_view') # Make sure this matches your history URL name
@@ -424,25 +487,112 @@ from django.db.models import Sum
 from django.utils import timezone
 from django.db import transaction
 
+from datetime import date
+from django.db.models import Count, F, Q, Window
+from django.db.models.functions import RowNumber
+
+# Rows per page of the history table
+HISTORY_PAGE_SIZE = config("HISTORY_PAGE_SIZE", default=50, cast=int)
+# Latest predictions per system in the history trend chart (it draws the last 10)
+HISTORY_CHART_POINTS = 10
+
+def weighted_accuracy(total_error, total_actual):
+    """100 - (sum |pred - actual| / sum actual), floored at 0; 0 when nothing is verified."""
+    if not total_actual or total_actual <= 0:
+        return 0
+    return max(0, 100 - ((total_error or 0) / total_actual * 100))
+
+def _parse_cursor(value):
+    """'<target_date>.<id>' -> (date, id), None if missing or malformed."""
+    try:
+        day, pk = value.split(".")
+        return date.fromisoformat(day), int(pk)
+    except (AttributeError, ValueError):
+        return None
+
+def _cursor(entry):
+    return f"{entry.target_date.isoformat()}.{entry.id}"
+
+def keyset_page(queryset, after=None, before=None, size=HISTORY_PAGE_SIZE):
+    """
+    One page of `queryset` in (-target_date, -id) order, starting strictly after
+    (older than) the `after` cursor or ending strictly before (newer than) the
+    `before` cursor. Returns (rows, older_cursor, newer_cursor); a cursor is
+    None when there is nothing further in that direction.
+    """
+    if before is not None:
+        day, pk = before
+        rows = list(queryset.filter(Q(target_date__gt=day) | Q(target_date=day, id__gt=pk))
+                    .order_by("target_date", "id")[:size + 1])
+        has_newer = len(rows) > size
+        rows = rows[:size][::-1]
+        has_older = True
+    else:
+        if after is not None:
+            day, pk = after
+            queryset = queryset.filter(Q(target_date__lt=day) | Q(target_date=day, id__lt=pk))
+        rows = list(queryset.order_by("-target_date", "-id")[:size + 1])
+        has_older = len(rows) > size
+        rows = rows[:size]
+        has_newer = after is not None
+
+    older = _cursor(rows[-1]) if rows and has_older else None
+    newer = _cursor(rows[0]) if rows and has_newer else None
+    return rows, older, newer
+
+def chart_points(queryset, per_system=HISTORY_CHART_POINTS):
+    """
+    The latest `per_system` rows of every system in `queryset`, newest first,
+    independent of the table page (one query, ranked with ROW_NUMBER()).
+    """
+    return list(
+        queryset.annotate(rank=Window(RowNumber(), partition_by=F("system_id"),
+                                      order_by=[F("target_date").desc(), F("id").desc()]))
+        .filter(rank__lte=per_system)
+        .order_by("-target_date", "-id")
+        .values("system_id", "target_date", "pred_value", "actual_value")
+    )
+
 @login_required
 def history_view(request):
-    history_list = Prediction.objects.filter(system__user=request.user).order_by('-target_date')
-    verified_logs = history_list.filter(actual_value__isnull=False)
-    systems = SolarSystem.objects.filter(user=request.user)
-    
-    if verified_logs.exists():
-        # High-precision weighted accuracy calculation
-        total_actual = sum(p.actual_value for p in verified_logs)
-        total_error = sum(abs(p.pred_value - p.actual_value) for p in verified_logs)
-        avg_acc_val = max(0, 100 - (total_error / total_actual * 100)) if total_actual > 0 else 0
-    else:
-        avg_acc_val = 0
-    
+    # 1. Every system with its log count (drives the summary cards, the
+    #    per-system breakdown and the system dropdowns); verified sums come
+    #    from the month rollups, a few rows per system
+    systems = list(
+        SolarSystem.objects.filter(user=request.user)
+        .annotate(log_count=Count("predictions"))
+        .order_by("name")
+    )
+    sums = rollups.totals(system__user=request.user)
+    for system in systems:
+        system.total_actual, system.total_error, system.verified_count = sums.get(system.id, (0, 0, 0))
+        system.accuracy = round(weighted_accuracy(system.total_error, system.total_actual), 2)
+
+    # High-precision weighted accuracy over every verified log
+    total_actual = sum(s.total_actual or 0 for s in systems)
+    total_error = sum(s.total_error or 0 for s in systems)
+    avg_acc_val = weighted_accuracy(total_error, total_actual)
+
+    # 2. One page of the table, keyset-paginated on (target_date, id)
+    history_list, older, newer = keyset_page(
+        Prediction.objects.filter(system__user=request.user).select_related("system"),
+        after=_parse_cursor(request.GET.get("after")),
+        before=_parse_cursor(request.GET.get("before")),
+    )
+
     return render(request, 'forecasting/history.html', {
         'systems': systems,
         'history_list': history_list,
+        # The trend chart covers every system's latest logs, not just this page
+        'chart_data': [
+            {**p, "target_date": p["target_date"].isoformat()}
+            for p in chart_points(Prediction.objects.filter(system__user=request.user))
+        ],
+        'older_cursor': older,
+        'newer_cursor': newer,
+        'total_logs': sum(s.log_count for s in systems),
         'avg_acc': round(avg_acc_val, 2), # Correctly rounded for summary card
-        'system_count': SolarSystem.objects.filter(user=request.user).count()
+        'system_count': len(systems),
     })
 
 @login_required
@@ -464,9 +614,13 @@ def manual_update_actual(request):
 
         # DATABASE UPDATE: Using atomic transaction for reliability
         with transaction.atomic():
-            was_pending = entry.actual_value is None
+            # Lock with a write first, then re-read so the rollup delta starts from the committed value
+            entry = rollups.lock_predictions(Prediction.objects.filter(pk=entry.pk)).get()
+            old_actual = entry.actual_value
+            was_pending = old_actual is None
             entry.actual_value = actual_val
             entry.save() # Forced database commit
+            rollups.apply_change(entry, old_actual, actual_val)
             
             if was_pending:
                 system = entry.system
@@ -475,6 +629,31 @@ def manual_update_actual(request):
         
         messages.success(request, f"Yield for {entry.target_date} updated successfully!")
     return redirect('history_view')
+
+
+@login_required
+def import_actuals_view(request):
+    """
+    Bulk actual-yield import (see actuals_import.py). Takes a multipart
+    `file` upload, or the CSV as the raw request body, plus an optional
+    `system_id`; replies with the import summary as JSON.
+    """
+    if request.method != "POST":
+        return JsonResponse({"status": "invalid"}, status=405)
+    system = None
+    if request.GET.get("system_id") or request.POST.get("system_id"):
+        system = get_object_or_404(SolarSystem, id=request.GET.get("system_id") or request.POST.get("system_id"),
+                                   user=request.user)
+    # Both are read line by line; uploads above FILE_UPLOAD_MAX_MEMORY_SIZE are spooled to disk
+    source = request.FILES.get("file") or request
+    try:
+        summary = import_actuals(request.user, iter_lines(source), system=system)
+    except (ActualsImportError, UnicodeDecodeError) as e:
+        return JsonResponse({"status": "error", "message": str(e)}, status=400)
+    logger.info(f"Imported actuals for {request.user}: {summary['updated']} updated, "
+                f"{summary['rows_per_sec']} rows/sec")
+    return JsonResponse({"status": "success", **summary})
+
 def about_view(request):
     return render(request, 'forecasting/about.html')
 # --- FORGOT PASSWORD LOGIC ---
@@ -558,4 +737,20 @@ def reset_password_save(request):
             
         return JsonResponse({"status": "error", "message": "Invalid data."}, status=400)
         
-    return JsonResponse({"status": "invalid"}, status=405)
\ No newline at end of file
+    return JsonResponse({"status": "invalid"}, status=405)
+
+def metrics_view(request):
+    """
+    Prometheus text exposition of the stage / upstream / request metrics,
+    summed over every worker sharing METRICS_DIR (see ml/telemetry.py).
+    Scrapers send "Authorization: Bearer <METRICS_TOKEN>"; logged-in staff
+    can read it too. Everyone else gets 403, also when no token is set.
+    """
+    from .ml import telemetry
+
+    token = config("METRICS_TOKEN", default="")
+    authorized = bool(token) and hmac.compare_digest(request.headers.get("Authorization", ""), f"Bearer {token}")
+    if not (authorized or request.user.is_staff):
+        return HttpResponse(status=403)
+    return HttpResponse(telemetry.render(telemetry.registry.collect()),
+                        content_type="text/plain; version=0.0.4; charset=utf-8")